@@ -66,3 +66,55 @@ class MessageType(Enum):
     ROUTE_RESPONSE = BASE_PACKAGE + '.route.response'
     ROUTE_NOTIFICATION = BASE_PACKAGE + '.route.notification'
     ROUTE_ENVELOPE = BASE_PACKAGE + '.route.envelope'
+
+
+class KeyEncoding(Enum):
+    """
+    Text encodings of public keys in network messages
+
+    COMPRESSED is the SEC1 compressed point, and DER the SubjectPublicKeyInfo,
+    both in unpadded base64url.
+    """
+    PEM = 'pem'
+    COMPRESSED = 'compressed'
+    DER = 'der'
+
+
+class PowKernel(Enum):
+    """
+    Hashing kernels of the native proof of work library
+
+    LEGACY is only a baseline for hash rate measurements. MIDSTATE hashes one
+    candidate at a time through OpenSSL, the others several at once with SIMD
+    instructions, where the CPU supports them.
+    """
+    LEGACY = 0
+    MIDSTATE = 1
+    SSE41 = 2
+    AVX2 = 3
+    AVX512 = 4
+    SHANI = 5
+
+
+class PowVersion(Enum):
+    """
+    How the counter is appended to the nonce of a proof of work challenge
+
+    V1 appends it as decimal text, and is the default. V2 appends it to the UTF-8
+    encoded nonce as an 8 byte big-endian integer, so every candidate of a
+    challenge has the same length. The issuer of a challenge decides the version.
+    """
+    V1 = 'v1'
+    V2 = 'v2'
+
+
+class PowExecutorKind(Enum):
+    """
+    Where asynchronous proof of work solving runs
+
+    AUTO picks one of the others for each search from its expected cost.
+    """
+    AUTO = 'auto'
+    PROCESS = 'process'
+    THREAD = 'thread'
+    INLINE = 'inline'
@@ -7,4 +7,9 @@ most efficient) implementation of PoW. It uses OpenSSL in C on Windows and Linux
 possible, and falls back to a pure Python implementation if the CFFI module cannot be used.
 """
 
-from .libpow import PowDriver
+from .libpow import PowDriver, PowRangeResult
+from .control import PowControl, PowStoppedError
+from .native import PowLibraryError
+from .plan import PowPlan
+from .challenge import Challenge, ChallengeManager, SignedChallengeManager
+from .difficulty import DifficultyController, calibrated_hash_rate
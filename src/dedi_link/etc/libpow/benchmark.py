@@ -0,0 +1,470 @@
+"""
+Proof of Work benchmarks
+
+Run with `python -m dedi_link.etc.libpow.benchmark` to measure the throughput
+of the available PoW backends on the current host.
+
+Solving is measured for every backend over a range of difficulties, on the
+same challenges for all backends. Results can be written as JSON, and compared
+against an earlier run to fail on throughput regressions, for example:
+
+    python -m dedi_link.etc.libpow.benchmark --json baseline.json
+    python -m dedi_link.etc.libpow.benchmark --baseline baseline.json --tolerance 0.2
+"""
+
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import platform
+from functools import partial
+from pathlib import Path
+from typing import Optional, Callable, TextIO
+
+from dedi_link.etc.enums import PowKernel
+from .libpow import PowDriver
+
+
+DEFAULT_DIFFICULTIES = tuple(range(8, 27, 2))
+# The Python implementation is too slow to run the higher difficulties routinely
+DEFAULT_PYTHON_MAX_DIFFICULTY = 20
+VALIDATE_BATCH = 1000
+
+
+def native_kernel_rates(driver: PowDriver, iterations: int) -> dict[str, float]:
+    """
+    Measure the single thread hash rate of the legacy baseline and of every
+    native hashing kernel available on this host.
+    :param driver: The driver to measure with.
+    :param iterations: How many candidates each kernel hashes.
+    :return: Hashes per second, keyed by kernel name.
+    """
+    kernels = [PowKernel.LEGACY] + driver.native_kernels()
+
+    return {
+        kernel.name.lower(): driver.native_hash_rate(kernel, iterations)
+        for kernel in kernels
+    }
+
+
+def backend_rates(driver: PowDriver, iterations: int) -> dict[str, float]:
+    """
+    Measure the single thread hash rate of the native kernels and of the Python
+    implementation.
+
+    The Python implementation is measured on a smaller sample, as it is
+    orders of magnitude slower.
+    :param driver: The driver to measure with.
+    :param iterations: How many candidates each native kernel hashes.
+    :return: Hashes per second, keyed by backend name.
+    """
+    rates = {'python': driver.python_hash_rate(max(iterations // 16, 1))}
+
+    try:
+        rates.update(native_kernel_rates(driver, iterations))
+    except (OSError, RuntimeError):
+        pass
+
+    return rates
+
+
+def validation_rates(iterations: int) -> dict[str, float]:
+    """
+    Measure how many responses per second each validation path checks.
+
+    The Python path is the byte level check used without the native library,
+    native the check_pow export, and validate the public entry point, with
+    the path picked by PowDriver.select_validator.
+    :param iterations: How many responses each path checks.
+    :return: Validations per second, keyed by path name.
+    """
+    nonce = challenge_nonce(22, 0)
+    PowDriver.select_validator()
+    paths = {
+        'python': PowDriver.validation_path(native=False),
+        'native': PowDriver.validation_path(native=True),
+        'validate': PowDriver.validate,
+    }
+    rates = {}
+
+    for name, check in paths.items():
+        if check is None:
+            continue
+        start = time.perf_counter()
+        for response in range(iterations):
+            check(nonce, 22, response)
+        rates[name] = iterations / (time.perf_counter() - start)
+
+    return rates
+
+
+def challenge_nonce(difficulty: int, run: int) -> str:
+    """
+    The nonce of a benchmark challenge, the same for every backend and host.
+    :param difficulty: The difficulty of the challenge.
+    :param run: The index of the run at this difficulty.
+    :return: A 32 character hexadecimal nonce.
+    """
+    return hashlib.sha256(f'benchmark:{difficulty}:{run}'.encode()).hexdigest()[:32]
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """
+    Get a percentile of samples with the nearest rank method.
+    :param samples: The samples, in any order.
+    :param q: The percentile, between 0 and 100.
+    :return: The smallest sample at or above the percentile.
+    """
+    ordered = sorted(samples)
+    rank = max(-(-len(ordered) * q // 100), 1)
+
+    return ordered[int(rank) - 1]
+
+
+def _summarise(backend: str,
+               difficulty: int,
+               hashes: int,
+               seconds: list[float],
+               ) -> dict:
+    return {
+        'backend': backend,
+        'difficulty': difficulty,
+        'runs': len(seconds),
+        'hashes': hashes,
+        'seconds': sum(seconds),
+        'hashes_per_second': hashes / sum(seconds) if sum(seconds) > 0 else 0.0,
+        'median_seconds': percentile(seconds, 50),
+        'p99_seconds': percentile(seconds, 99),
+    }
+
+
+def bench_solve(backend: str,
+                solve: Callable[[str, int], int],
+                difficulty: int,
+                runs: int,
+                ) -> dict:
+    """
+    Measure a solver on the benchmark challenges of a difficulty.
+
+    The hash count of a solve is the number of counters up to its solution, the
+    work a sequential search has to do, so solvers searching in parallel are
+    credited with their effective rate.
+    :param backend: The name of the solver in the results.
+    :param solve: The solver, called with a nonce and a difficulty.
+    :param difficulty: The difficulty to solve at.
+    :param runs: How many challenges to solve.
+    :return: The summary of the runs.
+    """
+    hashes = 0
+    seconds = []
+
+    for run in range(runs):
+        nonce = challenge_nonce(difficulty, run)
+        start = time.perf_counter()
+        solution = solve(nonce, difficulty)
+        seconds.append(time.perf_counter() - start)
+
+        if not PowDriver.validate(nonce, difficulty, solution):
+            raise RuntimeError(f'{backend} returned an invalid solution')
+        hashes += solution + 1
+
+    return _summarise(backend, difficulty, hashes, seconds)
+
+
+def bench_validate(difficulty: int, runs: int) -> dict:
+    """
+    Measure the validation of solutions at a difficulty.
+
+    Each run validates a batch of responses, and its time is divided by the
+    batch size, as a single validation is too short to time on its own.
+    :param difficulty: The difficulty to validate at.
+    :param runs: How many batches to validate.
+    :return: The summary of the runs.
+    """
+    nonce = challenge_nonce(difficulty, 0)
+    seconds = []
+
+    for run in range(runs):
+        start = time.perf_counter()
+        for response in range(run * VALIDATE_BATCH, (run + 1) * VALIDATE_BATCH):
+            PowDriver.validate(nonce, difficulty, response)
+        seconds.append((time.perf_counter() - start) / VALIDATE_BATCH)
+
+    result = _summarise('validate', difficulty, runs * VALIDATE_BATCH, seconds)
+    result['seconds'] *= VALIDATE_BATCH
+    result['hashes_per_second'] = result['hashes'] / result['seconds']
+
+    return result
+
+
+def run_suite(difficulties: tuple[int, ...] = DEFAULT_DIFFICULTIES,
+              runs: int = 5,
+              python_max_difficulty: int = DEFAULT_PYTHON_MAX_DIFFICULTY,
+              threads: Optional[int] = None,
+              ) -> list[dict]:
+    """
+    Measure every solving backend and validation at every difficulty.
+    :param difficulties: The difficulties to measure at.
+    :param runs: How many challenges to solve per backend and difficulty.
+    :param python_max_difficulty: The highest difficulty to measure the Python
+        implementation at.
+    :param threads: How many native threads to solve with, defaults to the number
+        of CPUs available.
+    :return: A summary per backend and difficulty.
+    """
+    driver = PowDriver(threads=threads)
+    native = driver.uses_native
+    results = []
+
+    def solve_async(nonce: str, difficulty: int) -> int:
+        return asyncio.run(driver.solve_async(nonce, difficulty))
+
+    c_solve = partial(driver.solve, native=True)
+    python_solve = partial(driver.solve, native=False)
+
+    try:
+        for difficulty in difficulties:
+            if native:
+                results.append(bench_solve('c_solve', c_solve, difficulty, runs))
+            if difficulty <= python_max_difficulty:
+                results.append(bench_solve('python_solve', python_solve, difficulty, runs))
+            results.append(bench_solve('solve_async', solve_async, difficulty, runs))
+            results.append(bench_validate(difficulty, runs))
+    finally:
+        PowDriver.shutdown()
+
+    return results
+
+
+def summarise_backends(results: list[dict]) -> dict[str, float]:
+    """
+    Get the overall throughput of each backend over all difficulties.
+    :param results: The results of run_suite.
+    :return: Hashes per second, keyed by backend name.
+    """
+    totals: dict[str, tuple[int, float]] = {}
+
+    for result in results:
+        hashes, seconds = totals.get(result['backend'], (0, 0.0))
+        totals[result['backend']] = (hashes + result['hashes'], seconds + result['seconds'])
+
+    return {
+        backend: hashes / seconds if seconds > 0 else 0.0
+        for backend, (hashes, seconds) in totals.items()
+    }
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare the throughput of a report against a baseline report.
+
+    Backends are compared on their overall throughput, over the difficulties
+    both reports measured, as single low difficulties are too noisy to compare.
+    :param report: The report of the current run.
+    :param baseline: The report to compare against.
+    :param tolerance: The fraction of the baseline throughput a backend may lose.
+    :return: A description of every regression, empty if there is none.
+    """
+    measured = {(r['backend'], r['difficulty']) for r in baseline['results']}
+    current = summarise_backends([
+        r for r in report['results'] if (r['backend'], r['difficulty']) in measured
+    ])
+    common = {(r['backend'], r['difficulty']) for r in report['results']}
+    previous = summarise_backends([
+        r for r in baseline['results'] if (r['backend'], r['difficulty']) in common
+    ])
+    regressions = []
+
+    for backend, rate in current.items():
+        expected = previous.get(backend)
+        if expected and rate < expected * (1 - tolerance):
+            regressions.append(
+                f'{backend}: {rate:,.0f} H/s, down from {expected:,.0f} H/s '
+                f'({rate / expected - 1:+.1%})'
+            )
+
+    return regressions
+
+
+def _parse_difficulties(value: str) -> tuple[int, ...]:
+    difficulties = []
+
+    for part in value.split(','):
+        first, _, last = part.partition('-')
+        difficulties.extend(range(int(first), int(last or first) + 1))
+
+    return tuple(difficulties)
+
+
+def _argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Benchmark the proof of work backends')
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=1 << 21,
+        help='How many candidates to hash per kernel measurement',
+    )
+    parser.add_argument(
+        '--difficulties',
+        type=_parse_difficulties,
+        default=DEFAULT_DIFFICULTIES,
+        help='Difficulties to solve at, as a list of numbers and ranges, e.g. 8-12,16',
+    )
+    parser.add_argument(
+        '--runs',
+        type=int,
+        default=5,
+        help='How many challenges to solve per backend and difficulty',
+    )
+    parser.add_argument(
+        '--python-max-difficulty',
+        type=int,
+        default=DEFAULT_PYTHON_MAX_DIFFICULTY,
+        help='The highest difficulty to run the Python implementation at',
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='How many native threads to solve with',
+    )
+    parser.add_argument(
+        '--json',
+        type=Path,
+        default=None,
+        help='Write the report as JSON to this file, or - for standard output',
+    )
+    parser.add_argument(
+        '--baseline',
+        type=Path,
+        default=None,
+        help='A JSON report to compare the throughput against',
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.2,
+        help='The fraction of the baseline throughput a backend may lose',
+    )
+
+    return parser
+
+
+def _report_kernels(iterations: int, out: TextIO) -> tuple[dict[str, float], Optional[str]]:
+    """
+    Measure and print the hash rate of every backend.
+    :param iterations: How many candidates to hash per kernel measurement.
+    :param out: Where to print the rates.
+    :return: Hashes per second keyed by backend name, and the kernel searches
+        run with, if the native library is available.
+    """
+    driver = PowDriver(threads=1)
+    rates = backend_rates(driver, iterations)
+    baseline = rates['python']
+
+    for name, rate in rates.items():
+        print(f'{name:>10}: {rate / 1e6:8.2f} MH/s  ({rate / baseline:5.2f}x)', file=out)
+
+    try:
+        kernel = driver.native_kernel.name.lower()
+        print(f'Searches run with the {kernel} kernel', file=out)
+    except (OSError, RuntimeError):
+        kernel = None
+
+    return rates, kernel
+
+
+def _report_validation(iterations: int, out: TextIO) -> dict[str, float]:
+    """
+    Measure and print the rate of every validation path.
+    :param iterations: How many responses each path checks.
+    :param out: Where to print the rates.
+    :return: Validations per second, keyed by path name.
+    """
+    validations = validation_rates(iterations)
+    for name, rate in validations.items():
+        print(f'{name:>10}: {rate / 1e6:8.2f} M validations/s', file=out)
+
+    return validations
+
+
+def _report_suite(args: argparse.Namespace, out: TextIO) -> list[dict]:
+    """
+    Run and print the solving and validation suite.
+    :param args: The parsed command line arguments.
+    :param out: Where to print the results.
+    :return: The results of run_suite.
+    """
+    results = run_suite(args.difficulties, args.runs, args.python_max_difficulty, args.threads)
+
+    print(f'{"backend":>12} {"difficulty":>10} {"MH/s":>9} {"median":>10} {"p99":>10}', file=out)
+    for result in results:
+        print(
+            f'{result["backend"]:>12} {result["difficulty"]:>10} '
+            f'{result["hashes_per_second"] / 1e6:9.3f} '
+            f'{result["median_seconds"]:10.6f} {result["p99_seconds"]:10.6f}',
+            file=out,
+        )
+
+    return results
+
+
+def _check_baseline(report: dict, baseline: Path, tolerance: float) -> int:
+    """
+    Compare a report against a baseline report, and print every regression.
+    :param report: The report of the current run.
+    :param baseline: The path of the baseline JSON report.
+    :param tolerance: The fraction of the baseline throughput a backend may lose.
+    :return: The process exit code, 1 if a regression has been found.
+    """
+    regressions = find_regressions(report, json.loads(baseline.read_text()), tolerance)
+    for regression in regressions:
+        print(f'Regression: {regression}', file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Command line entry point of the benchmarks.
+    :param argv: Command line arguments, defaults to sys.argv.
+    :return: The process exit code, 1 if a regression against the baseline
+        has been found.
+    """
+    args = _argument_parser().parse_args(argv)
+    to_stdout = args.json is not None and str(args.json) == '-'
+    out = sys.stderr if to_stdout else sys.stdout
+
+    rates, kernel = _report_kernels(args.iterations, out)
+    validations = _report_validation(max(args.iterations // 8, 1), out)
+    results = _report_suite(args, out)
+
+    report = {
+        'host': {
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'kernel': kernel,
+        },
+        'kernels': rates,
+        'validation': validations,
+        'results': results,
+        'summary': summarise_backends(results),
+    }
+
+    if to_stdout:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json is not None:
+        args.json.write_text(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        return _check_baseline(report, args.baseline, args.tolerance)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
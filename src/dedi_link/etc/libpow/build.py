@@ -0,0 +1,42 @@
+"""
+Build the native Proof of Work library
+
+Run with `python -m dedi_link.etc.libpow.build` to build the library into the
+cache ahead of time, for example when installing the package on a host without
+a usable prebuilt library.
+"""
+
+import sys
+import argparse
+from typing import Optional
+
+from .native import PowLibraryError, build_native, load_built
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Command line entry point, building the library into the cache.
+    :param argv: Command line arguments, defaults to sys.argv.
+    :return: The process exit code.
+    """
+    parser = argparse.ArgumentParser(description='Build the native proof of work library')
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Rebuild even if a cached library exists',
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        path = build_native(force=args.force)
+        load_built(path)
+    except PowLibraryError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+Issuing and redeeming proof of work challenges
+"""
+
+import re
+import time
+import hmac
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Callable, Sequence
+
+from dedi_link.etc.enums import PowVersion
+from .libpow import PowDriver
+
+
+@dataclass(frozen=True)
+class Challenge:
+    """
+    A proof of work challenge handed out to a requester.
+    """
+    nonce: str
+    difficulty: int
+    expires_at: float
+    version: PowVersion = PowVersion.V1
+
+
+class ChallengeManager:
+    """
+    Issue proof of work challenges, and accept each solution only once.
+
+    Outstanding challenges are kept in memory, keyed by their nonce, in the
+    order they were issued. Lookups and consumption take constant time. The
+    number of outstanding challenges is capped: issuing past the cap evicts
+    the oldest challenge, so a flood of unsolved challenges cannot grow the
+    store without bound. Expired challenges are dropped when they are looked
+    up, and from the oldest end whenever a challenge is issued.
+
+    A challenge is removed when a valid solution for it is redeemed, so the
+    same solution cannot be replayed. Wrong solutions leave it in place.
+    """
+
+    def __init__(self,
+                 difficulty: int = 20,
+                 ttl: float = 60.0,
+                 max_challenges: int = 10000,
+                 clock: Callable[[], float] = time.monotonic,
+                 version: PowVersion = PowVersion.V1,
+                 ):
+        """
+        :param difficulty: The default difficulty of issued challenges.
+        :param ttl: The default number of seconds a challenge can be redeemed for.
+        :param max_challenges: How many outstanding challenges to keep at most.
+        :param clock: The clock expiry times are measured with.
+        :param version: The default format of issued challenges.
+        """
+        _check_difficulty(difficulty)
+        _check_ttl(ttl)
+        if not isinstance(max_challenges, int) or max_challenges < 1:
+            raise ValueError('Challenge capacity must be a positive integer')
+
+        self.difficulty = difficulty
+        self.ttl = ttl
+        self.max_challenges = max_challenges
+        self.version = PowVersion(version)
+        self._clock = clock
+        self._challenges: OrderedDict[str, Challenge] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._challenges)
+
+    def __contains__(self, nonce: str) -> bool:
+        return self.get(nonce) is not None
+
+    def issue(self,
+              difficulty: Optional[int] = None,
+              ttl: Optional[float] = None,
+              version: Optional[PowVersion] = None,
+              ) -> Challenge:
+        """
+        Create a new challenge and start tracking it.
+        :param difficulty: The difficulty of the challenge, defaults to the
+            manager's difficulty.
+        :param ttl: How many seconds the challenge can be redeemed for, defaults
+            to the manager's TTL.
+        :param version: The format of the challenge, defaults to the manager's.
+        :return: The new challenge.
+        """
+        difficulty = self.difficulty if difficulty is None else difficulty
+        ttl = self.ttl if ttl is None else ttl
+        version = self.version if version is None else PowVersion(version)
+        _check_difficulty(difficulty)
+        _check_ttl(ttl)
+
+        with self._lock:
+            now = self._clock()
+            self._evict_expired(now)
+
+            nonce = secrets.token_hex(16)
+            while nonce in self._challenges:
+                nonce = secrets.token_hex(16)
+
+            challenge = Challenge(
+                nonce=nonce,
+                difficulty=difficulty,
+                expires_at=now + ttl,
+                version=version,
+            )
+            self._challenges[nonce] = challenge
+
+            while len(self._challenges) > self.max_challenges:
+                self._challenges.popitem(last=False)
+
+        return challenge
+
+    def get(self, nonce: str) -> Optional[Challenge]:
+        """
+        Look up an outstanding challenge.
+        :param nonce: The nonce of the challenge.
+        :return: The challenge, or None if it is unknown, expired or redeemed.
+        """
+        with self._lock:
+            return self._lookup(nonce, self._clock())
+
+    def consume(self, nonce: str, solution: int) -> bool:
+        """
+        Redeem a solution for a challenge.
+
+        Checking the solution and removing the challenge happen under one lock,
+        so of concurrent attempts with valid solutions exactly one succeeds.
+        :param nonce: The nonce of the challenge.
+        :param solution: The solution offered for it.
+        :return: True if the challenge was outstanding and the solution is valid,
+            False otherwise.
+        """
+        with self._lock:
+            challenge = self._lookup(nonce, self._clock())
+            if challenge is None:
+                return False
+
+            if not PowDriver.validate(
+                challenge.nonce, challenge.difficulty, solution, challenge.version
+            ):
+                return False
+
+            del self._challenges[nonce]
+
+        return True
+
+    def revoke(self, nonce: str) -> bool:
+        """
+        Stop tracking a challenge without redeeming it.
+        :param nonce: The nonce of the challenge.
+        :return: True if the challenge was being tracked.
+        """
+        with self._lock:
+            return self._challenges.pop(nonce, None) is not None
+
+    def purge(self) -> int:
+        """
+        Drop every expired challenge.
+        :return: How many challenges were dropped.
+        """
+        with self._lock:
+            now = self._clock()
+            expired = [
+                nonce for nonce, challenge in self._challenges.items()
+                if challenge.expires_at <= now
+            ]
+            for nonce in expired:
+                del self._challenges[nonce]
+
+        return len(expired)
+
+    def _lookup(self, nonce: str, now: float) -> Optional[Challenge]:
+        challenge = self._challenges.get(nonce)
+        if challenge is not None and challenge.expires_at <= now:
+            del self._challenges[nonce]
+            return None
+
+        return challenge
+
+    def _evict_expired(self, now: float):
+        # Only the oldest end is checked, to keep issuing in constant time
+        while self._challenges:
+            challenge = next(iter(self._challenges.values()))
+            if challenge.expires_at > now:
+                break
+            self._challenges.popitem(last=False)
+
+
+class SignedChallengeManager:
+    """
+    Issue proof of work challenges that verify themselves.
+
+    The difficulty and the expiry of a challenge are part of its nonce, along
+    with a random part and an HMAC tag over all of them. Any gateway holding
+    the key can check a returned solution without a shared store: the tag
+    proves the challenge was issued with that key, and has not been altered.
+
+    Expiry uses the wall clock, so gateways sharing a key need reasonably
+    synchronised clocks. Replays are only rejected by a bounded filter of the
+    challenges recently redeemed on this instance. Once the filter is full,
+    the oldest entries are dropped even if they have not yet expired, so the
+    filter size should cover the number of solutions redeemed within a TTL.
+
+    The nonce starts with the challenge format, which is covered by the tag, so
+    solvers and gateways agree on how to append the counter.
+    """
+    _TAG_SIZE = 16
+    _TAG_PATTERN = re.compile(f'[0-9a-f]{{{_TAG_SIZE * 2}}}')
+    _VERSIONS = frozenset(version.value for version in PowVersion)
+
+    def __init__(self,
+                 key: bytes,
+                 *,
+                 difficulty: int = 20,
+                 ttl: float = 60.0,
+                 max_redeemed: int = 4096,
+                 old_keys: Sequence[bytes] = (),
+                 clock: Callable[[], float] = time.time,
+                 version: PowVersion = PowVersion.V1,
+                 ):
+        """
+        :param key: The secret key shared by all gateways to sign challenges with.
+        :param difficulty: The default difficulty of issued challenges.
+        :param ttl: The default number of seconds a challenge can be redeemed for.
+        :param max_redeemed: How many redeemed challenges to remember at most.
+        :param old_keys: Keys challenges are still accepted from, but no longer
+            issued with, for rotating the key.
+        :param clock: The clock expiry times are measured with, in seconds
+            since the epoch.
+        :param version: The default format of issued challenges.
+        """
+        for k in (key, *old_keys):
+            if not isinstance(k, bytes) or len(k) < 16:
+                raise ValueError('Challenge keys must be at least 16 bytes')
+        _check_difficulty(difficulty)
+        _check_ttl(ttl)
+        if not isinstance(max_redeemed, int) or max_redeemed < 1:
+            raise ValueError('Replay filter capacity must be a positive integer')
+
+        self.difficulty = difficulty
+        self.ttl = ttl
+        self.max_redeemed = max_redeemed
+        self.version = PowVersion(version)
+        self._keys = (key, *old_keys)
+        self._clock = clock
+        self._redeemed: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tag(self, key: bytes, payload: str) -> str:
+        return hmac.new(key, payload.encode(), hashlib.sha256).hexdigest()[:self._TAG_SIZE * 2]
+
+    def issue(self,
+              difficulty: Optional[int] = None,
+              ttl: Optional[float] = None,
+              version: Optional[PowVersion] = None,
+              ) -> Challenge:
+        """
+        Create a new signed challenge.
+        :param difficulty: The difficulty of the challenge, defaults to the
+            manager's difficulty.
+        :param ttl: How many seconds the challenge can be redeemed for, defaults
+            to the manager's TTL.
+        :param version: The format of the challenge, defaults to the manager's.
+        :return: The new challenge.
+        """
+        difficulty = self.difficulty if difficulty is None else difficulty
+        ttl = self.ttl if ttl is None else ttl
+        version = self.version if version is None else PowVersion(version)
+        _check_difficulty(difficulty)
+        _check_ttl(ttl)
+
+        # Whole seconds, rounded up so the challenge lasts at least the TTL
+        expires_at = -int(-(self._clock() + ttl) // 1)
+        payload = f'{version.value}.{difficulty}.{expires_at}.{secrets.token_hex(16)}'
+
+        return Challenge(
+            nonce=f'{payload}.{self._tag(self._keys[0], payload)}',
+            difficulty=difficulty,
+            expires_at=float(expires_at),
+            version=version,
+        )
+
+    def get(self, nonce: str) -> Optional[Challenge]:
+        """
+        Authenticate a challenge, without redeeming it.
+        :param nonce: The nonce of the challenge.
+        :return: The challenge, or None if it was not issued with one of the keys,
+            or has expired.
+        """
+        if not isinstance(nonce, str):
+            return None
+
+        payload, _, tag = nonce.rpartition('.')
+        parts = payload.split('.')
+        # The nonce comes from the requester, only compare well formed tags
+        if not self._TAG_PATTERN.fullmatch(tag) or len(parts) != 4 \
+                or parts[0] not in self._VERSIONS:
+            return None
+
+        if not any(
+            hmac.compare_digest(tag.encode(), self._tag(key, payload).encode())
+            for key in self._keys
+        ):
+            return None
+
+        # The tag is valid, so the fields are as they were issued
+        difficulty, expires_at = int(parts[1]), int(parts[2])
+        if expires_at <= self._clock():
+            return None
+
+        return Challenge(
+            nonce=nonce,
+            difficulty=difficulty,
+            expires_at=float(expires_at),
+            version=PowVersion(parts[0]),
+        )
+
+    def consume(self, nonce: str, solution: int) -> bool:
+        """
+        Redeem a solution for a challenge.
+        :param nonce: The nonce of the challenge.
+        :param solution: The solution offered for it.
+        :return: True if the challenge is authentic, has not expired or been
+            redeemed here before, and the solution is valid, False otherwise.
+        """
+        challenge = self.get(nonce)
+        if challenge is None:
+            return False
+
+        if not PowDriver.validate(
+            challenge.nonce, challenge.difficulty, solution, challenge.version
+        ):
+            return False
+
+        with self._lock:
+            now = self._clock()
+            while self._redeemed:
+                oldest, expires_at = next(iter(self._redeemed.items()))
+                if expires_at > now and len(self._redeemed) < self.max_redeemed:
+                    break
+                del self._redeemed[oldest]
+
+            if nonce in self._redeemed:
+                return False
+            self._redeemed[nonce] = challenge.expires_at
+
+        return True
+
+
+def _check_difficulty(difficulty: int):
+    if not isinstance(difficulty, int) or difficulty < 1 or difficulty > 256:
+        raise ValueError('Difficulty must be an integer between 1 and 256')
+
+
+def _check_ttl(ttl: float):
+    if ttl <= 0:
+        raise ValueError('Challenge TTL must be positive')
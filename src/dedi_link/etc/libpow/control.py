@@ -0,0 +1,174 @@
+"""
+Control block of a running proof of work search
+"""
+
+import struct
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Optional
+
+
+class PowStoppedError(RuntimeError):
+    """
+    Raised when a search is stopped through its control block before finishing
+    """
+
+
+class PowControl:
+    """
+    A stop flag and progress counters shared with a running search.
+
+    The block lives in shared memory, so a search running in a worker process can
+    be stopped and observed from the event loop. Pickling a control block only
+    carries its name, and the receiving process attaches to the same memory.
+
+    Each concurrent writer should count its progress in its own slot, the total
+    is the sum of all slots. Writers searching shards of the same challenge can
+    also record the solution they found in their slot, so the others know when
+    their remaining counters can no longer hold the lowest one.
+    """
+
+    _STOP = struct.Struct('=i')
+    _COUNTER = struct.Struct('=Q')
+    _FOUND = struct.Struct('=Q')
+    _HEADER_SIZE = 8
+
+    def __init__(self, slots: int = 1, name: Optional[str] = None):
+        """
+        :param slots: How many progress counters to allocate.
+        :param name: The shared memory to attach to. A new block is created if
+            not given.
+        """
+        if slots < 1:
+            raise ValueError('A control block needs at least one slot')
+
+        self.slots = slots
+        self._owner = name is None
+
+        if self._owner:
+            # New shared memory is zero filled, so the flag is clear and counters at zero
+            self._shm = shared_memory.SharedMemory(
+                create=True,
+                size=self._HEADER_SIZE + (self._COUNTER.size + self._FOUND.size * 2) * slots,
+            )
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+
+    def __getstate__(self) -> dict:
+        return {'slots': self.slots, 'name': self._shm.name}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['slots'], state['name'])
+
+    def __enter__(self) -> 'PowControl':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def stop(self):
+        """
+        Ask the search to stop as soon as possible.
+        """
+        self._STOP.pack_into(self._shm.buf, 0, 1)
+
+    @property
+    def stopped(self) -> bool:
+        """
+        Whether the search has been asked to stop.
+        :return: True if stop has been called, in any process.
+        """
+        return self._STOP.unpack_from(self._shm.buf, 0)[0] != 0
+
+    @property
+    def tried(self) -> int:
+        """
+        How many candidates have been hashed so far, over all slots.
+        :return: The number of candidates.
+        """
+        return sum(
+            self._COUNTER.unpack_from(self._shm.buf, self._slot_offset(slot))[0]
+            for slot in range(self.slots)
+        )
+
+    def _slot_offset(self, slot: int) -> int:
+        if not 0 <= slot < self.slots:
+            raise IndexError('Control block slot out of range')
+
+        return self._HEADER_SIZE + self._COUNTER.size * slot
+
+    def _found_offset(self, slot: int) -> int:
+        self._slot_offset(slot)
+
+        return self._HEADER_SIZE + self._COUNTER.size * self.slots + self._FOUND.size * 2 * slot
+
+    def record_solution(self, counter: int, slot: int = 0):
+        """
+        Record a solution found by the writer of a slot.
+        :param counter: The solution found.
+        :param slot: The slot owned by the calling writer.
+        """
+        offset = self._found_offset(slot)
+        # The counter is written before the flag, so readers never see a flag without it
+        self._FOUND.pack_into(self._shm.buf, offset + self._FOUND.size, counter)
+        self._FOUND.pack_into(self._shm.buf, offset, 1)
+
+    @property
+    def solution(self) -> Optional[int]:
+        """
+        The lowest solution recorded so far, over all slots.
+        :return: The solution, or None if none has been recorded.
+        """
+        solutions = []
+
+        for slot in range(self.slots):
+            offset = self._found_offset(slot)
+            if self._FOUND.unpack_from(self._shm.buf, offset)[0]:
+                solutions.append(
+                    self._FOUND.unpack_from(self._shm.buf, offset + self._FOUND.size)[0]
+                )
+
+        return min(solutions, default=None)
+
+    def add_tried(self, count: int, slot: int = 0):
+        """
+        Record progress of the search.
+        :param count: How many more candidates have been hashed.
+        :param slot: The counter to add to, owned by the calling writer.
+        """
+        offset = self._slot_offset(slot)
+        current = self._COUNTER.unpack_from(self._shm.buf, offset)[0]
+        self._COUNTER.pack_into(self._shm.buf, offset, current + count)
+
+    @contextmanager
+    def native(self, ffi, slot: int = 0):
+        """
+        Expose the stop flag and a progress counter to native code.
+
+        The pointers are only valid inside the context.
+        :param ffi: The FFI instance the native library is loaded with.
+        :param slot: The counter the native code adds to.
+        :return: A (stop flag, progress counter) pair of pointers.
+        """
+        offset = self._slot_offset(slot)
+        buffer = ffi.from_buffer(self._shm.buf)
+
+        try:
+            yield (
+                ffi.cast('volatile int *', buffer),
+                ffi.cast('volatile unsigned long long *', buffer + offset),
+            )
+        finally:
+            ffi.release(buffer)
+
+    def close(self):
+        """
+        Detach from the shared memory, freeing it if this block created it.
+        """
+        if self._shm is None:
+            return
+
+        shm, self._shm = self._shm, None
+        shm.close()
+        if self._owner:
+            shm.unlink()
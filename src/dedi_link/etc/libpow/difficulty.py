@@ -0,0 +1,233 @@
+"""
+Adaptive difficulty for issued proof of work challenges
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Callable, Hashable
+
+from .libpow import PowDriver
+from .native import cache_dir
+
+
+CALIBRATION_FILE = 'calibration.json'
+
+
+def _calibration_key(driver: PowDriver, native: bool) -> str:
+    if native:
+        try:
+            backend = f'native-{driver.native_kernel.name.lower()}'
+        except (OSError, RuntimeError):
+            backend = 'native'
+    else:
+        backend = f'python-{sys.implementation.name}-{sys.version_info[0]}.{sys.version_info[1]}'
+
+    return f'{platform.node()}/{platform.machine()}/{backend}'
+
+
+def calibrated_hash_rate(driver: PowDriver,
+                         native: Optional[bool] = None,
+                         path: Optional[Path] = None,
+                         ) -> float:
+    """
+    Get the hash rate of a backend, measuring it at most once per host.
+
+    The per process calibration of PowDriver.hash_rate is backed by a file in
+    the cache directory, keyed by host, architecture and backend, so new
+    processes start with the rate measured by an earlier one. Failing to read
+    or write the file only costs a new measurement.
+    :param driver: The driver to measure with.
+    :param native: Whether to get the rate of the native library or the Python
+        implementation, defaults to the one the driver solves with.
+    :param path: The calibration file, defaults to one in the cache directory.
+    :return: The single thread hash rate in hashes per second.
+    """
+    if native is None:
+        native = driver.uses_native
+    path = cache_dir() / CALIBRATION_FILE if path is None else Path(path)
+
+    def measure() -> float:
+        key = _calibration_key(driver, native)
+
+        try:
+            rates = json.loads(path.read_text())
+        except (OSError, ValueError):
+            rates = {}
+        if not isinstance(rates, dict):
+            rates = {}
+
+        rate = rates.get(key)
+        if isinstance(rate, (int, float)) and rate > 0:
+            return float(rate)
+
+        rate = driver.measure_hash_rate(native)
+        rates[key] = rate
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=path.parent, delete=False) as f:
+                json.dump(rates, f)
+            os.replace(f.name, path)
+        except OSError:
+            pass
+
+        return rate
+
+    return driver.hash_rate(native, measure)
+
+
+class DifficultyController:
+    """
+    Pick the difficulty of new challenges from the hash rate and the load.
+
+    The base difficulty is the highest one a node hashing at the calibrated rate
+    solves within the target solve time on average. While the rate of incoming
+    requests for a network stays within the target rate, challenges for it are
+    issued at the base difficulty. Above it, the difficulty goes up by one bit
+    for every doubling of the excess, as each bit halves the rate a requester
+    can sustain. The same applies to the total rate over all networks, if a
+    target is set for it. The difficulty never leaves the configured bounds.
+
+    Request rates are exponentially decaying averages over a time window, so
+    the difficulty comes back down on its own once a storm is over. Only the
+    most recently active networks are tracked, up to a fixed number.
+    """
+
+    def __init__(self,
+                 *,
+                 target_solve_time: float = 1.0,
+                 target_rate: float = 1.0,
+                 target_total_rate: Optional[float] = None,
+                 min_difficulty: int = 8,
+                 max_difficulty: int = 32,
+                 window: float = 60.0,
+                 hash_rate: Optional[float] = None,
+                 max_networks: int = 1024,
+                 clock: Callable[[], float] = time.monotonic,
+                 ):
+        """
+        :param target_solve_time: How many seconds a solve should take on average,
+            when not under load.
+        :param target_rate: How many requests per second a network may receive
+            before its difficulty goes up.
+        :param target_total_rate: How many requests per second all networks
+            together may receive before every difficulty goes up. Not limited
+            if not given.
+        :param min_difficulty: The lowest difficulty to issue.
+        :param max_difficulty: The highest difficulty to issue.
+        :param window: The time constant of the request rate averages, in seconds.
+        :param hash_rate: The hash rate solve times are estimated for, defaults
+            to the calibrated single thread rate of this host.
+        :param max_networks: How many networks to track the request rate of.
+        :param clock: The clock request times are measured with.
+        """
+        if target_solve_time <= 0 or target_rate <= 0 or window <= 0:
+            raise ValueError('Targets and window must be positive')
+        if target_total_rate is not None and target_total_rate <= 0:
+            raise ValueError('Targets and window must be positive')
+        if not 1 <= min_difficulty <= max_difficulty <= 256:
+            raise ValueError('Difficulty bounds must satisfy 1 <= min <= max <= 256')
+        if not isinstance(max_networks, int) or max_networks < 1:
+            raise ValueError('Network capacity must be a positive integer')
+
+        self.target_solve_time = target_solve_time
+        self.target_rate = target_rate
+        self.target_total_rate = target_total_rate
+        self.min_difficulty = min_difficulty
+        self.max_difficulty = max_difficulty
+        self.window = window
+        self.max_networks = max_networks
+        self._hash_rate = hash_rate
+        self._clock = clock
+        # Per network, and over all networks: (decayed rate, time of last update)
+        self._rates: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+        self._total = (0.0, clock())
+        self._lock = threading.Lock()
+
+    @property
+    def hash_rate(self) -> float:
+        """
+        The hash rate solve times are estimated for, calibrating on first use.
+        :return: The rate in hashes per second.
+        """
+        if self._hash_rate is None:
+            self._hash_rate = calibrated_hash_rate(PowDriver())
+
+        return self._hash_rate
+
+    @property
+    def base_difficulty(self) -> int:
+        """
+        The difficulty issued when not under load.
+        :return: The highest difficulty solved within the target solve time on
+            average, within the bounds.
+        """
+        bits = math.floor(math.log2(max(self.hash_rate * self.target_solve_time, 1)))
+
+        return min(max(bits, self.min_difficulty), self.max_difficulty)
+
+    def _decay(self, entry: tuple[float, float], now: float) -> float:
+        rate, updated = entry
+        return rate * math.exp(-max(now - updated, 0) / self.window)
+
+    def record_request(self, network_id: Hashable):
+        """
+        Count an incoming request, such as an AuthRequest, for a network.
+        :param network_id: The network the request is for.
+        """
+        with self._lock:
+            now = self._clock()
+            entry = self._rates.pop(network_id, (0.0, now))
+            self._rates[network_id] = (self._decay(entry, now) + 1 / self.window, now)
+            self._total = (self._decay(self._total, now) + 1 / self.window, now)
+
+            while len(self._rates) > self.max_networks:
+                self._rates.popitem(last=False)
+
+    def request_rate(self, network_id: Optional[Hashable] = None) -> float:
+        """
+        The recent rate of incoming requests.
+        :param network_id: The network to get the rate of, or None for the
+            total over all networks.
+        :return: The rate in requests per second.
+        """
+        with self._lock:
+            now = self._clock()
+            if network_id is None:
+                return self._decay(self._total, now)
+
+            entry = self._rates.get(network_id)
+            return 0.0 if entry is None else self._decay(entry, now)
+
+    def difficulty(self, network_id: Optional[Hashable] = None) -> int:
+        """
+        The difficulty to issue the next challenge for a network with.
+        :param network_id: The network the challenge is for, or None to only
+            consider the total load.
+        :return: The difficulty.
+        """
+        excess = 1.0
+        if network_id is not None:
+            excess = max(excess, self.request_rate(network_id) / self.target_rate)
+        if self.target_total_rate is not None:
+            excess = max(excess, self.request_rate() / self.target_total_rate)
+
+        difficulty = self.base_difficulty + math.ceil(math.log2(excess))
+
+        return min(max(difficulty, self.min_difficulty), self.max_difficulty)
+
+    def expected_solve_time(self, difficulty: int) -> float:
+        """
+        The average time to solve a challenge at the calibrated hash rate.
+        :param difficulty: The difficulty of the challenge.
+        :return: The expected time in seconds.
+        """
+        return 2 ** difficulty / self.hash_rate
@@ -0,0 +1,64 @@
+"""
+Waiting on Proof of Work searches running in an executor
+"""
+
+import asyncio
+from typing import Optional, Callable, Any
+
+from .control import PowControl
+
+
+PROGRESS_INTERVAL = 0.25
+
+
+def abandoned_solve_callback(control: PowControl) -> Callable[[asyncio.Future], None]:
+    """
+    Create a callback to clean up after a solve nobody waits for any more.
+    :param control: The control block the solve was started with.
+    :return: The callback to add to the future of the solve.
+    """
+    def callback(future: asyncio.Future):
+        # The outcome is not needed, retrieving it keeps asyncio from logging it
+        if not future.cancelled():
+            future.exception()
+        control.close()
+
+    return callback
+
+
+async def watch_solve(future: asyncio.Future,
+                      control: PowControl,
+                      timeout: Optional[float],
+                      progress: Optional[Callable[[int], Any]],
+                      ) -> int:
+    """
+    Wait for a solve running in an executor, reporting progress and enforcing
+    the deadline.
+    :param future: The future of the running solve.
+    :param control: The control block the solve was started with.
+    :param timeout: How many seconds to wait before stopping the solve.
+    :param progress: Called with the number of candidates hashed so far.
+    :return: The result of the solve.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+
+    while not future.done():
+        wait = None if progress is None else PROGRESS_INTERVAL
+        if deadline is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                control.stop()
+                raise TimeoutError('PoW solving timed out')
+            wait = remaining if wait is None else min(wait, remaining)
+
+        await asyncio.wait((future,), timeout=wait)
+
+        if progress is not None and not future.done():
+            progress(control.tried)
+
+    result = future.result()
+    if progress is not None:
+        progress(control.tried)
+
+    return result
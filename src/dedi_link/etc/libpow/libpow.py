@@ -5,16 +5,44 @@ Proof of Work Driver
 import sys
 import os
 import asyncio
-import hashlib
+import threading
 import importlib.resources as pkg_resources
-from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from dataclasses import dataclass, replace
+from typing import Optional, Iterable, Callable, Any
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from cffi import FFI
 
+from dedi_link.etc.enums import PowKernel, PowExecutorKind, PowVersion
+from .native import CDEF, PowLibraryError, load_or_build, probe
+from .control import PowControl, PowStoppedError
+from .plan import PowPlan, choose_strategy
+from .search import MAX_COUNTER, python_search, python_solve, python_solve_sharded, \
+    python_hash_rate
+from .validation import unpack_challenge, is_native_batch, python_validate, \
+    native_validator, faster_validator
+from .executor import watch_solve, abandoned_solve_callback
+
 
 ffi = FFI()
-ffi.cdef("""
-    int solve_pow(const char *nonce, int difficulty, unsigned long long *result);
-""")
+ffi.cdef(CDEF)
+
+_POW_OK = 0
+_POW_NOT_FOUND = 2
+_POW_STOPPED = 3
+_KERNEL_AUTO = -1
+
+
+@dataclass(frozen=True)
+class PowRangeResult:
+    """
+    The outcome of searching a range of counters.
+
+    A range that has been searched completely without a solution has no
+    solution, and the next range can start right after it.
+    """
+    solution: Optional[int]
+    tried: int
 
 
 class PowDriver:
@@ -23,131 +51,779 @@ class PowDriver:
     falling back to Python implementation if the library is not available.
     """
     _lib = None
-    _executor = ProcessPoolExecutor()
+    _ffi = ffi
+    _lib_error: Optional[PowLibraryError] = None
+    _executors: dict[PowExecutorKind, Executor] = {}
+    _executor_kind = PowExecutorKind.AUTO
+    _executor_workers: Optional[int] = None
+    _executor_lock = threading.Lock()
+    _hash_rates: dict[bool, float] = {}
+    _validators: dict[PowVersion, Callable[[str, int, int], bool]] = {}
 
-    @property
-    def lib(self):
+    def __init__(self, threads: Optional[int] = None):
         """
-        C library getter.
+        :param threads: How many native threads to search with. Defaults to the
+            number of CPUs available. The result does not depend on this value.
+        """
+        if threads is None:
+            threads = os.cpu_count() or 1
+        if not isinstance(threads, int) or threads < 1:
+            raise ValueError('Thread count must be a positive integer')
+
+        self.threads = threads
+        self.last_plan: Optional[PowPlan] = None
+
+    def __enter__(self) -> 'PowDriver':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    @classmethod
+    def configure_executor(cls,
+                           kind: PowExecutorKind = PowExecutorKind.AUTO,
+                           max_workers: Optional[int] = None,
+                           ):
+        """
+        Configure the executor used by solve_async.
+
+        Executors are shared by all drivers and only created when first needed.
+        Running executors are shut down, and the next ones are built with the new
+        settings.
+        :param kind: Run in a process pool, a thread pool, inline on the event loop,
+            or pick one of these for each search from its expected cost.
+        :param max_workers: The size of the pools, defaults to the executors' own default.
+        """
+        if not isinstance(kind, PowExecutorKind):
+            raise TypeError('Executor kind must be a PowExecutorKind')
+        if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+            raise ValueError('Executor size must be a positive integer')
+
+        cls.shutdown()
+
+        with cls._executor_lock:
+            cls._executor_kind = kind
+            cls._executor_workers = max_workers
+
+    @classmethod
+    def _get_executor(cls, kind: PowExecutorKind) -> Optional[Executor]:
+        """
+        Get a shared executor, creating it on first use.
+        :param kind: The kind of executor to get, AUTO is not accepted.
+        :return: The executor, or None if solving runs inline.
+        """
+        if kind == PowExecutorKind.INLINE:
+            return None
+
+        with cls._executor_lock:
+            if kind not in cls._executors:
+                if kind == PowExecutorKind.PROCESS:
+                    cls._executors[kind] = ProcessPoolExecutor(
+                        max_workers=cls._executor_workers,
+                    )
+                elif kind == PowExecutorKind.THREAD:
+                    cls._executors[kind] = ThreadPoolExecutor(
+                        max_workers=cls._executor_workers,
+                        thread_name_prefix='pow-solver',
+                    )
+                else:
+                    raise ValueError(f'Cannot create an executor of kind {kind}')
+
+            return cls._executors[kind]
+
+    @classmethod
+    def _process_workers(cls) -> int:
+        """
+        The number of workers in the shared process pool.
+        :return: The configured size, or the default size of a process pool.
+        """
+        return cls._executor_workers or os.cpu_count() or 1
+
+    @classmethod
+    def shutdown(cls, wait: bool = True):
+        """
+        Shut down the shared executors, if any have been created.
+
+        It is safe to keep using the drivers afterwards, new executors are
+        created on the next asynchronous solve.
+        :param wait: Whether to wait for pending solves to finish.
+        """
+        with cls._executor_lock:
+            executors, cls._executors = cls._executors, {}
+
+        for executor in executors.values():
+            executor.shutdown(wait=wait)
+
+    @classmethod
+    def _after_fork(cls):
+        # The pools belong to the parent process, the child starts without any
+        cls._executors = {}
+        cls._executor_lock = threading.Lock()
+
+    @staticmethod
+    def _load_prebuilt():
+        """
+        Load the native library shipped with the package.
         :return: The Lib object from CFFI interface, pointing to the native library.
         """
-        if self._lib is None:
-            if sys.platform == 'win32':
-                lib_name = 'libpow.dll'
-            elif sys.platform == 'darwin':
-                raise RuntimeError("Native library is not available on macOS")
-            else:
-                lib_name = 'libpow.so'
+        if sys.platform == 'win32':
+            lib_name = 'libpow.dll'
+        elif sys.platform == 'darwin':
+            raise PowLibraryError("No prebuilt native library is shipped for macOS")
+        else:
+            lib_name = 'libpow.so'
+
+        try:
+            lib_path = pkg_resources.files('dedi_link.data.bin') / lib_name
+        except (ImportError, FileNotFoundError, AttributeError) as e:
+            raise PowLibraryError(f"Native library {lib_name} not found") from e
+
+        if not os.path.exists(lib_path):
+            raise PowLibraryError(f"Native library {lib_path} not found")
+
+        if sys.platform == 'win32':
+            os.add_dll_directory(str(lib_path.parent))
+        try:
+            lib = ffi.dlopen(str(lib_path))
+        except OSError as e:
+            raise PowLibraryError(f"Failed to load native library {lib_path}") from e
+
+        probe(lib, ffi)
+
+        return lib
+
+    @classmethod
+    def _load_native(cls) -> tuple[Any, FFI]:
+        """
+        Load the native library on first use.
+
+        The prebuilt library is used if it loads and passes its self check.
+        Otherwise, the library is built from source and cached, see the build
+        module. If neither works, the failure is remembered and PowLibraryError
+        is raised without trying again.
+        :return: The library and the FFI instance it is bound to.
+        """
+        if cls._lib is None:
+            if cls._lib_error is not None:
+                raise PowLibraryError('Native library is not available') from cls._lib_error
 
             try:
-                lib_path = pkg_resources.files('dedi_link.data.bin') / lib_name
-            except (ImportError, FileNotFoundError, AttributeError) as e:
-                raise RuntimeError(f"Native library {lib_name} not found") from e
+                lib, lib_ffi = cls._load_prebuilt(), ffi
+            except PowLibraryError as prebuilt_error:
+                try:
+                    lib, lib_ffi = load_or_build()
+                except PowLibraryError as e:
+                    PowDriver._lib_error = e
+                    raise e from prebuilt_error
 
-            if not os.path.exists(lib_path):
-                raise RuntimeError(f"Native library {lib_path} not found")
+            PowDriver._ffi = lib_ffi
+            PowDriver._lib = lib
 
-            if sys.platform == 'win32':
-                os.add_dll_directory(str(lib_path.parent))
-            PowDriver._lib = ffi.dlopen(str(lib_path))
+        return cls._lib, cls._ffi
 
-        return self._lib
+    @property
+    def lib(self):
+        """
+        C library getter.
+        :return: The Lib object from CFFI interface, pointing to the native library.
+        """
+        return self._load_native()[0]
+
+    @property
+    def lib_ffi(self) -> FFI:
+        """
+        The FFI instance the native library is bound to.
+        :return: The FFI instance to allocate native arguments with.
+        """
+        return self._load_native()[1]
 
-    def _c_solve(self, nonce: str, difficulty: int) -> int:
+    def _c_solve(self, nonce: str, difficulty: int, control: Optional[PowControl] = None) -> int:
         """
         Solve a proof of work challenge with CFFI interface.
 
         This function calls a custom C library for native acceleration of the
-        SHA-256 hashing.
+        SHA-256 hashing. With more than one thread configured, the counter space
+        is searched in parallel, still returning the lowest valid counter.
         :param nonce: The nonce to use for the proof of work challenge.
         :param difficulty: How many leading zeros the hash should have.
+        :param control: An optional control block to stop the search and report
+            progress through.
         :return: The valid nonce that solves the challenge.
         """
         if not isinstance(nonce, str) or not isinstance(difficulty, int):
             raise TypeError('Expected nonce: str and difficulty: int')
 
-        res_ptr = ffi.new('unsigned long long *')
-        ret = self.lib.solve_pow(nonce.encode(), difficulty, res_ptr)
+        res_ptr = self.lib_ffi.new('unsigned long long *')
+        if control is not None:
+            with control.native(self.lib_ffi) as (stop_ptr, tried_ptr):
+                ret = self.lib.solve_pow_ctl(
+                    nonce.encode(), difficulty, self.threads, stop_ptr, tried_ptr, res_ptr
+                )
+
+            if ret == _POW_STOPPED:
+                raise PowStoppedError('PoW solving was stopped')
+        elif self.threads > 1:
+            ret = self.lib.solve_pow_mt(nonce.encode(), difficulty, self.threads, res_ptr)
+        else:
+            ret = self.lib.solve_pow(nonce.encode(), difficulty, res_ptr)
 
         if ret != 0:
             raise RuntimeError('PoW solving failed')
 
         return res_ptr[0]
 
-    @staticmethod
-    def _python_solve(nonce: str, difficulty: int) -> int:
+    def native_kernels(self) -> list[PowKernel]:
+        """
+        List the hashing kernels searches can run with on this host.
+
+        A kernel is available when the native library has it built in, the CPU
+        supports it, and it passes a self test against the scalar kernel.
+        :return: The available kernels.
+        """
+        return [
+            kernel for kernel in PowKernel
+            if self.lib.pow_kernel_available(kernel.value)
+        ]
+
+    @property
+    def native_kernel(self) -> PowKernel:
+        """
+        The hashing kernel native searches run with in this process.
+
+        Unless one has been selected, it is picked on first use: the kernels the
+        CPU supports are timed on a short run, and the fastest one is kept.
+        :return: The kernel in use.
+        """
+        return PowKernel(self.lib.pow_kernel_active())
+
+    def select_native_kernel(self, kernel: Optional[PowKernel] = None) -> PowKernel:
         """
-        Solve a proof of work challenge with Python implementation.
+        Run all following native searches of this process with a given kernel.
 
-        This is a fallback implementation that uses Python's hashlib
-        to compute the SHA-256 hash and find a valid nonce.
+        The selection is per process, worker processes of solve_async keep picking
+        their own kernel.
+        :param kernel: The kernel to use, or None to go back to automatic selection.
+        :return: The kernel now in use.
+        """
+        selected = self.lib.pow_kernel_select(_KERNEL_AUTO if kernel is None else kernel.value)
+        if selected < 0:
+            raise ValueError(f'Hashing kernel {kernel} is not available on this host')
+
+        # The calibrated rate belongs to the previous kernel
+        PowDriver._hash_rates.pop(True, None)
+
+        return PowKernel(selected)
+
+    def native_hash_rate(self,
+                         kernel: Optional[PowKernel] = None,
+                         iterations: int = 1 << 20,
+                         nonce: str = 'dfe041b4f60cb54d082e542b109e392a',
+                         ) -> float:
+        """
+        Measure the single thread hash rate of a native hashing kernel.
+
+        PowKernel.LEGACY is the original per-candidate formatting and one-shot
+        hashing loop, useful as a baseline for the other kernels.
+        :param kernel: The kernel to measure, defaults to the one searches run with.
+        :param iterations: How many candidates to hash.
+        :param nonce: The nonce to hash candidates for.
+        :return: The measured rate in hashes per second.
+        """
+        kernel_value = _KERNEL_AUTO if kernel is None else kernel.value
+        rate = self.lib.pow_hash_rate(nonce.encode(), kernel_value, iterations)
+        if rate < 0:
+            raise RuntimeError('Hash rate measurement failed')
+
+        return rate
+
+    python_hash_rate = staticmethod(python_hash_rate)
+
+    def _c_solve_range(self,
+                       nonce: str,
+                       difficulty: int,
+                       start: int,
+                       count: int,
+                       *,
+                       control: Optional[PowControl] = None,
+                       version: PowVersion = PowVersion.V1,
+                       ) -> PowRangeResult:
+        """
+        Search a range of counters with CFFI interface.
         :param nonce: The nonce to use for the proof of work challenge.
         :param difficulty: How many leading zeros the hash should have.
-        :return: The valid nonce that solves the challenge.
+        :param start: The first counter to try.
+        :param count: How many counters to try.
+        :param control: An optional control block to stop the search and report
+            progress through.
+        :param version: How the counter is appended to the nonce.
+        :return: The lowest solution in the range, if any, and how many counters
+            were tried.
+        """
+        res_ptr = self.lib_ffi.new('unsigned long long *')
+
+        def search(stop_ptr, search_tried_ptr) -> int:
+            encoded = nonce.encode()
+            if version == PowVersion.V2:
+                return self.lib.solve_pow_v2_ctl(
+                    encoded, len(encoded), difficulty, start, count, self.threads,
+                    stop_ptr, search_tried_ptr, res_ptr,
+                )
+            return self.lib.solve_pow_range_ctl(
+                encoded, difficulty, start, count, self.threads,
+                stop_ptr, search_tried_ptr, res_ptr,
+            )
+
+        if control is None:
+            tried_ptr = self.lib_ffi.new('unsigned long long *')
+            ret = search(self.lib_ffi.NULL, tried_ptr)
+            tried = tried_ptr[0]
+        else:
+            before = control.tried
+            with control.native(self.lib_ffi) as (stop_ptr, control_tried_ptr):
+                ret = search(stop_ptr, control_tried_ptr)
+            tried = control.tried - before
+
+        if ret == _POW_STOPPED:
+            raise PowStoppedError('PoW solving was stopped')
+        if ret == _POW_NOT_FOUND:
+            return PowRangeResult(solution=None, tried=tried)
+        if ret != _POW_OK:
+            raise RuntimeError('PoW solving failed')
+
+        return PowRangeResult(solution=res_ptr[0], tried=tried)
+
+    def solve_range(self,
+                    nonce: str,
+                    difficulty: int,
+                    start: int,
+                    count: int,
+                    *,
+                    control: Optional[PowControl] = None,
+                    version: PowVersion = PowVersion.V1,
+                    native: Optional[bool] = None,
+                    ) -> PowRangeResult:
+        """
+        Search the counters in [start, start + count) for the lowest solution.
+
+        This allows sharding a challenge over processes or hosts, and resuming a
+        long search range by range. Not finding a solution in the range is not an
+        error, the result then has no solution. A stopped range has to be searched
+        again as a whole, as it may have been left with gaps.
+        :param nonce: The nonce to use for the proof of work challenge.
+        :param difficulty: How many leading zeros the hash should have.
+        :param start: The first counter to try.
+        :param count: How many counters to try.
+        :param control: An optional control block to stop the search and report
+            progress through. PowStoppedError is raised if the search is stopped.
+        :param version: How the counter is appended to the nonce.
+        :param native: Whether to search with the native library or the Python
+            implementation, defaults to the native library if it can be loaded.
+        :return: The lowest solution in the range, if any, and how many counters
+            were tried.
         """
         if not isinstance(nonce, str) or not isinstance(difficulty, int):
             raise TypeError('Expected nonce: str and difficulty: int')
         if difficulty < 1 or difficulty > 256:
             raise ValueError('Difficulty must be between 1 and 256')
+        if any(not isinstance(value, int) or isinstance(value, bool) for value in (start, count)):
+            raise TypeError('Expected start: int and count: int')
+        if start < 0 or not 0 <= count <= MAX_COUNTER or start + count > MAX_COUNTER + 1:
+            raise ValueError('Range must lie within the unsigned 64-bit counter space')
+
+        if native is None:
+            native = self.uses_native
+        if native:
+            return self._c_solve_range(
+                nonce, difficulty, start, count, control=control, version=version,
+            )
+
+        solution = python_search(
+            nonce, difficulty, start, start + count, control=control, version=version,
+        )
+        tried = count if solution is None else solution - start + 1
 
-        target_prefix = '0' * difficulty
+        return PowRangeResult(solution=solution, tried=tried)
 
-        for counter in range(1 << 64):  # covers entire 64-bit unsigned range
-            data = f'{nonce}{counter}'.encode()
-            digest = hashlib.sha256(data).hexdigest()
-            bin_hash = bin(int(digest, 16))[2:].zfill(256)
+    @property
+    def uses_native(self) -> bool:
+        """
+        Whether this driver solves with the native library.
+        :return: True if the native library can be loaded.
+        """
+        try:
+            return self.lib is not None
+        except (OSError, RuntimeError):
+            return False
 
-            if bin_hash.startswith(target_prefix):
-                return counter
+    def measure_hash_rate(self, native: bool) -> float:
+        """
+        Measure the hash rate of a backend, without caching it.
+        :param native: Whether to measure the native library or the Python
+            implementation.
+        :return: The single thread hash rate in hashes per second.
+        """
+        if native:
+            return self.native_hash_rate(iterations=1 << 16)
 
-        raise RuntimeError('No valid nonce found within 64-bit search space')
+        return self.python_hash_rate(iterations=1 << 14)
 
-    def solve(self, nonce: str, difficulty: int) -> int:
+    def hash_rate(self,
+                  native: Optional[bool] = None,
+                  measure: Optional[Callable[[], float]] = None,
+                  ) -> float:
+        """
+        Get the calibrated hash rate of a backend, measuring it on first use.
+
+        Rates are cached for the lifetime of the process, and shared by all
+        drivers. The native rate is per thread.
+        :param native: Whether to get the rate of the native library or the
+            Python implementation, defaults to the one this driver solves with.
+        :param measure: Called to get the rate if none is cached yet, for
+            example from a persistent calibration, defaults to measure_hash_rate.
+        :return: The hash rate in hashes per second.
+        """
+        if native is None:
+            native = self.uses_native
+
+        if native not in PowDriver._hash_rates:
+            rate = self.measure_hash_rate(native) if measure is None else measure()
+            PowDriver._hash_rates[native] = rate
+
+        return PowDriver._hash_rates[native]
+
+    @classmethod
+    def _planning_ready(cls) -> bool:
+        """
+        Check whether plan can run without loading the native library or
+        measuring a hash rate.
+        :return: True if both have already happened in this process.
+        """
+        native = cls._lib is not None
+        if not native and cls._lib_error is None:
+            return False
+
+        return native in PowDriver._hash_rates
+
+    def plan(self, difficulty: int) -> PowPlan:
+        """
+        Estimate the cost of a search, and decide where solve_async runs it.
+
+        The expected work of 2^difficulty hashes is weighed against the
+        calibrated hash rate of the backend in use. If an executor kind other
+        than AUTO is configured, it is used regardless of the estimate.
+        :param difficulty: How many leading zeros the hash should have.
+        :return: The plan, with the chosen strategy and the estimate behind it.
+        """
+        native = self.uses_native
+        try:
+            hash_rate = self.hash_rate(native)
+        except RuntimeError:
+            # A failed native measurement falls back to the Python rate
+            hash_rate = self.hash_rate(False)
+        if native:
+            hash_rate *= self.threads
+
+        plan = choose_strategy(difficulty, native, hash_rate)
+        if self._executor_kind != PowExecutorKind.AUTO:
+            plan = replace(plan, strategy=self._executor_kind)
+
+        return plan
+
+    def solve(self,
+              nonce: str,
+              difficulty: int,
+              control: Optional[PowControl] = None,
+              version: PowVersion = PowVersion.V1,
+              native: Optional[bool] = None,
+              ) -> int:
         """
         Solve a proof of work challenge.
         :param nonce: The nonce to use for the proof of work challenge.
         :param difficulty: How many leading zeros the hash should have.
+        :param control: An optional control block to stop the search and report
+            progress through. PowStoppedError is raised if the search is stopped.
+        :param version: How the counter is appended to the nonce, as decided by
+            the issuer of the challenge.
+        :param native: Whether to solve with the native library or the Python
+            implementation, defaults to the native library if it can be loaded.
+            PowLibraryError is raised if the native library is asked for but
+            cannot be loaded.
         :return: The valid nonce that solves the challenge.
         """
-        try:
-            return self._c_solve(nonce, difficulty)
-        except OSError:
-            return self._python_solve(nonce, difficulty)
+        if native is None:
+            native = self.uses_native
+
+        if version == PowVersion.V2:
+            result = self.solve_range(
+                nonce, difficulty, 0, MAX_COUNTER,
+                control=control, version=version, native=native,
+            )
+            if result.solution is None:
+                raise RuntimeError('No valid nonce found within 64-bit search space')
+            return result.solution
+
+        if native:
+            return self._c_solve(nonce, difficulty, control)
 
-    async def solve_async(self, nonce: str, difficulty: int) -> int:
+        return python_solve(nonce, difficulty, control)
+
+    async def solve_async(self,
+                          nonce: str,
+                          difficulty: int,
+                          timeout: Optional[float] = None,
+                          progress: Optional[Callable[[int], Any]] = None,
+                          version: PowVersion = PowVersion.V1,
+                          ) -> int:
         """
         Asynchronous version of the solve method.
 
-        This function uses a ProcessPoolExecutor to run the solve method
-        in a separate process, allowing it to run without blocking the event loop.
+        This function runs the solve method in the configured executor, allowing
+        it to run without blocking the event loop. By default, the executor is
+        picked for each search from its expected cost, see plan.
+        Cancelling the awaiting task, or running past the timeout, stops the search
+        in the worker within a fraction of a second.
+
+        Without the native library, searches in the process pool are sharded over
+        all its workers, each searching a share of the counters.
+
+        When run inline, the search runs on the event loop, and can neither be
+        cancelled nor timed out. The first call plans in the default executor, as
+        loading the native library and calibrating block for a while.
         :param nonce: The nonce to use for the proof of work challenge.
         :param difficulty: How many leading zeros the hash should have.
+        :param timeout: How many seconds to search for before raising TimeoutError.
+        :param progress: Called periodically, and once at the end, with the number
+            of candidates hashed so far.
+        :param version: How the counter is appended to the nonce.
         :return: The valid nonce that solves the challenge.
         """
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(
-            self._executor,
-            self.solve,
-            nonce,
-            difficulty,
-        )
+        if self._planning_ready():
+            plan = self.plan(difficulty)
+        else:
+            plan = await asyncio.get_running_loop().run_in_executor(None, self.plan, difficulty)
+        self.last_plan = plan
+        executor = self._get_executor(plan.strategy)
+
+        if executor is None:
+            with PowControl() as control:
+                solution = self.solve(nonce, difficulty, control, version)
+                if progress is not None:
+                    progress(control.tried)
+                return solution
+
+        if plan.strategy == PowExecutorKind.PROCESS and not plan.native:
+            control = PowControl(slots=self._process_workers())
+            future = asyncio.ensure_future(
+                python_solve_sharded(executor, nonce, difficulty, control, version)
+            )
+        else:
+            control = PowControl()
+            future = asyncio.get_running_loop().run_in_executor(
+                executor,
+                self.solve,
+                nonce,
+                difficulty,
+                control,
+                version,
+            )
+
+        try:
+            return await watch_solve(future, control, timeout, progress)
+        finally:
+            if future.done():
+                control.close()
+            else:
+                control.stop()
+                # The worker is still using the block until it notices the flag
+                future.add_done_callback(abandoned_solve_callback(control))
+
+    @classmethod
+    def _native_validate(cls,
+                         version: PowVersion = PowVersion.V1,
+                         ) -> Optional[Callable[[str, int, int], bool]]:
+        """
+        Get a validation function backed by the native library.
+        :param version: How the counter is appended to the nonce.
+        :return: The function, or None if the library cannot be loaded.
+        """
+        try:
+            lib = cls._load_native()[0]
+        except (OSError, RuntimeError):
+            return None
+
+        return native_validator(lib, version)
+
+    @classmethod
+    def validation_path(cls,
+                        native: bool,
+                        version: PowVersion = PowVersion.V1,
+                        ) -> Optional[Callable[[str, int, int], bool]]:
+        """
+        Get the validation function of one path, whichever select_validator
+        picked, for example to benchmark the paths against each other.
+        :param native: Whether to get the native path or the Python implementation.
+        :param version: How the counter is appended to the nonce.
+        :return: The function, or None for the native path if the library
+            cannot be loaded.
+        """
+        if native:
+            return cls._native_validate(version)
+
+        return partial(python_validate, version=version)
+
+    @classmethod
+    def select_validator(cls,
+                         version: PowVersion = PowVersion.V1,
+                         ) -> Callable[[str, int, int], bool]:
+        """
+        Pick the validation paths validate uses in this process.
+
+        A native call costs about as much as hashing a short message, so the
+        native path only wins where calls into the library are cheap, such as
+        with a library built as an extension module. For each challenge format,
+        both paths are timed on a short sample, and the native one is kept if
+        it is clearly faster.
+
+        This loads, and possibly builds, the native library and runs a short
+        benchmark, so call it at start up rather than while serving requests.
+        Until it has been called, validate uses the Python implementation.
+        :param version: The challenge format to return the validation function of.
+        :return: The validation function.
+        """
+        if not cls._validators:
+            validators = {}
+            for challenge_version in PowVersion:
+                python = cls.validation_path(False, challenge_version)
+                native = cls.validation_path(True, challenge_version)
+                validators[challenge_version] = (
+                    python if native is None else faster_validator(python, native)
+                )
+
+            PowDriver._validators = validators
+
+        return cls._validators[version]
 
     @staticmethod
     def validate(nonce: str,
                  difficulty: int,
                  response: int,
+                 version: PowVersion = PowVersion.V1,
                  ) -> bool:
         """
         Validate a proof of work response.
+
+        Uses the native check_pow or check_pow_v2 export if select_validator
+        found it to be faster in this process, and the Python implementation
+        otherwise. The choice is never made here, so validating never loads the
+        native library. V1 responses the native library cannot represent always
+        use the Python implementation, and are never valid for V2.
         :param nonce: The nonce used for the proof of work challenge.
         :param difficulty: How many leading zeros the hash should have.
         :param response: The response to validate against the challenge.
+        :param version: How the counter is appended to the nonce.
         :return: True if the response is valid, False otherwise.
         """
-        data = f'{nonce}{response}'.encode()
-        h = hashlib.sha256(data).hexdigest()
-        bin_hash = bin(int(h, 16))[2:].zfill(256)
+        if difficulty <= 0:
+            return True
+        if difficulty > 256:
+            return False
+
+        # A bool response would be formatted as 'True' rather than '1'
+        if isinstance(nonce, str) and isinstance(response, int) \
+                and not isinstance(response, bool) and 0 <= response <= MAX_COUNTER:
+            validator = PowDriver._validators.get(version)
+            if validator is not None:
+                return validator(nonce, difficulty, response)
+        elif version == PowVersion.V2:
+            # A binary counter only has room for unsigned 64-bit responses
+            return False
+
+        return python_validate(nonce, difficulty, response, version)
+
+    def _c_validate_many(self,
+                         nonces: tuple[str, ...],
+                         difficulties: tuple[int, ...],
+                         responses: tuple[int, ...],
+                         ) -> list[bool]:
+        """
+        Validate a batch of proof of work responses with CFFI interface.
+
+        Every challenge must be representable natively: a nonce without NUL
+        characters, a difficulty between 1 and 256 and a response that fits
+        in an unsigned 64-bit integer.
+        :param nonces: The nonces used for the challenges.
+        :param difficulties: The difficulty of each challenge.
+        :param responses: The responses to validate.
+        :return: Whether each response is valid, in input order.
+        """
+        count = len(nonces)
+        # Nonces are passed back to back in one buffer, separated by their terminators
+        nonce_buffer = self.lib_ffi.from_buffer(('\0'.join(nonces) + '\0').encode())
+        results = self.lib_ffi.new('unsigned char[]', count)
+
+        ret = self.lib.validate_pow_batch(
+            nonce_buffer,
+            self.lib_ffi.new('int[]', difficulties),
+            self.lib_ffi.new('unsigned long long[]', responses),
+            count,
+            self.threads,
+            results,
+        )
+        if ret != 0:
+            raise RuntimeError('PoW batch validation failed')
+
+        return list(map(bool, self.lib_ffi.buffer(results)[:]))
+
+    def validate_many(self,
+                      challenges: Iterable[tuple[str, int, int]],
+                      version: PowVersion = PowVersion.V1,
+                      ) -> list[bool]:
+        """
+        Validate many proof of work responses in one call.
+
+        Uses a single native call for the whole batch when possible, fanning out
+        to multiple threads for large batches. Responses the native library cannot
+        represent are checked with validate instead.
+        :param challenges: The (nonce, difficulty, response) tuples to validate.
+        :param version: How the counter is appended to the nonces.
+        :return: Whether each response is valid, in input order. Malformed
+            items, such as tuples of the wrong length or with fields of the
+            wrong type, are not valid.
+        """
+        challenges = [unpack_challenge(challenge) for challenge in challenges]
+        if not challenges:
+            return []
+
+        if version == PowVersion.V2 or not self.uses_native:
+            return [
+                challenge is not None and self.validate(*challenge, version=version)
+                for challenge in challenges
+            ]
+
+        if None not in challenges and is_native_batch(challenges):
+            return self._c_validate_many(*zip(*challenges))
+
+        # Mixed batch, only pass on what the native library can represent
+        results = [False] * len(challenges)
+        native_indices = []
+
+        for i, challenge in enumerate(challenges):
+            if challenge is None:
+                continue
+            if is_native_batch((challenge,)):
+                native_indices.append(i)
+            else:
+                results[i] = self.validate(*challenge)
+
+        if native_indices:
+            native_results = self._c_validate_many(
+                *zip(*(challenges[i] for i in native_indices))
+            )
+            for i, result in zip(native_indices, native_results):
+                results[i] = result
+
+        return results
 
-        target = '0' * difficulty
 
-        return bin_hash.startswith(target)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=PowDriver._after_fork)  # pylint: disable=protected-access
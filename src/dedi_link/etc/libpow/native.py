@@ -0,0 +1,247 @@
+"""
+Loading and on demand building of the native Proof of Work library
+
+When no usable prebuilt library ships for the host, the library can be compiled
+from the bundled pow_solver.c against the local OpenSSL, using CFFI's API mode.
+The result is cached per source version and Python ABI, so it is only built once.
+
+Run `python -m dedi_link.etc.libpow.build` to build it ahead of time, for example
+when installing the package. Set DEDI_LINK_LIBPOW_BUILD=never to disable building,
+DEDI_LINK_CACHE_DIR to change where the library is cached, and
+DEDI_LINK_OPENSSL_DIR to build against an OpenSSL installed outside the default
+search paths.
+"""
+
+import os
+import re
+import sys
+import hashlib
+import sysconfig
+import tempfile
+import importlib.util
+import importlib.resources as pkg_resources
+from pathlib import Path
+from typing import Any
+from cffi import FFI, VerificationError
+
+
+CDEF = """
+    int solve_pow(const char *nonce, int difficulty, unsigned long long *result);
+    int solve_pow_mt(const char *nonce, int difficulty, int threads, unsigned long long *result);
+    int solve_pow_ctl(const char *nonce, int difficulty, int threads, volatile int *stop,
+                      volatile unsigned long long *tried, unsigned long long *result);
+    int solve_pow_range(const char *nonce, int difficulty, unsigned long long start,
+                        unsigned long long count, unsigned long long *result,
+                        unsigned long long *tried);
+    int solve_pow_range_ctl(const char *nonce, int difficulty, unsigned long long start,
+                            unsigned long long count, int threads, volatile int *stop,
+                            volatile unsigned long long *tried, unsigned long long *result);
+    double pow_hash_rate(const char *nonce, int kernel, unsigned long long iterations);
+    int pow_kernel_available(int kernel);
+    int pow_kernel_active(void);
+    int pow_kernel_select(int kernel);
+    int check_pow(const char *nonce, size_t nonce_len, int difficulty,
+                  unsigned long long solution);
+    int solve_pow_v2_ctl(const char *nonce, size_t nonce_len, int difficulty,
+                         unsigned long long start, unsigned long long count, int threads,
+                         volatile int *stop, volatile unsigned long long *tried,
+                         unsigned long long *result);
+    int check_pow_v2(const char *nonce, size_t nonce_len, int difficulty,
+                     unsigned long long solution);
+    int validate_pow_batch(const char *nonces, const int *difficulties,
+                           const unsigned long long *solutions, int count, int threads,
+                           unsigned char *results);
+"""
+
+# Every function the driver calls, a library missing any of them is out of date
+EXPORTS = tuple(re.findall(r'(\w+)\(', CDEF))
+
+BUILD_ENV = 'DEDI_LINK_LIBPOW_BUILD'
+CACHE_ENV = 'DEDI_LINK_CACHE_DIR'
+OPENSSL_ENV = 'DEDI_LINK_OPENSSL_DIR'
+
+# A challenge with a known lowest solution, used to check a library before use
+_PROBE_NONCE = 'dfe041b4f60cb54d082e542b109e392a'
+_PROBE_DIFFICULTY = 8
+_PROBE_SOLUTION = 559
+
+
+class PowLibraryError(OSError, RuntimeError):
+    """
+    Raised when the native library cannot be loaded, built or trusted
+    """
+
+
+def build_enabled() -> bool:
+    """
+    Check whether building the native library on demand is allowed.
+    :return: False if disabled through the environment, True otherwise.
+    """
+    return os.environ.get(BUILD_ENV, 'auto').lower() != 'never'
+
+
+def cache_dir() -> Path:
+    """
+    Get the directory where the package caches artifacts.
+    :return: The cache directory, which may not exist yet.
+    """
+    if os.environ.get(CACHE_ENV):
+        return Path(os.environ[CACHE_ENV])
+
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+    elif sys.platform == 'darwin':
+        base = Path.home() / 'Library' / 'Caches'
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+
+    return Path(base) / 'dedi_link'
+
+
+def _source() -> str:
+    try:
+        return (pkg_resources.files('dedi_link.etc.libpow') / 'pow_solver.c').read_text()
+    except (OSError, ImportError) as e:
+        raise PowLibraryError('Native library source is not available') from e
+
+
+def _module_name(source: str) -> str:
+    """
+    Name the compiled module after everything that affects the build, so a
+    cached library is never used with a different source or interpreter.
+    :param source: The C source to build.
+    :return: The module name.
+    """
+    key = '\0'.join([
+        source,
+        CDEF,
+        sysconfig.get_config_var('EXT_SUFFIX') or '',
+        sys.platform,
+        os.environ.get(OPENSSL_ENV, ''),
+    ])
+
+    return '_dedi_libpow_' + hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _builder(module_name: str, source: str) -> FFI:
+    builder = FFI()
+    builder.cdef(CDEF)
+
+    openssl_dir = os.environ.get(OPENSSL_ENV)
+    if sys.platform == 'win32':
+        libraries = ['libcrypto']
+        extra_compile_args = ['/O2']
+    else:
+        libraries = ['crypto', 'pthread']
+        extra_compile_args = ['-O3']
+
+    builder.set_source(
+        module_name,
+        source,
+        libraries=libraries,
+        include_dirs=[os.path.join(openssl_dir, 'include')] if openssl_dir else [],
+        library_dirs=[os.path.join(openssl_dir, 'lib')] if openssl_dir else [],
+        extra_compile_args=extra_compile_args,
+    )
+
+    return builder
+
+
+def build_native(force: bool = False) -> Path:
+    """
+    Compile the native library into the cache, unless it is already there.
+
+    The library is built in a temporary directory and moved into place, so
+    concurrent builds from several processes do not see partial files.
+    :param force: Rebuild even if a cached library exists.
+    :return: The path of the compiled library.
+    """
+    source = _source()
+    module_name = _module_name(source)
+    target = _built_path(module_name)
+    target_dir = target.parent
+
+    if target.exists() and not force:
+        return target
+
+    try:
+        target_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=target_dir) as build_dir:
+            built = _builder(module_name, source).compile(tmpdir=build_dir, verbose=False)
+            os.replace(built, target)
+    except (VerificationError, OSError) as e:
+        raise PowLibraryError(f'Failed to build the native library: {e}') from e
+
+    return target
+
+
+def _built_path(module_name: str) -> Path:
+    """
+    Get the path build_native compiles a library to.
+    :param module_name: The name of the extension module.
+    :return: The path of the compiled library in the cache.
+    """
+    suffix = sysconfig.get_config_var('EXT_SUFFIX') or '.so'
+    return cache_dir() / 'libpow' / (module_name + suffix)
+
+
+def probe(lib: Any, lib_ffi: FFI):
+    """
+    Check a native library against a challenge with a known solution.
+
+    The library must also export everything in CDEF, so a prebuilt library
+    older than this module is rejected and built again from source.
+    :param lib: The loaded library.
+    :param lib_ffi: The FFI instance the library is loaded with.
+    """
+    missing = [name for name in EXPORTS if not hasattr(lib, name)]
+    if missing:
+        raise PowLibraryError(f'Native library is out of date, missing {", ".join(missing)}')
+
+    res_ptr = lib_ffi.new('unsigned long long *')
+    ret = lib.solve_pow(_PROBE_NONCE.encode(), _PROBE_DIFFICULTY, res_ptr)
+
+    if ret != 0 or res_ptr[0] != _PROBE_SOLUTION:
+        raise PowLibraryError('Native library failed its self check')
+
+
+def load_built(path: Path) -> tuple[Any, FFI]:
+    """
+    Load and check a library compiled by build_native.
+    :param path: The path of the compiled library.
+    :return: The library and the FFI instance it is bound to.
+    """
+    module_name = path.name.split('.', 1)[0]
+
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except (ImportError, OSError) as e:
+        raise PowLibraryError(f'Failed to load the native library {path}') from e
+
+    probe(module.lib, module.ffi)
+
+    return module.lib, module.ffi
+
+
+def load_or_build() -> tuple[Any, FFI]:
+    """
+    Load the cached library, building it first if needed.
+
+    A cached library that fails to load or to pass its self check is rebuilt
+    once, in case it was left broken by an interrupted build. A failed fresh
+    build is not retried, as it would fail the same way.
+    :return: The library and the FFI instance it is bound to.
+    """
+    if not build_enabled():
+        raise PowLibraryError(f'Building the native library is disabled by {BUILD_ENV}')
+
+    cached = _built_path(_module_name(_source()))
+    if cached.exists():
+        try:
+            return load_built(cached)
+        except PowLibraryError:
+            return load_built(build_native(force=True))
+
+    return load_built(build_native())
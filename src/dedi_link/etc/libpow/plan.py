@@ -0,0 +1,76 @@
+"""
+Cost model for choosing how to run a proof of work search
+"""
+
+from dataclasses import dataclass
+
+from dedi_link.etc.enums import PowExecutorKind
+
+
+# Below this expected solve time, handing the search to a pool costs more than it saves
+INLINE_THRESHOLD = 0.005
+
+
+@dataclass(frozen=True)
+class PowPlan:
+    """
+    How a proof of work search is going to run, and why.
+    """
+    strategy: PowExecutorKind
+    native: bool
+    expected_hashes: float
+    hash_rate: float
+
+    @property
+    def expected_seconds(self) -> float:
+        """
+        The expected time to find a solution at the calibrated hash rate.
+        :return: The estimate in seconds.
+        """
+        return self.expected_hashes / self.hash_rate
+
+
+def expected_hashes(difficulty: int) -> float:
+    """
+    The expected number of candidates to hash before finding a solution.
+    :param difficulty: How many leading zero bits are required.
+    :return: The expected number of candidates, 2 to the power of the difficulty.
+    """
+    return float(2 ** difficulty)
+
+
+def choose_strategy(difficulty: int,
+                    native: bool,
+                    hash_rate: float,
+                    inline_threshold: float = INLINE_THRESHOLD,
+                    ) -> PowPlan:
+    """
+    Pick where to run a search from its expected cost.
+
+    Cheap searches run inline, as pickling and inter-process communication would
+    take longer than the search itself. The native library releases the GIL
+    and uses its own threads, so it only needs a thread to keep the event loop
+    free. The Python implementation holds the GIL, so expensive searches go to
+    worker processes.
+    :param difficulty: How many leading zero bits are required.
+    :param native: Whether the native library is available.
+    :param hash_rate: The calibrated hash rate of the backend that will run.
+    :param inline_threshold: The expected solve time in seconds below which
+        the search runs inline.
+    :return: The chosen plan.
+    """
+    hashes = expected_hashes(difficulty)
+
+    if hashes / hash_rate < inline_threshold:
+        strategy = PowExecutorKind.INLINE
+    elif native:
+        strategy = PowExecutorKind.THREAD
+    else:
+        strategy = PowExecutorKind.PROCESS
+
+    return PowPlan(
+        strategy=strategy,
+        native=native,
+        expected_hashes=hashes,
+        hash_rate=hash_rate,
+    )
@@ -1,10 +1,126 @@
 #include <stdio.h>
+#include <stdlib.h>
 #include <stdint.h>
+#include <limits.h>
 #include <string.h>
+#include <time.h>
+/* The low level SHA-256 calls are needed to reuse the midstate of the nonce */
+#define OPENSSL_SUPPRESS_DEPRECATED
 #include <openssl/sha.h>
 
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <pthread.h>
+#endif
+
+#if defined(__x86_64__) || defined(__i386__) || defined(_M_X64) || defined(_M_IX86)
+#define POW_X86 1
+#include <immintrin.h>
+#if defined(_MSC_VER)
+#include <intrin.h>
+#else
+#include <cpuid.h>
+#endif
+#endif
+
+#if defined(__GNUC__) || defined(__clang__)
+#define POW_TARGET(features) __attribute__((target(features)))
+#else
+#define POW_TARGET(features)
+#endif
+
 #define MAX_DIFFICULTY 256
 #define MAX_ITERATIONS 1000000000ULL
+#define MAX_THREADS 256
+#define CHUNK_SIZE 4096ULL
+#define BATCH_CHUNK 64ULL
+#define BATCH_PARALLEL_MIN 512
+
+#define POW_OK 0
+#define POW_ERROR 1
+#define POW_NOT_FOUND 2
+#define POW_STOPPED 3
+
+#define POW_KERNEL_LEGACY 0
+#define POW_KERNEL_MIDSTATE 1
+#define POW_KERNEL_SSE41 2
+#define POW_KERNEL_AVX2 3
+#define POW_KERNEL_AVX512 4
+#define POW_KERNEL_SHANI 5
+#define POW_KERNEL_COUNT 6
+#define POW_KERNEL_AUTO (-1)
+
+#define MAX_LANES 16
+#define COUNTER_BYTES 8
+#define SELECTION_SAMPLE 2048ULL
+#define SELECTION_NONCE "dfe041b4f60cb54d082e542b109e392a"
+
+/*
+ * Shared state of one search. Worker threads claim chunks of the counter space in
+ * increasing order and publish the lowest solution they find in `best`, which is
+ * also what tells the others to stop. The caller may stop the search early through
+ * `stop`, and observe progress through `tried`; both are optional.
+ */
+typedef struct pow_kernel pow_kernel_t;
+
+typedef struct {
+    const char *nonce;
+    size_t nonce_len;
+    int binary;
+    int difficulty;
+    const pow_kernel_t *kernel;
+    unsigned long long limit;
+    volatile unsigned long long next_chunk;
+    volatile unsigned long long best;
+    volatile int *stop;
+    volatile unsigned long long *tried;
+    volatile int stopped;
+} pow_search_t;
+
+#if defined(_MSC_VER)
+static unsigned long long atomic_load_u64(volatile unsigned long long *ptr) {
+    return (unsigned long long)InterlockedCompareExchange64((volatile LONG64 *)ptr, 0, 0);
+}
+
+static unsigned long long atomic_fetch_add_u64(volatile unsigned long long *ptr,
+                                               unsigned long long value) {
+    return (unsigned long long)InterlockedExchangeAdd64((volatile LONG64 *)ptr, (LONG64)value);
+}
+
+static int atomic_cas_u64(volatile unsigned long long *ptr,
+                          unsigned long long expected,
+                          unsigned long long desired) {
+    return (unsigned long long)InterlockedCompareExchange64(
+        (volatile LONG64 *)ptr, (LONG64)desired, (LONG64)expected) == expected;
+}
+#else
+static unsigned long long atomic_load_u64(volatile unsigned long long *ptr) {
+    return __atomic_load_n(ptr, __ATOMIC_ACQUIRE);
+}
+
+static unsigned long long atomic_fetch_add_u64(volatile unsigned long long *ptr,
+                                               unsigned long long value) {
+    return __atomic_fetch_add(ptr, value, __ATOMIC_ACQ_REL);
+}
+
+static int atomic_cas_u64(volatile unsigned long long *ptr,
+                          unsigned long long expected,
+                          unsigned long long desired) {
+    return __atomic_compare_exchange_n(ptr, &expected, desired, 0,
+                                       __ATOMIC_ACQ_REL, __ATOMIC_ACQUIRE);
+}
+#endif
+
+static void atomic_min_u64(volatile unsigned long long *ptr, unsigned long long value) {
+    unsigned long long current = atomic_load_u64(ptr);
+
+    while (value < current) {
+        if (atomic_cas_u64(ptr, current, value))
+            return;
+        current = atomic_load_u64(ptr);
+    }
+}
 
 static int check_difficulty(const unsigned char *hash, int difficulty) {
     int full_bytes = difficulty / 8;
@@ -24,24 +140,1323 @@ static int check_difficulty(const unsigned char *hash, int difficulty) {
     return 1;
 }
 
+/*
+ * A candidate message split into the SHA-256 state after every full block of the
+ * nonce (the midstate) and a pre-padded tail holding the rest of the nonce and the
+ * counter. Only the tail has to be compressed for each counter value.
+ *
+ * The counter is appended as decimal text, or with `binary` set, as a fixed
+ * COUNTER_BYTES big-endian integer. A binary counter never changes the length of
+ * the message, so the padding is written once and only the counter bytes change.
+ */
+typedef struct {
+    SHA256_CTX midstate;
+    unsigned char tail[128];
+    size_t nonce_len;
+    size_t offset;
+    int binary;
+    int digits;
+    int blocks;
+    unsigned long long counter;
+} pow_candidate_t;
+
+static void candidate_init(pow_candidate_t *candidate, const char *nonce, size_t len, int binary) {
+    size_t full = len - len % 64;
+
+    SHA256_Init(&candidate->midstate);
+    for (size_t i = 0; i < full; i += 64)
+        SHA256_Transform(&candidate->midstate, (const unsigned char *)nonce + i);
+
+    candidate->nonce_len = len;
+    candidate->offset = len - full;
+    candidate->binary = binary;
+    memcpy(candidate->tail, nonce + full, candidate->offset);
+}
+
+static void candidate_set_binary(pow_candidate_t *candidate, unsigned long long counter) {
+    size_t used = candidate->offset + COUNTER_BYTES;
+    int blocks = used + 9 <= 64 ? 1 : 2;
+    size_t end = 64 * (size_t)blocks;
+    unsigned long long bits = (unsigned long long)(candidate->nonce_len + COUNTER_BYTES) * 8;
+
+    for (int i = 0; i < COUNTER_BYTES; ++i)
+        candidate->tail[used - 1 - i] = (unsigned char)(counter >> (8 * i));
+    candidate->tail[used] = 0x80;
+    memset(candidate->tail + used + 1, 0, end - used - 1 - 8);
+    for (int i = 0; i < 8; ++i)
+        candidate->tail[end - 1 - i] = (unsigned char)(bits >> (8 * i));
+
+    candidate->digits = COUNTER_BYTES;
+    candidate->blocks = blocks;
+    candidate->counter = counter;
+}
+
+static void candidate_set(pow_candidate_t *candidate, unsigned long long counter) {
+    if (candidate->binary) {
+        candidate_set_binary(candidate, counter);
+        return;
+    }
+
+    char digits[24];
+    int n = snprintf(digits, sizeof(digits), "%llu", counter);
+    size_t used = candidate->offset + n;
+    int blocks = used + 9 <= 64 ? 1 : 2;
+    size_t end = 64 * (size_t)blocks;
+    unsigned long long bits = (unsigned long long)(candidate->nonce_len + n) * 8;
+
+    memcpy(candidate->tail + candidate->offset, digits, n);
+    candidate->tail[used] = 0x80;
+    memset(candidate->tail + used + 1, 0, end - used - 1 - 8);
+    for (int i = 0; i < 8; ++i)
+        candidate->tail[end - 1 - i] = (unsigned char)(bits >> (8 * i));
+
+    candidate->digits = n;
+    candidate->blocks = blocks;
+    candidate->counter = counter;
+}
+
+static void candidate_next(pow_candidate_t *candidate) {
+    if (candidate->binary) {
+        unsigned char *bytes = candidate->tail + candidate->offset;
+        int i = COUNTER_BYTES - 1;
+
+        while (i >= 0 && ++bytes[i] == 0)
+            --i;
+        ++candidate->counter;
+        return;
+    }
+
+    char *digits = (char *)candidate->tail + candidate->offset;
+    int i = candidate->digits - 1;
+
+    while (i >= 0 && digits[i] == '9') {
+        digits[i] = '0';
+        --i;
+    }
+
+    if (i < 0) {
+        // The counter gained a digit, so the padding and length have to move
+        candidate_set(candidate, candidate->counter + 1);
+        return;
+    }
+
+    ++digits[i];
+    ++candidate->counter;
+}
+
+static void candidate_hash(const pow_candidate_t *candidate, SHA_LONG state[8]) {
+    SHA256_CTX work = candidate->midstate;
+
+    SHA256_Transform(&work, candidate->tail);
+    if (candidate->blocks == 2)
+        SHA256_Transform(&work, candidate->tail + 64);
+
+    memcpy(state, work.h, sizeof(work.h));
+}
+
+static int check_difficulty_state(const SHA_LONG state[8], int difficulty) {
+    int full_words = difficulty / 32;
+    int remaining_bits = difficulty % 32;
+
+    for (int i = 0; i < full_words; ++i) {
+        if (state[i] != 0)
+            return 0;
+    }
+
+    if (remaining_bits && (state[full_words] >> (32 - remaining_bits)) != 0)
+        return 0;
+
+    return 1;
+}
+
+static const SHA_LONG sha256_k[64] = {
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+};
+
+static SHA_LONG load_be32(const unsigned char *p) {
+    return ((SHA_LONG)p[0] << 24) | ((SHA_LONG)p[1] << 16) | ((SHA_LONG)p[2] << 8) | (SHA_LONG)p[3];
+}
+
+/*
+ * The message of a group of consecutive candidates, as big-endian words. The
+ * candidates only differ in their trailing digits, so most words are shared by
+ * every lane; a set bit in `varying` marks a word taken from `lanes` instead,
+ * with one value per lane. Word t of block b has index 16 * b + t.
+ */
+typedef struct {
+    int blocks;
+    unsigned int varying;
+    SHA_LONG shared[32];
+    SHA_LONG lanes[32][MAX_LANES];
+} pow_message_t;
+
+/*
+ * A hashing kernel compresses the message of `lanes` candidates at once, all
+ * starting from the same midstate. The resulting states are written word by
+ * word: word i of lane j goes to out[i * lanes + j]. A kernel without `hash`
+ * is the scalar OpenSSL path.
+ */
+typedef void (*pow_lanes_fn)(const SHA_LONG midstate[8], const pow_message_t *msg, SHA_LONG *out);
+
+struct pow_kernel {
+    int id;
+    int lanes;
+    int cpu_features;
+    pow_lanes_fn hash;
+};
+
+#define POW_CPU_SSE41 1
+#define POW_CPU_AVX2 2
+#define POW_CPU_AVX512 4
+#define POW_CPU_SHA 8
+
+#ifdef POW_X86
+/*
+ * Multi-buffer SHA-256, one candidate per 32-bit vector lane. The same round
+ * code is instantiated for every vector width from the primitives prefixed P.
+ * Rounds are unrolled sixteen at a time with the working variables renamed
+ * rather than moved, so the message schedule stays in registers.
+ */
+#define LANES_SCHEDULE(P, w, i)                                                         \
+    w[i] = P##_add(P##_add(w[i], P##_xor3(P##_rotr(w[((i) + 1) & 15], 7),              \
+                                          P##_rotr(w[((i) + 1) & 15], 18),             \
+                                          P##_srl(w[((i) + 1) & 15], 3))),             \
+                   P##_add(w[((i) + 9) & 15], P##_xor3(P##_rotr(w[((i) + 14) & 15], 17),\
+                                                       P##_rotr(w[((i) + 14) & 15], 19),\
+                                                       P##_srl(w[((i) + 14) & 15], 10))))
+
+#define LANES_ROUND(P, VEC, a, b, c, d, e, f, g, h, k, wi)                              \
+    do {                                                                                \
+        VEC t1_ = P##_add(P##_add(h, P##_xor3(P##_rotr(e, 6), P##_rotr(e, 11),          \
+                                              P##_rotr(e, 25))),                        \
+                          P##_add(P##_add(P##_ch(e, f, g), P##_set1(k)), wi));          \
+        d = P##_add(d, t1_);                                                            \
+        h = P##_add(t1_, P##_add(P##_xor3(P##_rotr(a, 2), P##_rotr(a, 13),              \
+                                          P##_rotr(a, 22)),                             \
+                                 P##_maj(a, b, c)));                                    \
+    } while (0)
+
+#define LANES_ROUND8(P, VEC, s, r, w, i)                                                \
+    LANES_ROUND(P, VEC, s[0], s[1], s[2], s[3], s[4], s[5], s[6], s[7],                 \
+                sha256_k[(r) + (i)], w[i]);                                             \
+    LANES_ROUND(P, VEC, s[7], s[0], s[1], s[2], s[3], s[4], s[5], s[6],                 \
+                sha256_k[(r) + (i) + 1], w[(i) + 1]);                                   \
+    LANES_ROUND(P, VEC, s[6], s[7], s[0], s[1], s[2], s[3], s[4], s[5],                 \
+                sha256_k[(r) + (i) + 2], w[(i) + 2]);                                   \
+    LANES_ROUND(P, VEC, s[5], s[6], s[7], s[0], s[1], s[2], s[3], s[4],                 \
+                sha256_k[(r) + (i) + 3], w[(i) + 3]);                                   \
+    LANES_ROUND(P, VEC, s[4], s[5], s[6], s[7], s[0], s[1], s[2], s[3],                 \
+                sha256_k[(r) + (i) + 4], w[(i) + 4]);                                   \
+    LANES_ROUND(P, VEC, s[3], s[4], s[5], s[6], s[7], s[0], s[1], s[2],                 \
+                sha256_k[(r) + (i) + 5], w[(i) + 5]);                                   \
+    LANES_ROUND(P, VEC, s[2], s[3], s[4], s[5], s[6], s[7], s[0], s[1],                 \
+                sha256_k[(r) + (i) + 6], w[(i) + 6]);                                   \
+    LANES_ROUND(P, VEC, s[1], s[2], s[3], s[4], s[5], s[6], s[7], s[0],                 \
+                sha256_k[(r) + (i) + 7], w[(i) + 7])
+
+#define DEFINE_LANES_KERNEL(P, TARGET, VEC, LANES)                                      \
+TARGET static void hash_lanes_##P(const SHA_LONG midstate[8], const pow_message_t *msg, \
+                                  SHA_LONG *out) {                                      \
+    VEC state[8], s[8], w[16];                                                          \
+                                                                                        \
+    for (int i = 0; i < 8; ++i)                                                         \
+        state[i] = P##_set1(midstate[i]);                                               \
+                                                                                        \
+    for (int b = 0; b < msg->blocks; ++b) {                                             \
+        for (int t = 0; t < 16; ++t) {                                                  \
+            int index = 16 * b + t;                                                     \
+            w[t] = (msg->varying >> index) & 1 ? P##_load(msg->lanes[index])            \
+                                               : P##_set1(msg->shared[index]);          \
+        }                                                                               \
+        for (int i = 0; i < 8; ++i)                                                     \
+            s[i] = state[i];                                                            \
+                                                                                        \
+        for (int r = 0; r < 64; r += 16) {                                              \
+            if (r > 0) {                                                                \
+                LANES_SCHEDULE(P, w, 0); LANES_SCHEDULE(P, w, 1);                       \
+                LANES_SCHEDULE(P, w, 2); LANES_SCHEDULE(P, w, 3);                       \
+                LANES_SCHEDULE(P, w, 4); LANES_SCHEDULE(P, w, 5);                       \
+                LANES_SCHEDULE(P, w, 6); LANES_SCHEDULE(P, w, 7);                       \
+                LANES_SCHEDULE(P, w, 8); LANES_SCHEDULE(P, w, 9);                       \
+                LANES_SCHEDULE(P, w, 10); LANES_SCHEDULE(P, w, 11);                     \
+                LANES_SCHEDULE(P, w, 12); LANES_SCHEDULE(P, w, 13);                     \
+                LANES_SCHEDULE(P, w, 14); LANES_SCHEDULE(P, w, 15);                     \
+            }                                                                           \
+            LANES_ROUND8(P, VEC, s, r, w, 0);                                           \
+            LANES_ROUND8(P, VEC, s, r, w, 8);                                           \
+        }                                                                               \
+                                                                                        \
+        for (int i = 0; i < 8; ++i)                                                     \
+            state[i] = P##_add(state[i], s[i]);                                         \
+    }                                                                                   \
+                                                                                        \
+    for (int i = 0; i < 8; ++i)                                                         \
+        P##_store(out + i * LANES, state[i]);                                           \
+}
+
+#define sse41_set1(x) _mm_set1_epi32((int)(x))
+#define sse41_load(p) _mm_loadu_si128((const __m128i *)(p))
+#define sse41_store(p, v) _mm_storeu_si128((__m128i *)(p), v)
+#define sse41_add(a, b) _mm_add_epi32(a, b)
+#define sse41_srl(x, n) _mm_srli_epi32(x, n)
+#define sse41_rotr(x, n) _mm_or_si128(_mm_srli_epi32(x, n), _mm_slli_epi32(x, 32 - (n)))
+#define sse41_xor3(a, b, c) _mm_xor_si128(_mm_xor_si128(a, b), c)
+#define sse41_ch(e, f, g) _mm_xor_si128(_mm_and_si128(e, f), _mm_andnot_si128(e, g))
+#define sse41_maj(a, b, c) \
+    _mm_or_si128(_mm_and_si128(a, b), _mm_and_si128(c, _mm_or_si128(a, b)))
+
+#define avx2_set1(x) _mm256_set1_epi32((int)(x))
+#define avx2_load(p) _mm256_loadu_si256((const __m256i *)(p))
+#define avx2_store(p, v) _mm256_storeu_si256((__m256i *)(p), v)
+#define avx2_add(a, b) _mm256_add_epi32(a, b)
+#define avx2_srl(x, n) _mm256_srli_epi32(x, n)
+#define avx2_rotr(x, n) _mm256_or_si256(_mm256_srli_epi32(x, n), _mm256_slli_epi32(x, 32 - (n)))
+#define avx2_xor3(a, b, c) _mm256_xor_si256(_mm256_xor_si256(a, b), c)
+#define avx2_ch(e, f, g) _mm256_xor_si256(_mm256_and_si256(e, f), _mm256_andnot_si256(e, g))
+#define avx2_maj(a, b, c) \
+    _mm256_or_si256(_mm256_and_si256(a, b), _mm256_and_si256(c, _mm256_or_si256(a, b)))
+
+#define avx512_set1(x) _mm512_set1_epi32((int)(x))
+#define avx512_load(p) _mm512_loadu_si512((const void *)(p))
+#define avx512_store(p, v) _mm512_storeu_si512((void *)(p), v)
+#define avx512_add(a, b) _mm512_add_epi32(a, b)
+#define avx512_srl(x, n) _mm512_srli_epi32(x, n)
+#define avx512_rotr(x, n) _mm512_ror_epi32(x, n)
+#define avx512_xor3(a, b, c) _mm512_ternarylogic_epi32(a, b, c, 0x96)
+#define avx512_ch(e, f, g) _mm512_ternarylogic_epi32(e, f, g, 0xCA)
+#define avx512_maj(a, b, c) _mm512_ternarylogic_epi32(a, b, c, 0xE8)
+
+DEFINE_LANES_KERNEL(sse41, POW_TARGET("sse4.1"), __m128i, 4)
+DEFINE_LANES_KERNEL(avx2, POW_TARGET("avx2"), __m256i, 8)
+DEFINE_LANES_KERNEL(avx512, POW_TARGET("avx512f"), __m512i, 16)
+
+#define SHANI_LANES 4
+
+/*
+ * Four rounds of one candidate with the SHA extensions, extending the message
+ * schedule first from the fourth step on. The state is kept in the ABEF/CDGH
+ * order the instructions work on.
+ */
+#define SHANI_ROUNDS(abef, cdgh, m0, m1, m2, m3, i)                                     \
+    do {                                                                                \
+        if ((i) >= 4)                                                                   \
+            m0 = _mm_sha256msg2_epu32(_mm_add_epi32(_mm_sha256msg1_epu32(m0, m1),       \
+                                                    _mm_alignr_epi8(m3, m2, 4)),        \
+                                      m3);                                              \
+        __m128i round_ = _mm_add_epi32(m0, _mm_loadu_si128(                             \
+            (const __m128i *)(sha256_k + 4 * (i))));                                    \
+        cdgh = _mm_sha256rnds2_epu32(cdgh, abef, round_);                               \
+        abef = _mm_sha256rnds2_epu32(abef, cdgh, _mm_shuffle_epi32(round_, 0x0E));      \
+    } while (0)
+
+/*
+ * The same four rounds for two candidates, interleaved to hide the latency of
+ * the round instruction. Message vectors rotate through m0 to m3, so step i
+ * works on m(i % 4), with the three before it as m(i - 3) to m(i - 1).
+ */
+#define SHANI_STEP(i, m0, m1, m2, m3)                                                   \
+    SHANI_ROUNDS(abef0, cdgh0, m0##_0, m1##_0, m2##_0, m3##_0, i);                      \
+    SHANI_ROUNDS(abef1, cdgh1, m0##_1, m1##_1, m2##_1, m3##_1, i)
+
+POW_TARGET("sha,sse4.1")
+static void shani_store(__m128i abef, __m128i cdgh, SHA_LONG *out, int lane) {
+    SHA_LONG state[8];
+    __m128i feba = _mm_shuffle_epi32(abef, 0x1B);
+    __m128i dchg = _mm_shuffle_epi32(cdgh, 0xB1);
+
+    _mm_storeu_si128((__m128i *)state, _mm_blend_epi16(feba, dchg, 0xF0));
+    _mm_storeu_si128((__m128i *)(state + 4), _mm_alignr_epi8(dchg, feba, 8));
+
+    for (int i = 0; i < 8; ++i)
+        out[i * SHANI_LANES + lane] = state[i];
+}
+
+POW_TARGET("sha,sse4.1")
+static void hash_lanes_shani(const SHA_LONG midstate[8], const pow_message_t *msg,
+                             SHA_LONG *out) {
+    __m128i dcba = _mm_shuffle_epi32(_mm_loadu_si128((const __m128i *)midstate), 0xB1);
+    __m128i start_cdgh = _mm_shuffle_epi32(_mm_loadu_si128((const __m128i *)(midstate + 4)),
+                                           0x1B);
+    __m128i start_abef = _mm_alignr_epi8(dcba, start_cdgh, 8);
+    SHA_LONG words[2][32];
+
+    start_cdgh = _mm_blend_epi16(start_cdgh, dcba, 0xF0);
+
+    for (int j = 0; j < SHANI_LANES; j += 2) {
+        __m128i abef0 = start_abef, cdgh0 = start_cdgh;
+        __m128i abef1 = start_abef, cdgh1 = start_cdgh;
+
+        memcpy(words[0], msg->shared, 64 * (size_t)msg->blocks);
+        memcpy(words[1], msg->shared, 64 * (size_t)msg->blocks);
+        for (int index = 0; index < 16 * msg->blocks; ++index) {
+            if ((msg->varying >> index) & 1) {
+                words[0][index] = msg->lanes[index][j];
+                words[1][index] = msg->lanes[index][j + 1];
+            }
+        }
+
+        for (int b = 0; b < msg->blocks; ++b) {
+            __m128i saved_abef0 = abef0, saved_cdgh0 = cdgh0;
+            __m128i saved_abef1 = abef1, saved_cdgh1 = cdgh1;
+            const SHA_LONG *w0 = words[0] + 16 * b, *w1 = words[1] + 16 * b;
+            __m128i ma_0 = _mm_loadu_si128((const __m128i *)w0);
+            __m128i mb_0 = _mm_loadu_si128((const __m128i *)(w0 + 4));
+            __m128i mc_0 = _mm_loadu_si128((const __m128i *)(w0 + 8));
+            __m128i md_0 = _mm_loadu_si128((const __m128i *)(w0 + 12));
+            __m128i ma_1 = _mm_loadu_si128((const __m128i *)w1);
+            __m128i mb_1 = _mm_loadu_si128((const __m128i *)(w1 + 4));
+            __m128i mc_1 = _mm_loadu_si128((const __m128i *)(w1 + 8));
+            __m128i md_1 = _mm_loadu_si128((const __m128i *)(w1 + 12));
+
+            SHANI_STEP(0, ma, mb, mc, md);
+            SHANI_STEP(1, mb, mc, md, ma);
+            SHANI_STEP(2, mc, md, ma, mb);
+            SHANI_STEP(3, md, ma, mb, mc);
+            SHANI_STEP(4, ma, mb, mc, md);
+            SHANI_STEP(5, mb, mc, md, ma);
+            SHANI_STEP(6, mc, md, ma, mb);
+            SHANI_STEP(7, md, ma, mb, mc);
+            SHANI_STEP(8, ma, mb, mc, md);
+            SHANI_STEP(9, mb, mc, md, ma);
+            SHANI_STEP(10, mc, md, ma, mb);
+            SHANI_STEP(11, md, ma, mb, mc);
+            SHANI_STEP(12, ma, mb, mc, md);
+            SHANI_STEP(13, mb, mc, md, ma);
+            SHANI_STEP(14, mc, md, ma, mb);
+            SHANI_STEP(15, md, ma, mb, mc);
+
+            abef0 = _mm_add_epi32(abef0, saved_abef0);
+            cdgh0 = _mm_add_epi32(cdgh0, saved_cdgh0);
+            abef1 = _mm_add_epi32(abef1, saved_abef1);
+            cdgh1 = _mm_add_epi32(cdgh1, saved_cdgh1);
+        }
+
+        shani_store(abef0, cdgh0, out, j);
+        shani_store(abef1, cdgh1, out, j + 1);
+    }
+}
+#endif
+
+static int cpu_features(void) {
+    int features = 0;
+
+#ifdef POW_X86
+    unsigned int max_leaf, leaf1_ecx, leaf7_ebx = 0;
+    unsigned long long xcr0 = 0;
+
+#if defined(_MSC_VER)
+    int regs[4];
+    __cpuid(regs, 0);
+    max_leaf = (unsigned int)regs[0];
+    __cpuid(regs, 1);
+    leaf1_ecx = (unsigned int)regs[2];
+    if (max_leaf >= 7) {
+        __cpuidex(regs, 7, 0);
+        leaf7_ebx = (unsigned int)regs[1];
+    }
+    if (leaf1_ecx & (1u << 27))
+        xcr0 = _xgetbv(0);
+#else
+    unsigned int eax, ebx, ecx, edx;
+
+    max_leaf = __get_cpuid_max(0, NULL);
+    __cpuid(1, eax, ebx, ecx, edx);
+    leaf1_ecx = ecx;
+    if (max_leaf >= 7) {
+        __cpuid_count(7, 0, eax, ebx, ecx, edx);
+        leaf7_ebx = ebx;
+    }
+    if (leaf1_ecx & (1u << 27)) {
+        unsigned int lo, hi;
+        __asm__ volatile("xgetbv" : "=a"(lo), "=d"(hi) : "c"(0));
+        xcr0 = ((unsigned long long)hi << 32) | lo;
+    }
+#endif
+
+    // Wide registers are only usable when the OS saves them on context switches
+    int avx_state = (xcr0 & 0x06) == 0x06;
+    int avx512_state = (xcr0 & 0xE6) == 0xE6;
+
+    if (leaf1_ecx & (1u << 19))
+        features |= POW_CPU_SSE41;
+    if ((leaf7_ebx & (1u << 5)) && (leaf1_ecx & (1u << 28)) && avx_state)
+        features |= POW_CPU_AVX2;
+    if ((leaf7_ebx & (1u << 16)) && avx512_state)
+        features |= POW_CPU_AVX512;
+    if ((leaf7_ebx & (1u << 29)) && (features & POW_CPU_SSE41))
+        features |= POW_CPU_SHA;
+#endif
+
+    return features;
+}
+
+/*
+ * Every kernel built for this architecture. The scalar kernel runs whatever
+ * OpenSSL picks for single-buffer SHA-256, often its own SHA-NI code, so which
+ * kernel is fastest depends on the OpenSSL build as much as on the CPU.
+ */
+static const pow_kernel_t pow_kernels[] = {
+#ifdef POW_X86
+    {POW_KERNEL_AVX512, 16, POW_CPU_AVX512, hash_lanes_avx512},
+    {POW_KERNEL_SHANI, SHANI_LANES, POW_CPU_SHA, hash_lanes_shani},
+    {POW_KERNEL_AVX2, 8, POW_CPU_AVX2, hash_lanes_avx2},
+    {POW_KERNEL_SSE41, 4, POW_CPU_SSE41, hash_lanes_sse41},
+#endif
+    {POW_KERNEL_MIDSTATE, 1, 0, NULL},
+};
+
+#define POW_KERNEL_TABLE_SIZE ((int)(sizeof(pow_kernels) / sizeof(pow_kernels[0])))
+
+static const pow_kernel_t *find_kernel(int id) {
+    for (int i = 0; i < POW_KERNEL_TABLE_SIZE; ++i) {
+        if (pow_kernels[i].id == id)
+            return &pow_kernels[i];
+    }
+
+    return NULL;
+}
+
+/*
+ * Claim the next chunk of the search range. Chunks are handed out in increasing
+ * order, and never past the end of the range, even at the top of the 64-bit space.
+ */
+static int claim_chunk(pow_search_t *search, unsigned long long *start, unsigned long long *end) {
+    unsigned long long current = atomic_load_u64(&search->next_chunk);
+    unsigned long long next;
+
+    for (;;) {
+        if (current >= search->limit || current >= atomic_load_u64(&search->best))
+            return 0;
+
+        next = search->limit - current > CHUNK_SIZE ? current + CHUNK_SIZE : search->limit;
+        if (atomic_cas_u64(&search->next_chunk, current, next))
+            break;
+
+        current = atomic_load_u64(&search->next_chunk);
+    }
+
+    *start = current;
+    *end = next;
+    return 1;
+}
+
+static const unsigned long long powers_of_ten[20] = {
+    1ULL, 10ULL, 100ULL, 1000ULL, 10000ULL, 100000ULL, 1000000ULL, 10000000ULL,
+    100000000ULL, 1000000000ULL, 10000000000ULL, 100000000000ULL, 1000000000000ULL,
+    10000000000000ULL, 100000000000000ULL, 1000000000000000ULL, 10000000000000000ULL,
+    100000000000000000ULL, 1000000000000000000ULL, 10000000000000000000ULL,
+};
+
+/*
+ * Move the candidate `step` counters forward, rewriting only the digits that change.
+ */
+static void candidate_advance(pow_candidate_t *candidate, unsigned long long step) {
+    unsigned long long counter = candidate->counter + step;
+    char *digit = (char *)candidate->tail + candidate->offset + candidate->digits;
+
+    if (candidate->binary) {
+        for (int i = 0; i < COUNTER_BYTES; ++i)
+            *--digit = (char)(unsigned char)(counter >> (8 * i));
+        candidate->counter = counter;
+        return;
+    }
+
+    if (candidate->digits < 20 && counter >= powers_of_ten[candidate->digits]) {
+        // The counter gained a digit, so the padding and length have to move
+        candidate_set(candidate, counter);
+        return;
+    }
+
+    for (unsigned long long a = candidate->counter, b = counter; a != b; a /= 10, b /= 10)
+        *--digit = (char)('0' + b % 10);
+
+    candidate->counter = counter;
+}
+
+/*
+ * Load up to `lanes` consecutive candidates, at most `remaining`, into `msg` and
+ * advance the candidate past them. A group never crosses a change in the number
+ * of digits, so its candidates only differ in the trailing digits that change
+ * between the first and the last one. The words holding those digits are built
+ * for every lane by adding each digit at its place in the big-endian word, so the
+ * tail never has to be rewritten and read back. Returns the size of the group.
+ */
+static int candidate_group_binary(pow_candidate_t *candidate, pow_message_t *msg, int n) {
+    int lo = (int)candidate->offset / 4;
+    int hi = ((int)candidate->offset + COUNTER_BYTES - 1) / 4;
+    unsigned char words[16];
+
+    msg->varying = 0;
+    for (int t = lo; t <= hi; ++t)
+        msg->varying |= 1u << t;
+
+    // Lay out the words holding the counter once per lane, on a copy of the tail
+    memcpy(words, candidate->tail + 4 * lo, 4 * (size_t)(hi - lo + 1));
+    for (int j = 0; j < n; ++j) {
+        unsigned long long counter = candidate->counter + (unsigned long long)j;
+        size_t end = candidate->offset + COUNTER_BYTES - 4 * (size_t)lo;
+
+        for (int i = 0; i < COUNTER_BYTES; ++i)
+            words[end - 1 - i] = (unsigned char)(counter >> (8 * i));
+        for (int t = lo; t <= hi; ++t)
+            msg->lanes[t][j] = load_be32(words + 4 * (t - lo));
+    }
+
+    candidate_advance(candidate, (unsigned long long)n);
+
+    return n;
+}
+
+static int candidate_group(pow_candidate_t *candidate, pow_message_t *msg, int lanes,
+                           unsigned long long remaining) {
+    unsigned long long first = candidate->counter;
+    unsigned long long n = (unsigned long long)lanes < remaining ? (unsigned long long)lanes
+                                                                 : remaining;
+    int words = 16 * candidate->blocks;
+    int digits_end = (int)candidate->offset + candidate->digits;
+    int changing = 0;
+
+    if (candidate->binary) {
+        msg->blocks = candidate->blocks;
+        for (int t = 0; t < words; ++t)
+            msg->shared[t] = load_be32(candidate->tail + 4 * t);
+        return candidate_group_binary(candidate, msg, (int)n);
+    }
+
+    // Twenty digits never roll over within the unsigned 64-bit range
+    if (candidate->digits < 20 && powers_of_ten[candidate->digits] - first < n)
+        n = powers_of_ten[candidate->digits] - first;
+
+    for (unsigned long long a = first, b = first + n - 1; a != b; a /= 10, b /= 10)
+        ++changing;
+
+    msg->blocks = candidate->blocks;
+    msg->varying = 0;
+    for (int t = 0; t < words; ++t)
+        msg->shared[t] = load_be32(candidate->tail + 4 * t);
+
+    if (changing) {
+        int lo = (digits_end - changing) / 4;
+        int hi = (digits_end - 1) / 4;
+        unsigned long long value = first, below = 0;
+
+        // Start every lane from the shared words with the changing digits taken out
+        for (int t = lo; t <= hi; ++t) {
+            SHA_LONG shared = msg->shared[t];
+            unsigned long long v = first;
+
+            for (int place = digits_end - 1; place >= digits_end - changing; --place, v /= 10) {
+                if (place / 4 == t)
+                    shared -= (SHA_LONG)(v % 10) << (8 * (3 - place % 4));
+            }
+
+            msg->varying |= 1u << t;
+            for (unsigned long long j = 0; j < n; ++j)
+                msg->lanes[t][j] = shared;
+        }
+
+        // Then add each digit back. The units step once per lane, and with at most
+        // MAX_LANES lanes the digits below a higher place wrap at most twice, so the
+        // digit of each lane is found without branches
+        for (int i = 0; i < changing; ++i, value /= 10) {
+            int place = digits_end - 1 - i;
+            SHA_LONG *lane = msg->lanes[place / 4];
+            SHA_LONG shift = 8 * (3 - place % 4);
+            SHA_LONG digit = (SHA_LONG)(value % 10);
+            SHA_LONG unit = i == 0;
+            SHA_LONG step, offset;
+
+            if (i == 0) {
+                step = 0x40000000;
+                offset = 0;
+            } else if (i == 1) {
+                step = 10;
+                offset = (SHA_LONG)below;
+            } else {
+                // Higher places only carry near the top of their range, measure from just below it
+                step = 100;
+                offset = below + step < powers_of_ten[i]
+                             ? 0 : (SHA_LONG)(below - (powers_of_ten[i] - step));
+            }
+
+            for (SHA_LONG j = 0; j < (SHA_LONG)n; ++j) {
+                SHA_LONG x = offset + j;
+                SHA_LONG d = digit + unit * j + (x >= step) + (x >= 2 * step);
+
+                d -= 10 * (d >= 10);
+                d -= 10 * (d >= 10);
+                lane[j] += d << shift;
+            }
+
+            below += (value % 10) * powers_of_ten[i];
+        }
+    }
+
+    candidate_advance(candidate, n);
+
+    return (int)n;
+}
+
+/*
+ * Hash the counters in [start, end) with the kernel of the search, publishing
+ * the first solution found in `best`. Stops early once a solution lower than
+ * the current counter has been published. Returns how many candidates were
+ * hashed, the solution included.
+ */
+static unsigned long long scan_chunk(pow_search_t *search, pow_candidate_t *candidate,
+                                     unsigned long long start, unsigned long long end) {
+    const pow_kernel_t *kernel = search->kernel;
+    unsigned long long counter = start;
+    SHA_LONG state[8];
+
+    candidate_set(candidate, start);
+
+    if (!kernel->hash) {
+        for (; counter < end; ++counter) {
+            // A lower solution has been published, nothing in the rest of this chunk can win
+            if ((counter & 0xFF) == 0 && counter >= atomic_load_u64(&search->best))
+                break;
+
+            candidate_hash(candidate, state);
+
+            if (check_difficulty_state(state, search->difficulty)) {
+                atomic_min_u64(&search->best, counter);
+                return counter + 1 - start;
+            }
+
+            candidate_next(candidate);
+        }
+
+        return counter - start;
+    }
+
+    pow_message_t msg;
+    SHA_LONG out[8 * MAX_LANES];
+    int lanes = kernel->lanes;
+    // The largest first word of a digest that may still be valid, to skip most lanes quickly
+    SHA_LONG first_word_max = search->difficulty >= 32 ? 0
+                                                       : 0xFFFFFFFFu >> search->difficulty;
+
+    // Lanes past the end of a short group are hashed too, give them defined input
+    memset(&msg, 0, sizeof(msg));
+
+    while (counter < end) {
+        if (counter >= atomic_load_u64(&search->best))
+            break;
+
+        int n = candidate_group(candidate, &msg, lanes, end - counter);
+
+        kernel->hash(candidate->midstate.h, &msg, out);
+
+        // Lanes hold increasing counters, so the first valid lane is the lowest solution
+        for (int j = 0; j < n; ++j) {
+            if (out[j] > first_word_max)
+                continue;
+
+            for (int i = 0; i < 8; ++i)
+                state[i] = out[i * lanes + j];
+
+            if (check_difficulty_state(state, search->difficulty)) {
+                atomic_min_u64(&search->best, counter + j);
+                return counter + j + 1 - start;
+            }
+        }
+
+        counter += n;
+    }
+
+    return counter - start;
+}
+
+static void search_worker(void *arg) {
+    pow_search_t *search = (pow_search_t *)arg;
+    pow_candidate_t candidate;
+
+    candidate_init(&candidate, search->nonce, search->nonce_len, search->binary);
+
+    for (;;) {
+        if (search->stop && *search->stop) {
+            search->stopped = 1;
+            return;
+        }
+
+        unsigned long long start, end;
+        if (!claim_chunk(search, &start, &end))
+            return;
+
+        unsigned long long hashed = scan_chunk(search, &candidate, start, end);
+
+        if (search->tried)
+            atomic_fetch_add_u64(search->tried, hashed);
+    }
+}
+
+/*
+ * Compare `4 * MAX_LANES` candidates hashed by a vector kernel from `start`
+ * with the scalar kernel. Returns 1 if they all match.
+ */
+static int kernel_matches_scalar(const pow_kernel_t *kernel, const char *nonce,
+                                 unsigned long long start, int binary) {
+    pow_candidate_t candidate, reference;
+    pow_message_t msg;
+    SHA_LONG out[8 * MAX_LANES];
+    SHA_LONG expected[8];
+    unsigned long long remaining = 4 * MAX_LANES;
+    size_t len = strlen(nonce);
+
+    memset(&msg, 0, sizeof(msg));
+    candidate_init(&candidate, nonce, len, binary);
+    candidate_set(&candidate, start);
+    candidate_init(&reference, nonce, len, binary);
+    candidate_set(&reference, start);
+
+    while (remaining > 0) {
+        int n = candidate_group(&candidate, &msg, kernel->lanes, remaining);
+
+        kernel->hash(candidate.midstate.h, &msg, out);
+
+        for (int j = 0; j < n; ++j) {
+            candidate_hash(&reference, expected);
+            for (int w = 0; w < 8; ++w) {
+                if (out[w * kernel->lanes + j] != expected[w])
+                    return 0;
+            }
+            candidate_next(&reference);
+        }
+
+        remaining -= (unsigned long long)n;
+    }
+
+    return 1;
+}
+
+/*
+ * Compare a vector kernel with the scalar one on short and long nonces, across
+ * a change of digit count and block count, a carry through many digits or bytes,
+ * and at the top of the counter space, for decimal and binary counters.
+ */
+static int kernel_self_test(const pow_kernel_t *kernel) {
+    static const char *nonces[] = {
+        "dfe041b4f60cb54d082e542b109e392a",
+        "dfe041b4f60cb54d082e542b109e392adfe041b4f60cb54d08",
+        "dfe041b4f60cb54d082e542b109e392adfe041b4f60cb54d082e542b109e392adfe041",
+    };
+    static const unsigned long long starts[] = {
+        0ULL, 99990ULL, 1999990ULL, 0xFFFFFFF8ULL, ULLONG_MAX - 4 * MAX_LANES + 1,
+    };
+
+    if (!kernel->hash)
+        return 1;
+
+    for (int binary = 0; binary <= 1; ++binary) {
+        for (size_t i = 0; i < sizeof(nonces) / sizeof(nonces[0]); ++i) {
+            for (size_t s = 0; s < sizeof(starts) / sizeof(starts[0]); ++s) {
+                if (!kernel_matches_scalar(kernel, nonces[i], starts[s], binary))
+                    return 0;
+            }
+        }
+    }
+
+    return 1;
+}
+
+static int kernel_usable(const pow_kernel_t *kernel) {
+    if (!kernel || (cpu_features() & kernel->cpu_features) != kernel->cpu_features)
+        return 0;
+
+    return kernel_self_test(kernel);
+}
+
+static volatile int selected_kernel = POW_KERNEL_AUTO;
+
+static double monotonic_seconds(void) {
+#ifdef _WIN32
+    LARGE_INTEGER frequency, now;
+    QueryPerformanceFrequency(&frequency);
+    QueryPerformanceCounter(&now);
+    return (double)now.QuadPart / (double)frequency.QuadPart;
+#else
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (double)now.tv_sec + (double)now.tv_nsec / 1e9;
+#endif
+}
+
+/*
+ * Single thread rate of a kernel in candidates per second, on the search path.
+ */
+static double measure_kernel(const pow_kernel_t *kernel, const char *nonce,
+                             unsigned long long iterations) {
+    pow_search_t search;
+    pow_candidate_t candidate;
+
+    // No digest has 256 leading zero bits, so every candidate gets hashed
+    memset(&search, 0, sizeof(search));
+    search.difficulty = MAX_DIFFICULTY;
+    search.kernel = kernel;
+    search.best = ULLONG_MAX;
+
+    double start = monotonic_seconds();
+    candidate_init(&candidate, nonce, strlen(nonce), 0);
+    scan_chunk(&search, &candidate, 0, iterations);
+    double elapsed = monotonic_seconds() - start;
+
+    return elapsed > 0 ? (double)iterations / elapsed : -1.0;
+}
+
+/*
+ * The kernel searches run with, unless one has been selected explicitly. On
+ * first use, every kernel the CPU supports and that passes its self test is
+ * timed on a short run, best of two, and the fastest one is kept.
+ */
+static const pow_kernel_t *active_kernel(void) {
+    int id = selected_kernel;
+
+    if (id == POW_KERNEL_AUTO) {
+        double best_rate = -1.0;
+
+        id = POW_KERNEL_MIDSTATE;
+        for (int i = 0; i < POW_KERNEL_TABLE_SIZE; ++i) {
+            if (!kernel_usable(&pow_kernels[i]))
+                continue;
+
+            for (int attempt = 0; attempt < 2; ++attempt) {
+                double rate = measure_kernel(&pow_kernels[i], SELECTION_NONCE, SELECTION_SAMPLE);
+                if (rate > best_rate) {
+                    best_rate = rate;
+                    id = pow_kernels[i].id;
+                }
+            }
+        }
+        selected_kernel = id;
+    }
+
+    return find_kernel(id);
+}
+
+/*
+ * Whether a hashing kernel can run on this host: compiled in, supported by the
+ * CPU and passing its self test against the scalar kernel.
+ */
+int pow_kernel_available(int kernel) {
+    return kernel_usable(find_kernel(kernel));
+}
+
+/*
+ * The hashing kernel searches currently run with.
+ */
+int pow_kernel_active(void) {
+    return active_kernel()->id;
+}
+
+/*
+ * Run all following searches with a given kernel, or with the best available one
+ * for POW_KERNEL_AUTO. Returns the kernel now in use, or -1 if the requested one
+ * is not available, leaving the selection unchanged.
+ */
+int pow_kernel_select(int kernel) {
+    if (kernel == POW_KERNEL_AUTO) {
+        selected_kernel = POW_KERNEL_AUTO;
+        return pow_kernel_active();
+    }
+
+    if (!pow_kernel_available(kernel))
+        return -1;
+
+    selected_kernel = kernel;
+    return kernel;
+}
+
+typedef void (*pow_worker_fn)(void *arg);
+
+typedef struct {
+    pow_worker_fn worker;
+    void *arg;
+} pow_task_t;
+
+#ifdef _WIN32
+static DWORD WINAPI task_thread(LPVOID arg) {
+    pow_task_t *task = (pow_task_t *)arg;
+    task->worker(task->arg);
+    return 0;
+}
+#else
+static void *task_thread(void *arg) {
+    pow_task_t *task = (pow_task_t *)arg;
+    task->worker(task->arg);
+    return NULL;
+}
+#endif
+
+/*
+ * Run the same worker on `threads` threads, the calling one included, and wait
+ * for all of them. Workers are expected to share their input through `arg`.
+ */
+static void run_workers(pow_worker_fn worker, void *arg, int threads) {
+    pow_task_t task = {worker, arg};
+    int spawned = 0;
+
+#ifdef _WIN32
+    HANDLE handles[MAX_THREADS];
+
+    for (int i = 1; i < threads; ++i) {
+        handles[spawned] = CreateThread(NULL, 0, task_thread, &task, 0, NULL);
+        if (handles[spawned] == NULL)
+            break;
+        ++spawned;
+    }
+
+    worker(arg);
+
+    for (int i = 0; i < spawned; ++i) {
+        WaitForSingleObject(handles[i], INFINITE);
+        CloseHandle(handles[i]);
+    }
+#else
+    pthread_t handles[MAX_THREADS];
+
+    for (int i = 1; i < threads; ++i) {
+        if (pthread_create(&handles[spawned], NULL, task_thread, &task) != 0)
+            break;
+        ++spawned;
+    }
+
+    worker(arg);
+
+    for (int i = 0; i < spawned; ++i)
+        pthread_join(handles[i], NULL);
+#endif
+}
+
+static size_t nonce_length(const char *nonce) {
+    return nonce ? strlen(nonce) : 0;
+}
+
+static int validate_one(const char *nonce, size_t nonce_len, int difficulty,
+                        unsigned long long solution);
+int check_pow_v2(const char *nonce, size_t nonce_len, int difficulty,
+                 unsigned long long solution);
+
+static int pow_solve(const char *nonce,
+                     size_t nonce_len,
+                     int binary,
+                     int difficulty,
+                     unsigned long long start,
+                     unsigned long long count,
+                     int threads,
+                     volatile int *stop,
+                     volatile unsigned long long *tried,
+                     unsigned long long *result) {
+    if (!nonce || !result || difficulty < 1 || difficulty > MAX_DIFFICULTY)
+        return POW_ERROR;
+    if (threads < 1 || threads > MAX_THREADS)
+        return POW_ERROR;
+
+    pow_search_t search;
+    search.nonce = nonce;
+    search.nonce_len = nonce_len;
+    search.binary = binary;
+    search.difficulty = difficulty;
+    search.kernel = active_kernel();
+    // The exclusive limit cannot go past ULLONG_MAX, so a range reaching the
+    // top of the counter space has its last counter checked on its own
+    int has_last = count > ULLONG_MAX - start;
+    search.limit = has_last ? ULLONG_MAX : start + count;
+    search.next_chunk = start;
+    search.best = search.limit;
+    search.stop = stop;
+    search.tried = tried;
+    search.stopped = 0;
+
+    run_workers(search_worker, &search, threads);
+
+    // A stopped search may have skipped chunks below the best solution it found
+    if (search.stopped)
+        return POW_STOPPED;
+    if (search.best < search.limit) {
+        *result = search.best;
+        return POW_OK;
+    }
+    if (!has_last)
+        return POW_NOT_FOUND;
+
+    if (tried)
+        atomic_fetch_add_u64(tried, 1);
+    if (binary ? !check_pow_v2(nonce, nonce_len, difficulty, ULLONG_MAX)
+               : !validate_one(nonce, nonce_len, difficulty, ULLONG_MAX))
+        return POW_NOT_FOUND;
+
+    *result = ULLONG_MAX;
+    return POW_OK;
+}
+
+/*
+ * Search the counters in [start, start + count) with a stop flag and a progress
+ * counter shared with the caller. Setting `*stop` to a non-zero value makes every
+ * thread return within one chunk, and `*tried` is increased by the number of
+ * candidates hashed as they are hashed. Both pointers may be NULL.
+ * Returns POW_OK, POW_NOT_FOUND, POW_STOPPED or POW_ERROR.
+ */
+int solve_pow_range_ctl(const char *nonce,
+                        int difficulty,
+                        unsigned long long start,
+                        unsigned long long count,
+                        int threads,
+                        volatile int *stop,
+                        volatile unsigned long long *tried,
+                        unsigned long long *result) {
+    return pow_solve(nonce, nonce_length(nonce), 0, difficulty, start, count, threads,
+                     stop, tried, result);
+}
+
+/*
+ * As solve_pow_range_ctl, for challenges with a binary counter: each candidate is
+ * the `nonce_len` bytes of the nonce followed by the counter as an 8 byte
+ * big-endian integer. The nonce may contain NUL bytes.
+ */
+int solve_pow_v2_ctl(const char *nonce,
+                     size_t nonce_len,
+                     int difficulty,
+                     unsigned long long start,
+                     unsigned long long count,
+                     int threads,
+                     volatile int *stop,
+                     volatile unsigned long long *tried,
+                     unsigned long long *result) {
+    return pow_solve(nonce, nonce_len, 1, difficulty, start, count, threads,
+                     stop, tried, result);
+}
+
+/*
+ * Search the counters in [start, start + count) on the calling thread, storing
+ * the lowest solution in `*result` and the number of candidates hashed in `*tried`.
+ * Returns POW_OK, or POW_NOT_FOUND once the whole range has been searched, so
+ * the next range can pick up at start + count.
+ */
+int solve_pow_range(const char *nonce,
+                    int difficulty,
+                    unsigned long long start,
+                    unsigned long long count,
+                    unsigned long long *result,
+                    unsigned long long *tried) {
+    volatile unsigned long long hashed = 0;
+    int ret = pow_solve(nonce, nonce_length(nonce), 0, difficulty, start, count, 1,
+                        NULL, &hashed, result);
+
+    if (tried)
+        *tried = hashed;
+
+    return ret;
+}
+
+/*
+ * Search from counter 0 up to the iteration limit, with an optional stop flag
+ * and progress counter as for solve_pow_range_ctl.
+ */
+int solve_pow_ctl(const char *nonce,
+                  int difficulty,
+                  int threads,
+                  volatile int *stop,
+                  volatile unsigned long long *tried,
+                  unsigned long long *result) {
+    return pow_solve(nonce, nonce_length(nonce), 0, difficulty, 0, MAX_ITERATIONS, threads,
+                     stop, tried, result);
+}
+
+int solve_pow_mt(const char *nonce, int difficulty, int threads, unsigned long long *result) {
+    int ret = pow_solve(nonce, nonce_length(nonce), 0, difficulty, 0, MAX_ITERATIONS, threads,
+                        NULL, NULL, result);
+
+    return ret == POW_OK ? 0 : 1;
+}
+
 int solve_pow(const char *nonce, int difficulty, unsigned long long *result) {
-    if (!nonce || difficulty < 1 || difficulty > MAX_DIFFICULTY)
+    return solve_pow_mt(nonce, difficulty, 1, result);
+}
+
+/*
+ * Shared state of a batch validation. Items are claimed in chunks by the worker
+ * threads, each writing only its own entries of `results`.
+ */
+typedef struct {
+    const char **nonces;
+    const int *difficulties;
+    const unsigned long long *solutions;
+    unsigned char *results;
+    unsigned long long count;
+    volatile unsigned long long next;
+} pow_batch_t;
+
+static int validate_one(const char *nonce, size_t nonce_len, int difficulty,
+                        unsigned long long solution) {
+    SHA256_CTX ctx;
+    unsigned char hash[SHA256_DIGEST_LENGTH];
+    char digits[24];
+    int n;
+
+    if (difficulty <= 0)
         return 1;
+    if (difficulty > MAX_DIFFICULTY)
+        return 0;
+
+    n = snprintf(digits, sizeof(digits), "%llu", solution);
+
+    SHA256_Init(&ctx);
+    SHA256_Update(&ctx, nonce, nonce_len);
+    SHA256_Update(&ctx, digits, n);
+    SHA256_Final(hash, &ctx);
+
+    return check_difficulty(hash, difficulty);
+}
+
+static void batch_worker(void *arg) {
+    pow_batch_t *batch = (pow_batch_t *)arg;
+
+    for (;;) {
+        unsigned long long start = atomic_fetch_add_u64(&batch->next, BATCH_CHUNK);
+        if (start >= batch->count)
+            return;
+
+        unsigned long long end = start + BATCH_CHUNK;
+        if (end > batch->count)
+            end = batch->count;
 
-    char buffer[512];
+        for (unsigned long long i = start; i < end; ++i) {
+            batch->results[i] = (unsigned char)validate_one(
+                batch->nonces[i], strlen(batch->nonces[i]), batch->difficulties[i],
+                batch->solutions[i]);
+        }
+    }
+}
+
+/*
+ * Validate a single solution, returning 1 if it is valid and 0 otherwise.
+ * The nonce is given with its length, so it may contain NUL characters.
+ */
+int check_pow(const char *nonce, size_t nonce_len, int difficulty, unsigned long long solution) {
+    if (!nonce && nonce_len)
+        return 0;
+
+    return validate_one(nonce, nonce_len, difficulty, solution);
+}
+
+/*
+ * As check_pow, for challenges with a binary counter, see solve_pow_v2_ctl.
+ */
+int check_pow_v2(const char *nonce, size_t nonce_len, int difficulty,
+                 unsigned long long solution) {
+    SHA256_CTX ctx;
     unsigned char hash[SHA256_DIGEST_LENGTH];
+    unsigned char counter[COUNTER_BYTES];
 
-    for (unsigned long long counter = 0; counter < MAX_ITERATIONS; ++counter) {
-        int len = snprintf(buffer, sizeof(buffer), "%s%llu", nonce, counter);
-        if (len < 0 || len >= sizeof(buffer)) return 1;
+    if (!nonce && nonce_len)
+        return 0;
+    if (difficulty <= 0)
+        return 1;
+    if (difficulty > MAX_DIFFICULTY)
+        return 0;
 
-        SHA256((unsigned char *)buffer, len, hash);
+    for (int i = 0; i < COUNTER_BYTES; ++i)
+        counter[COUNTER_BYTES - 1 - i] = (unsigned char)(solution >> (8 * i));
 
-        if (check_difficulty(hash, difficulty)) {
-            *result = counter;
-            return 0;
+    SHA256_Init(&ctx);
+    SHA256_Update(&ctx, nonce, nonce_len);
+    SHA256_Update(&ctx, counter, COUNTER_BYTES);
+    SHA256_Final(hash, &ctx);
+
+    return check_difficulty(hash, difficulty);
+}
+
+/*
+ * Validate `count` solutions at once, writing 1 or 0 for each into `results`.
+ * `nonces` holds the nonces back to back, each terminated by a NUL character.
+ * Large batches are spread over up to `threads` threads.
+ */
+int validate_pow_batch(const char *nonces,
+                       const int *difficulties,
+                       const unsigned long long *solutions,
+                       int count,
+                       int threads,
+                       unsigned char *results) {
+    if (count < 0 || threads < 1 || threads > MAX_THREADS)
+        return 1;
+    if (count == 0)
+        return 0;
+    if (!nonces || !difficulties || !solutions || !results)
+        return 1;
+
+    const char **starts = malloc(sizeof(const char *) * (size_t)count);
+    if (!starts)
+        return 1;
+
+    const char *cursor = nonces;
+    for (int i = 0; i < count; ++i) {
+        starts[i] = cursor;
+        cursor += strlen(cursor) + 1;
+    }
+
+    pow_batch_t batch;
+    batch.nonces = starts;
+    batch.difficulties = difficulties;
+    batch.solutions = solutions;
+    batch.results = results;
+    batch.count = (unsigned long long)count;
+    batch.next = 0;
+
+    if (count < BATCH_PARALLEL_MIN)
+        threads = 1;
+    else if (threads > count / (int)BATCH_CHUNK)
+        threads = count / (int)BATCH_CHUNK;
+
+    run_workers(batch_worker, &batch, threads);
+    free(starts);
+
+    return 0;
+}
+
+/*
+ * Measure how many candidates per second one thread can hash with a given kernel.
+ * POW_KERNEL_LEGACY is the original snprintf and one-shot SHA256() loop, kept
+ * here only as the baseline to compare against. Other kernels are measured on
+ * the search path itself. Returns -1 if the kernel is not available.
+ */
+double pow_hash_rate(const char *nonce, int kernel, unsigned long long iterations) {
+    if (!nonce || iterations == 0)
+        return -1.0;
+
+    if (kernel == POW_KERNEL_LEGACY) {
+        volatile SHA_LONG sink = 0;
+        char buffer[512];
+        unsigned char hash[SHA256_DIGEST_LENGTH];
+
+        double start = monotonic_seconds();
+        for (unsigned long long counter = 0; counter < iterations; ++counter) {
+            int len = snprintf(buffer, sizeof(buffer), "%s%llu", nonce, counter);
+            if (len < 0 || len >= (int)sizeof(buffer))
+                return -1.0;
+
+            SHA256((unsigned char *)buffer, len, hash);
+            sink ^= (SHA_LONG)check_difficulty(hash, MAX_DIFFICULTY);
         }
+        double elapsed = monotonic_seconds() - start;
+        (void)sink;
+
+        return elapsed > 0 ? (double)iterations / elapsed : -1.0;
     }
 
-    return 1;  // No solution found
+    const pow_kernel_t *selected = find_kernel(kernel);
+
+    if (kernel == POW_KERNEL_AUTO)
+        selected = active_kernel();
+    else if (!kernel_usable(selected))
+        return -1.0;
+
+    return measure_kernel(selected, nonce, iterations);
 }
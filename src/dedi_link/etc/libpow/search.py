@@ -0,0 +1,336 @@
+"""
+Pure Python Proof of Work search
+
+Used when the native library is not available. Candidates are hashed from a
+SHA-256 object pre-fed with the nonce, and candidates sharing all but their
+last few digits or bytes share the hashing of their common part.
+"""
+
+import time
+import asyncio
+import hashlib
+from functools import lru_cache
+from typing import Optional, Callable, Any
+from concurrent.futures import Executor
+
+from dedi_link.etc.enums import PowVersion
+from .control import PowControl, PowStoppedError
+
+
+# Candidates are searched in batches sharing every digit but the last three, so
+# the common part is hashed once per batch and the rest comes from this table
+_BATCH_DIGITS = 3
+_BATCH_SIZE = 10 ** _BATCH_DIGITS
+_BATCH_SUFFIXES = tuple(b'%0*d' % (_BATCH_DIGITS, i) for i in range(_BATCH_SIZE))
+# Binary counters are batched the same way, sharing all but their last byte
+_BINARY_SUFFIXES = tuple(bytes((i,)) for i in range(256))
+COUNTER_BYTES = 8
+# Sharded searches hand out counters to worker processes in blocks of this size
+SHARD_SIZE = 16 * _BATCH_SIZE
+MAX_COUNTER = (1 << 64) - 1
+
+
+@lru_cache(maxsize=None)
+def difficulty_target(difficulty: int) -> bytes:
+    """
+    Get the digest threshold for a difficulty.
+
+    A big-endian digest has at least `difficulty` leading zero bits exactly when
+    it compares lower than the returned bytes.
+    :param difficulty: How many leading zero bits are required, from 1 to 256.
+    :return: The exclusive upper bound of valid digests.
+    """
+    return (1 << (256 - difficulty)).to_bytes(32, 'big')
+
+
+def _report_progress(control: Optional[PowControl], count: int, slot: int):
+    """
+    Record progress of a Python search, and stop it if asked to.
+    :param control: The control block of the search, if any.
+    :param count: How many more candidates have been hashed.
+    :param slot: The progress counter of the control block to add to.
+    """
+    if control is not None:
+        control.add_tried(count, slot)
+        if control.stopped:
+            raise PowStoppedError('PoW solving was stopped')
+
+
+def _prefixed(copy: Callable[[], Any], data: bytes) -> Any:
+    """
+    Start the hashing of a batch of candidates sharing a common part.
+    :param copy: Copies a SHA-256 object pre-fed with the nonce.
+    :param data: The common part of the candidates.
+    :return: A SHA-256 object fed with the nonce and the common part.
+    """
+    batch = copy()
+    batch.update(data)
+    return batch
+
+
+def _search_binary(nonce: str,
+                   difficulty: int,
+                   start: int,
+                   stop: int,
+                   *,
+                   control: Optional[PowControl] = None,
+                   slot: int = 0,
+                   ) -> Optional[int]:
+    """
+    Search a range of binary counters for a solution with Python implementation.
+
+    Counters sharing all but their last byte are handled in batches, with the
+    shared bytes hashed only once per batch.
+    :param nonce: The nonce to use for the proof of work challenge.
+    :param difficulty: How many leading zeros the hash should have.
+    :param start: The first counter to try.
+    :param stop: The counter to stop before.
+    :param control: An optional control block, checked and updated once per batch.
+    :param slot: The progress counter of the control block to add to.
+    :return: The lowest valid counter in the range, or None if there is none.
+    """
+    target = difficulty_target(difficulty)
+    copy = hashlib.sha256(nonce.encode()).copy
+
+    for high in range(start // 256, -(-stop // 256)):
+        low = max(start - high * 256, 0)
+        end = min(stop - high * 256, 256)
+        batch_copy = _prefixed(copy, high.to_bytes(COUNTER_BYTES - 1, 'big')).copy
+
+        for i in range(low, end):
+            h = batch_copy()
+            h.update(_BINARY_SUFFIXES[i])
+            if h.digest() < target:
+                _report_progress(control, i + 1 - low, slot)
+                return high * 256 + i
+
+        _report_progress(control, end - low, slot)
+
+    return None
+
+
+def python_search(nonce: str,
+                  difficulty: int,
+                  start: int,
+                  stop: int,
+                  *,
+                  control: Optional[PowControl] = None,
+                  slot: int = 0,
+                  version: PowVersion = PowVersion.V1,
+                  ) -> Optional[int]:
+    """
+    Search a range of counters for a solution with Python implementation.
+
+    A SHA-256 object pre-fed with the nonce is copied for every candidate, and
+    candidates sharing their leading digits are handled in batches, with those
+    digits hashed only once per batch.
+    :param nonce: The nonce to use for the proof of work challenge.
+    :param difficulty: How many leading zeros the hash should have.
+    :param start: The first counter to try.
+    :param stop: The counter to stop before.
+    :param control: An optional control block, checked and updated once per batch.
+    :param slot: The progress counter of the control block to add to.
+    :param version: How the counter is appended to the nonce.
+    :return: The lowest valid counter in the range, or None if there is none.
+    """
+    search = _search_binary if version == PowVersion.V2 else _search_decimal
+
+    return search(nonce, difficulty, start, stop, control=control, slot=slot)
+
+
+def _search_decimal(nonce: str,
+                    difficulty: int,
+                    start: int,
+                    stop: int,
+                    *,
+                    control: Optional[PowControl] = None,
+                    slot: int = 0,
+                    ) -> Optional[int]:
+    """
+    Search a range of decimal counters for a solution with Python implementation.
+
+    Counters sharing all but their last three digits are handled in batches,
+    with the shared digits hashed only once per batch.
+    :param nonce: The nonce to use for the proof of work challenge.
+    :param difficulty: How many leading zeros the hash should have.
+    :param start: The first counter to try.
+    :param stop: The counter to stop before.
+    :param control: An optional control block, checked and updated once per batch.
+    :param slot: The progress counter of the control block to add to.
+    :return: The lowest valid counter in the range, or None if there is none.
+    """
+    target = difficulty_target(difficulty)
+    copy = hashlib.sha256(nonce.encode()).copy
+
+    def scan(first: int, last: int) -> Optional[int]:
+        for counter in range(first, last):
+            h = copy()
+            h.update(b'%d' % counter)
+            if h.digest() < target:
+                _report_progress(control, counter + 1 - first, slot)
+                return counter
+        _report_progress(control, max(last - first, 0), slot)
+        return None
+
+    # Counters without enough digits, or not aligned to a batch, go one by one
+    head = max(start, _BATCH_SIZE)
+    head = min(stop, -(-head // _BATCH_SIZE) * _BATCH_SIZE)
+    found = scan(start, head)
+    if found is not None or head >= stop:
+        return found
+
+    for high in range(head // _BATCH_SIZE, stop // _BATCH_SIZE):
+        batch_copy = _prefixed(copy, b'%d' % high).copy
+
+        for suffix in _BATCH_SUFFIXES:
+            h = batch_copy()
+            h.update(suffix)
+            if h.digest() < target:
+                _report_progress(control, int(suffix) + 1, slot)
+                return high * _BATCH_SIZE + int(suffix)
+
+        _report_progress(control, _BATCH_SIZE, slot)
+
+    return scan(max(head, stop // _BATCH_SIZE * _BATCH_SIZE), stop)
+
+
+def python_solve(nonce: str,
+                 difficulty: int,
+                 control: Optional[PowControl] = None,
+                 version: PowVersion = PowVersion.V1,
+                 ) -> int:
+    """
+    Solve a proof of work challenge with Python implementation.
+
+    This is a fallback implementation that uses Python's hashlib
+    to compute the SHA-256 hash and find a valid nonce.
+    :param nonce: The nonce to use for the proof of work challenge.
+    :param difficulty: How many leading zeros the hash should have.
+    :param control: An optional control block to stop the search and report
+        progress through.
+    :param version: How the counter is appended to the nonce.
+    :return: The valid nonce that solves the challenge.
+    """
+    if not isinstance(nonce, str) or not isinstance(difficulty, int):
+        raise TypeError('Expected nonce: str and difficulty: int')
+    if difficulty < 1 or difficulty > 256:
+        raise ValueError('Difficulty must be between 1 and 256')
+
+    # covers entire 64-bit unsigned range
+    counter = python_search(
+        nonce, difficulty, 0, 1 << 64, control=control, version=version,
+    )
+    if counter is None:
+        raise RuntimeError('No valid nonce found within 64-bit search space')
+
+    return counter
+
+
+def python_solve_shard(nonce: str,
+                       difficulty: int,
+                       control: PowControl,
+                       shard: int,
+                       version: PowVersion = PowVersion.V1,
+                       ) -> Optional[int]:
+    """
+    Search one shard of the counter space with Python implementation.
+
+    The counter space is split into blocks, handed out to the shards in turn,
+    and each shard searches its blocks in increasing order. A shard gives up
+    once its next block starts past a solution recorded by any shard, as it
+    can no longer find a lower one. The lowest solution of all shards is then
+    the lowest solution overall.
+    :param nonce: The nonce to use for the proof of work challenge.
+    :param difficulty: How many leading zeros the hash should have.
+    :param control: The control block shared by all shards, with a slot each.
+    :param shard: Which shard to search, also the slot to report to.
+    :param version: How the counter is appended to the nonce.
+    :return: The lowest solution in this shard below those recorded by the
+        others, or None if there is none.
+    """
+    shards = control.slots
+
+    for start in range(shard * SHARD_SIZE, MAX_COUNTER + 1, shards * SHARD_SIZE):
+        solution = control.solution
+        if solution is not None and start > solution:
+            return None
+
+        stop = min(start + SHARD_SIZE, MAX_COUNTER + 1)
+        found = python_search(
+            nonce, difficulty, start, stop, control=control, slot=shard, version=version,
+        )
+        if found is not None:
+            control.record_solution(found, shard)
+            return found
+
+    return None
+
+
+async def python_solve_sharded(executor: Executor,
+                               nonce: str,
+                               difficulty: int,
+                               control: PowControl,
+                               version: PowVersion = PowVersion.V1,
+                               ) -> int:
+    """
+    Solve a proof of work challenge with Python implementation, spread over
+    the workers of an executor.
+
+    Each slot of the control block is one shard, see python_solve_shard.
+    Stopping the control block stops all shards.
+    :param executor: The executor to run the shards in.
+    :param nonce: The nonce to use for the proof of work challenge.
+    :param difficulty: How many leading zeros the hash should have.
+    :param control: The control block shared by all shards.
+    :param version: How the counter is appended to the nonce.
+    :return: The valid nonce that solves the challenge.
+    """
+    if not isinstance(nonce, str) or not isinstance(difficulty, int):
+        raise TypeError('Expected nonce: str and difficulty: int')
+    if difficulty < 1 or difficulty > 256:
+        raise ValueError('Difficulty must be between 1 and 256')
+
+    loop = asyncio.get_running_loop()
+    # Every shard has to finish before the control block can be released
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor,
+                python_solve_shard,
+                nonce,
+                difficulty,
+                control,
+                shard,
+                version,
+            )
+            for shard in range(control.slots)
+        ),
+        return_exceptions=True,
+    )
+
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    solution = min((result for result in results if result is not None), default=None)
+    if solution is None:
+        raise RuntimeError('No valid nonce found within 64-bit search space')
+
+    return solution
+
+
+def python_hash_rate(iterations: int = 1 << 18,
+                     nonce: str = 'dfe041b4f60cb54d082e542b109e392a',
+                     ) -> float:
+    """
+    Measure the hash rate of the Python implementation.
+    :param iterations: How many candidates to hash.
+    :param nonce: The nonce to hash candidates for.
+    :return: The measured rate in hashes per second.
+    """
+    start = time.perf_counter()
+    # No digest can have 256 leading zero bits, so the whole range is hashed
+    python_search(nonce, 256, 0, iterations)
+    elapsed = time.perf_counter() - start
+
+    return iterations / elapsed if elapsed > 0 else float('inf')
@@ -0,0 +1,123 @@
+"""
+Validation of Proof of Work responses
+
+Responses are checked with the Python implementation unless the native check
+has been found to be faster on this host, see PowDriver.select_validator.
+"""
+
+import time
+import hashlib
+from typing import Any, Optional, Sequence, Callable
+
+from dedi_link.etc.enums import PowVersion
+from .search import COUNTER_BYTES, MAX_COUNTER, difficulty_target
+
+
+# How many checks each validation path is timed on before picking one, and how
+# much faster the native path has to be to make up for its extra dispatch
+VALIDATE_SAMPLE = 2000
+VALIDATE_NATIVE_MARGIN = 0.8
+
+
+def unpack_challenge(challenge: Any) -> Optional[tuple[str, int, int]]:
+    """
+    Unpack a challenge of a batch, checking its shape and field types.
+    :param challenge: The (nonce, difficulty, response) tuple to unpack.
+    :return: The fields, or None if the challenge is malformed.
+    """
+    if not isinstance(challenge, (tuple, list)) or len(challenge) != 3:
+        return None
+
+    nonce, difficulty, response = challenge
+    # A bool response would be formatted as 'True' rather than '1'
+    if not isinstance(nonce, str) or any(
+            not isinstance(value, int) or isinstance(value, bool)
+            for value in (difficulty, response)
+    ):
+        return None
+
+    return nonce, difficulty, response
+
+
+def is_native_batch(challenges: Sequence[tuple[str, int, int]]) -> bool:
+    """
+    Check whether a batch of challenges can be validated natively as a whole.
+
+    The checks work on whole columns at once, so they stay cheap for large batches.
+    :param challenges: The (nonce, difficulty, response) tuples to check, as
+        unpacked by unpack_challenge.
+    :return: True if every challenge fits the native batch validation.
+    """
+    nonces, difficulties, responses = zip(*challenges)
+
+    return ('\0' not in ''.join(nonces)
+            and 1 <= min(difficulties) and max(difficulties) <= 256
+            and 0 <= min(responses) and max(responses) <= MAX_COUNTER)
+
+
+def python_validate(nonce: str,
+                    difficulty: int,
+                    response: int,
+                    version: PowVersion = PowVersion.V1,
+                    ) -> bool:
+    """
+    Validate a proof of work response with Python implementation.
+
+    The digest is compared as bytes against the threshold of the difficulty,
+    so no bit string is built.
+    :param nonce: The nonce used for the proof of work challenge.
+    :param difficulty: How many leading zeros the hash should have, from 1 to 256.
+    :param response: The response to validate against the challenge. For
+        V2, an unsigned 64-bit integer.
+    :param version: How the counter is appended to the nonce.
+    :return: True if the response is valid, False otherwise.
+    """
+    if version == PowVersion.V2:
+        data = nonce.encode() + response.to_bytes(COUNTER_BYTES, 'big')
+    else:
+        data = f'{nonce}{response}'.encode()
+
+    return hashlib.sha256(data).digest() < difficulty_target(difficulty)
+
+
+def native_validator(lib: Any,
+                     version: PowVersion = PowVersion.V1,
+                     ) -> Callable[[str, int, int], bool]:
+    """
+    Wrap the check export of a native library as a validation function.
+    :param lib: The loaded native library.
+    :param version: How the counter is appended to the nonce.
+    :return: The validation function, taking a nonce, a difficulty from 1 to
+        256 and a response that fits in an unsigned 64-bit integer.
+    """
+    check_pow = lib.check_pow_v2 if version == PowVersion.V2 else lib.check_pow
+
+    def validate(nonce: str, difficulty: int, response: int) -> bool:
+        encoded = nonce.encode()
+        return check_pow(encoded, len(encoded), difficulty, response) != 0
+
+    return validate
+
+
+def faster_validator(python: Callable[[str, int, int], bool],
+                     native: Callable[[str, int, int], bool],
+                     ) -> Callable[[str, int, int], bool]:
+    """
+    Time the Python and native validation paths on a short sample, and pick one.
+
+    A native call costs about as much as hashing a short message, so the native
+    path is only kept if it is clearly faster.
+    :param python: The Python validation function.
+    :param native: The native validation function.
+    :return: The faster of the two.
+    """
+    def timed(check: Callable[[str, int, int], bool]) -> float:
+        start = time.perf_counter()
+        for response in range(VALIDATE_SAMPLE):
+            check('dfe041b4f60cb54d082e542b109e392a', 8, response)
+        return time.perf_counter() - start
+
+    native_time = min(timed(native) for _ in range(3))
+    python_time = min(timed(python) for _ in range(3))
+
+    return native if native_time < python_time * VALIDATE_NATIVE_MARGIN else python
@@ -5,7 +5,8 @@ This package defines the core data models used in the DeDi-Link protocol.
 """
 
 from .base import JsonModel
-from .crypto_key import Ec384PublicKey, Ec384PrivateKey
+from .crypto_key import Ec384PublicKey, LazyEc384PublicKey, Ec384PrivateKey
+from .session_key import SessionKey, SessionKeyCache
 from .network import Network
 from .node import Node
 from .user import User
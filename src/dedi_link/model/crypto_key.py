@@ -2,38 +2,165 @@
 Module for cryptographic key representation and validation.
 """
 
+import os
+import base64
+import asyncio
+import hashlib
+import binascii
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, TypeVar
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar, Iterable, Sequence, Optional, Union, Hashable
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.hazmat.primitives import hashes, serialization
 from pydantic_core import core_schema
 
+from dedi_link.etc.enums import KeyEncoding
+
 
 CryptoKeyT = TypeVar('CryptoKeyT', bound='CryptoKey')
 
+# The serialisation context entry selecting the KeyEncoding of public keys
+KEY_ENCODING_CONTEXT = 'key_encoding'
+
+
+@dataclass(frozen=True)
+class CacheInfo:
+    """
+    Statistics of a key cache.
+    """
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+
+class _LruCache:
+    """
+    A thread safe, bounded LRU mapping with hit and miss counters.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_size: int):
+        """
+        Resize the cache, dropping every entry and resetting the counters.
+        :param max_size: How many entries to keep at most, 0 to disable the cache.
+        """
+        if not isinstance(max_size, int) or max_size < 0:
+            raise ValueError('Cache size must be a non-negative integer')
+
+        with self._lock:
+            self.max_size = max_size
+            self.hits = 0
+            self.misses = 0
+            self._entries.clear()
+
+    def info(self) -> CacheInfo:
+        """
+        Get the statistics of the cache.
+        :return: The hit and miss counters, and the current and maximum size.
+        """
+        with self._lock:
+            return CacheInfo(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self._entries),
+                max_size=self.max_size,
+            )
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Look up an entry, marking it as the most recently used.
+        :param key: The key of the entry.
+        :return: The cached value, or None if there is no entry for the key.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+            return value
+
+    def put(self, key: Hashable, value: Any) -> Any:
+        """
+        Add an entry, unless another thread added one for the key first.
+        :param key: The key of the entry.
+        :param value: The value to cache.
+        :return: The value in the cache for the key.
+        """
+        with self._lock:
+            value = self._entries.setdefault(key, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+            return value
+
 
 class CryptoKey(ABC):
     """
     Base class for cryptographic keys.
+
+    The wrapped key is immutable, so its identity bytes, hash and PEM encoding
+    are computed on first use and kept for the lifetime of the instance.
     """
 
-    __slots__ = ()
+    __slots__ = ('_identity', '_hash', '_pem')
+
+    def __init__(self):
+        self._identity = None
+        self._hash = None
+        self._pem = None
+
+    @abstractmethod
+    def _encode_identity(self) -> bytes:
+        """
+        Encode the identity bytes of the key.
+        :return: The identity bytes.
+        """
 
     @abstractmethod
+    def _encode_pem(self) -> str:
+        """
+        Encode the key in PEM format.
+        :return: The key in PEM format as a string.
+        """
+
     def _identity_bytes(self) -> bytes:
         """
         Get the identity bytes of the key for comparison and hashing.
         :return: The identity bytes.
         """
+        if self._identity is None:
+            self._identity = self._encode_identity()
+
+        return self._identity
 
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, CryptoKey):
             return NotImplemented
+        if self is other:
+            return True
 
         return self._identity_bytes() == other._identity_bytes()
 
     def __hash__(self) -> int:
-        return hash(self._identity_bytes())
+        if self._hash is None:
+            self._hash = hash(self._identity_bytes())
+
+        return self._hash
 
     @classmethod
     @abstractmethod
@@ -63,37 +190,311 @@ class CryptoKey(ABC):
         """
         return cls._try_parse(pem_key)
 
+    @classmethod
+    def parse(cls: CryptoKeyT, value: Any) -> CryptoKeyT:
+        """
+        Load a cryptographic key from any encoding the key type accepts.
+        :param value: The encoded key, or a key object, which is returned as it is.
+        :return: The cryptographic key object.
+        """
+        return cls._try_parse(value)
+
+    @property
+    def identity(self) -> bytes:
+        """
+        The bytes identifying the key, as used for comparison and hashing.
+        :return: The DER encoding of the key.
+        """
+        return self._identity_bytes()
+
     @property
     def pem(self) -> str:
         """
         Get the PEM representation of the cryptographic key.
         :return: The key in PEM format as a string.
         """
-        return self._try_serialise(self)
+        if self._pem is None:
+            self._pem = self._encode_pem()
+
+        return self._pem
 
 
 class Ec384PublicKey(CryptoKey):
     """
     A type representing an ECDSA public key using the NIST P-384 curve,
+
+    Parsed keys are kept in a bounded LRU cache keyed by their PEM text, as the
+    same node keys are validated over and over in network messages. A repeated
+    parse returns the same instance, which is safe as keys are immutable.
+
+    Besides PEM, keys are accepted as a base64url SEC1 point or DER structure,
+    told apart by their content. Keys are serialised as PEM, unless another
+    KeyEncoding is given under KEY_ENCODING_CONTEXT in the serialisation
+    context.
     """
 
-    __slots__ = ('public_key',)
+    __slots__ = ('_public_key', '_point')
+
+    _parse_cache = _LruCache(4096)
+    _verify_cache = _LruCache(4096)
+
+    # Below this many signatures a batch is verified serially in the calling
+    # thread, where handing it to the pool would cost more than it could save
+    VERIFY_PARALLEL_THRESHOLD = 64
+    # Below this many signatures per worker, a batch is verified in one call
+    VERIFY_CHUNK_SIZE = 16
+
+    _verify_executor: Optional[ThreadPoolExecutor] = None
+    _verify_workers: Optional[int] = None
+    _verify_executor_lock = threading.Lock()
 
     def __init__(self, public_key: ec.EllipticCurvePublicKey):
-        self.public_key = public_key
+        super().__init__()
+        self._public_key = public_key
+        self._point = None
 
-    def _identity_bytes(self) -> bytes:
-        return self.public_key.public_bytes(
+    @property
+    def public_key(self) -> ec.EllipticCurvePublicKey:
+        """
+        The wrapped public key.
+        :return: The public key object.
+        """
+        return self._public_key
+
+    def _encode_identity(self) -> bytes:
+        return self._public_key.public_bytes(
             encoding=serialization.Encoding.DER,
             format=serialization.PublicFormat.SubjectPublicKeyInfo,
         )
 
+    def _encode_pem(self) -> str:
+        return self._public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+
+    def encode(self, encoding: KeyEncoding = KeyEncoding.PEM) -> str:
+        """
+        Encode the public key as text.
+        :param encoding: The encoding to use.
+        :return: The encoded public key.
+        """
+        encoding = KeyEncoding(encoding)
+
+        if encoding == KeyEncoding.PEM:
+            return self.pem
+        if encoding == KeyEncoding.DER:
+            return _b64url(self._identity_bytes())
+
+        if self._point is None:
+            self._point = _b64url(self.public_key.public_bytes(
+                encoding=serialization.Encoding.X962,
+                format=serialization.PublicFormat.CompressedPoint,
+            ))
+
+        return self._point
+
+    @classmethod
+    def configure_parse_cache(cls, max_size: int = 4096):
+        """
+        Configure the cache of parsed keys, clearing it and its statistics.
+        :param max_size: How many parsed keys to keep at most, 0 to disable
+            the cache.
+        """
+        cls._parse_cache.configure(max_size)
+
+    @classmethod
+    def parse_cache_info(cls) -> CacheInfo:
+        """
+        Get the statistics of the cache of parsed keys.
+        :return: The hits, misses, current and maximum size of the cache.
+        """
+        return cls._parse_cache.info()
+
+    @classmethod
+    def configure_verify_cache(cls, max_size: int = 4096):
+        """
+        Configure the cache of verified signatures, clearing it and its statistics.
+        :param max_size: How many verified signatures to keep at most, 0 to
+            disable the cache.
+        """
+        cls._verify_cache.configure(max_size)
+
+    @classmethod
+    def verify_cache_info(cls) -> CacheInfo:
+        """
+        Get the statistics of the cache of verified signatures.
+        :return: The hits, misses, current and maximum size of the cache.
+        """
+        return cls._verify_cache.info()
+
+    def verify(self, data: bytes, signature: bytes) -> bool:
+        """
+        Verify an ECDSA signature over data, made with SHA-384.
+
+        Valid signatures are remembered by key, digest and signature, so the
+        same message arriving again, for example over another route, is not
+        verified a second time. Invalid signatures are never cached.
+        :param data: The signed data.
+        :param signature: The DER encoded signature.
+        :return: True if the signature is valid for the data and this key.
+        """
+        if not isinstance(data, bytes) or not isinstance(signature, bytes):
+            raise TypeError('Data and signature must be bytes.')
+
+        try:
+            public_key = self.public_key
+        except ValueError:
+            # A lazily parsed key that turns out to be invalid verifies nothing
+            return False
+
+        digest = hashlib.sha384(data).digest()
+        cache = self._verify_cache
+        entry = (self._identity_bytes(), digest, signature)
+
+        if cache.max_size and cache.get(entry):
+            return True
+
+        try:
+            public_key.verify(signature, digest, ec.ECDSA(Prehashed(hashes.SHA384())))
+        except InvalidSignature:
+            return False
+
+        if cache.max_size:
+            cache.put(entry, True)
+
+        return True
+
+    @classmethod
+    def configure_verify_executor(cls, max_workers: Optional[int] = None):
+        """
+        Configure the thread pool batches of signatures are verified in.
+
+        The pool is shared by all keys and only created when first needed. A
+        running pool is shut down, and the next one is built with the new size.
+        :param max_workers: The size of the pool, defaults to the number of CPUs.
+        """
+        if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+            raise ValueError('Executor size must be a positive integer')
+
+        cls.shutdown_verify_executor()
+
+        with cls._verify_executor_lock:
+            Ec384PublicKey._verify_workers = max_workers
+
+    @classmethod
+    def shutdown_verify_executor(cls, wait: bool = True):
+        """
+        Shut down the shared thread pool, if it has been created.
+        :param wait: Whether to wait for pending verifications to finish.
+        """
+        with cls._verify_executor_lock:
+            executor, Ec384PublicKey._verify_executor = Ec384PublicKey._verify_executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    @classmethod
+    def _after_fork(cls):
+        # The pool belongs to the parent process, the child starts without one
+        Ec384PublicKey._verify_executor = None
+        Ec384PublicKey._verify_executor_lock = threading.Lock()
+
+    @classmethod
+    def _get_verify_executor(cls) -> ThreadPoolExecutor:
+        with cls._verify_executor_lock:
+            if Ec384PublicKey._verify_executor is None:
+                Ec384PublicKey._verify_executor = ThreadPoolExecutor(
+                    max_workers=Ec384PublicKey._verify_workers or os.cpu_count() or 1,
+                    thread_name_prefix='ec384-verify',
+                )
+
+            return Ec384PublicKey._verify_executor
+
+    @classmethod
+    def verify_many(cls, items: Iterable[tuple[Any, bytes, bytes]]) -> list[bool]:
+        """
+        Verify many signatures at once.
+
+        Signatures in the verified-signature cache are accepted without being
+        verified again. Batches of at least VERIFY_PARALLEL_THRESHOLD items are
+        split into one chunk per worker of the shared thread pool, smaller ones
+        are verified serially in the calling thread.
+        :param items: The (key, data, signature) tuples to verify. Keys may be
+            key objects or text accepted by _try_parse.
+        :return: Whether each signature is valid, in input order. Malformed
+            items, and items with an unusable key, data or signature, are not
+            valid.
+        """
+        items = list(items)
+        if len(items) < cls.VERIFY_PARALLEL_THRESHOLD:
+            return cls._verify_each(items)
+
+        chunks = cls._verify_chunks(len(items))
+        if len(chunks) <= 1:
+            return cls._verify_each(items)
+
+        executor = cls._get_verify_executor()
+        results = executor.map(cls._verify_each, [items[chunk] for chunk in chunks])
+
+        return [result for chunk in results for result in chunk]
+
+    @classmethod
+    async def verify_many_async(cls, items: Iterable[tuple[Any, bytes, bytes]]) -> list[bool]:
+        """
+        Verify many signatures at once, without blocking the event loop.
+
+        Works as verify_many, but always runs the verification in the shared
+        thread pool.
+        :param items: The (key, data, signature) tuples to verify.
+        :return: Whether each signature is valid, in input order.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        loop = asyncio.get_running_loop()
+        executor = cls._get_verify_executor()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, cls._verify_each, items[chunk])
+            for chunk in cls._verify_chunks(len(items))
+        ))
+
+        return [result for chunk in results for result in chunk]
+
+    @classmethod
+    def _verify_chunks(cls, count: int) -> list[slice]:
+        """
+        Split a batch into one contiguous chunk per worker, keeping at least
+        VERIFY_CHUNK_SIZE items in each.
+        :param count: The size of the batch.
+        :return: The slices of the chunks, in order.
+        """
+        workers = Ec384PublicKey._verify_workers or os.cpu_count() or 1
+        chunks = max(min(workers, count // cls.VERIFY_CHUNK_SIZE), 1)
+        size = max(-(-count // chunks), 1)
+
+        return [slice(i, i + size) for i in range(0, count, size)]
+
+    @classmethod
+    def _verify_each(cls, items: Sequence[tuple[Any, bytes, bytes]]) -> list[bool]:
+        results = []
+        for item in items:
+            try:
+                key, data, signature = item
+                results.append(Ec384PublicKey._try_parse(key).verify(data, signature))
+            except (TypeError, ValueError):
+                results.append(False)
+
+        return results
+
     @classmethod
     def _try_parse(cls, value: Any) -> 'Ec384PublicKey':
         """
         Parse and validate that the provided value is a valid ECDSA public key
         using NIST P-384 curve.
-        :param value: The public key in PEM format.
+        :param value: The public key in PEM format, or as a base64url SEC1 point
+            or DER structure.
         :return: The ECDSA public key object.
         """
         if isinstance(value, Ec384PublicKey):
@@ -102,36 +503,98 @@ class Ec384PublicKey(CryptoKey):
         if not isinstance(value, str):
             raise TypeError('Public key must be a string in PEM format.')
 
+        cache = cls._parse_cache
+        if not cache.max_size:
+            return cls._parse_text(value)
+
+        entry = (cls, value)
+        key = cache.get(entry)
+        if key is not None:
+            return key
+
+        # Parse outside the lock, invalid keys raise and are never cached
+        return cache.put(entry, cls._parse_text(value))
+
+    @classmethod
+    def load_pem_many(cls, values: Iterable[Any]) -> list[Union['Ec384PublicKey', Exception]]:
+        """
+        Load many public keys at once.
+
+        Identical inputs are parsed only once. Parsing holds the GIL, so the
+        keys are parsed one after another in the calling thread.
+        :param values: The public keys in PEM format. Key objects are passed
+            through as they are.
+        :return: The key objects in input order. Inputs that cannot be parsed
+            get the exception _try_parse raised for them instead of a key.
+        """
+        values = list(values)
+        unique = list(dict.fromkeys(v for v in values if isinstance(v, str)))
+        parsed = dict(zip(unique, cls._parse_each(unique)))
+
+        return [
+            parsed[v] if isinstance(v, str) else cls._parse_each((v,))[0]
+            for v in values
+        ]
+
+    @classmethod
+    def _parse_each(cls, values: Iterable[Any]) -> list[Union['Ec384PublicKey', Exception]]:
+        results = []
+        for value in values:
+            try:
+                results.append(cls._try_parse(value))
+            except (TypeError, ValueError) as e:
+                results.append(e)
+
+        return results
+
+    @classmethod
+    def _parse_text(cls, value: str) -> 'Ec384PublicKey':
+        if value.lstrip().startswith('-----'):
+            try:
+                public_key = serialization.load_pem_public_key(
+                    value.encode()
+                )
+            except Exception as e:
+                raise ValueError('Invalid public key format.') from e
+
+            return cls(_check_public_key(public_key))
+
         try:
-            public_key = serialization.load_pem_public_key(
-                value.encode()
-            )
-        except Exception as e:
+            raw = base64.b64decode(value + '=' * (-len(value) % 4), altchars=b'-_', validate=True)
+        except (binascii.Error, ValueError) as e:
             raise ValueError('Invalid public key format.') from e
 
-        if not isinstance(public_key, ec.EllipticCurvePublicKey):
-            raise ValueError('The provided key is not an ECDSA public key.')
-
-        if not isinstance(public_key.curve, ec.SECP384R1):
-            raise ValueError('The ECDSA public key must use the NIST P-384 curve.')
+        try:
+            if raw[:1] == b'\x30':
+                public_key = serialization.load_der_public_key(raw)
+            elif raw[:1] in (b'\x02', b'\x03', b'\x04'):
+                public_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP384R1(), raw)
+            else:
+                raise ValueError('Unknown public key encoding.')
+        except Exception as e:
+            raise ValueError('Invalid public key format.') from e
 
-        return cls(public_key)
+        return cls(_check_public_key(public_key))
 
     @classmethod
-    def _try_serialise(cls, value: Any):
+    def _try_serialise(cls, value: Any, info: Optional[core_schema.SerializationInfo] = None):
         """
-        Serialize the ECDSA public key to PEM format.
+        Serialize the ECDSA public key, in the encoding selected by the
+        serialisation context.
         :param value: The ECDSA public key object.
-        :return: The public key in PEM format as a string.
+        :param info: The serialisation info, with the context to look up the
+            encoding in. PEM is used if it is not given.
+        :return: The encoded public key as a string.
         """
         if not isinstance(value, Ec384PublicKey):
             raise TypeError('Value must be an ECDSA public key.')
 
-        pem = value.public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
-        return pem.decode()
+        context = getattr(info, 'context', None)
+        encoding = context.get(KEY_ENCODING_CONTEXT) if isinstance(context, dict) else None
+        if encoding is not None:
+            return value.encode(encoding)
+
+        return value.pem
 
     @classmethod
     def __get_pydantic_core_schema__(cls, _, __):
@@ -140,28 +603,194 @@ class Ec384PublicKey(CryptoKey):
             core_schema.any_schema(),
             serialization=core_schema.plain_serializer_function_ser_schema(
                 cls._try_serialise,
+                info_arg=True,
                 when_used='json-unless-none',
             )
         )
 
 
+def _check_public_key(public_key: Any) -> ec.EllipticCurvePublicKey:
+    """
+    Check that a loaded public key is an ECDSA key on the NIST P-384 curve.
+    :param public_key: The loaded public key.
+    :return: The public key.
+    """
+    if not isinstance(public_key, ec.EllipticCurvePublicKey):
+        raise ValueError('The provided key is not an ECDSA public key.')
+
+    if not isinstance(public_key.curve, ec.SECP384R1):
+        raise ValueError('The ECDSA public key must use the NIST P-384 curve.')
+
+    return public_key
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+class LazyEc384PublicKey(Ec384PublicKey):
+    """
+    An Ec384PublicKey that defers parsing until the key is first used.
+
+    Validation checks the PEM envelope, and that it holds a P-384 key header
+    followed by an uncompressed point, the encoding Ec384PublicKey produces.
+    Nodes that store or forward keys without using them never load them into
+    OpenSSL. The point is parsed and checked on the first access to
+    public_key, which raises ValueError if it turns out to be invalid, and
+    such a key verifies no signature. It serialises back to the exact PEM
+    text it was created from, or to DER without parsing. Keys given in a
+    compact or any other encoding are parsed right away.
+
+    Equality and hashing use the DER bytes inside the envelope, which are
+    those of an Ec384PublicKey for the same key, as only the canonical
+    encoding is deferred.
+    """
+
+    __slots__ = ('_source',)
+
+    # The DER header of a P-384 key with an uncompressed point, and the full size
+    _DER_PREFIX = bytes.fromhex('3076301006072a8648ce3d020106052b8104002203620004')
+    _DER_SIZE = 120
+
+    def __init__(self, pem: str):
+        der = _pem_body(pem, 'PUBLIC KEY')
+        if len(der) != self._DER_SIZE or not der.startswith(self._DER_PREFIX):
+            raise ValueError('Lazily parsed keys must be canonically encoded P-384 keys.')
+
+        super().__init__(None)
+        self._source = pem
+        self._identity = der
+
+    @property
+    def parsed(self) -> bool:
+        """
+        Whether the key has been parsed yet.
+        :return: True if the key has been loaded into OpenSSL.
+        """
+        return self._public_key is not None
+
+    @property
+    def public_key(self) -> ec.EllipticCurvePublicKey:
+        """
+        The wrapped public key, parsed on first access.
+        :return: The public key object.
+        """
+        if self._public_key is None:
+            self._public_key = Ec384PublicKey._try_parse(self._source).public_key
+
+        return self._public_key
+
+    def _encode_identity(self) -> bytes:
+        return _pem_body(self._source, 'PUBLIC KEY')
+
+    def _encode_pem(self) -> str:
+        return self._source
+
+    @classmethod
+    def _try_parse(cls, value: Any) -> 'Ec384PublicKey':
+        """
+        Check that the provided value looks like a canonically encoded P-384
+        public key, without parsing it.
+        :param value: The public key in PEM format, or in a compact encoding.
+        :return: The lazily parsed public key object, a parsed one for other
+            encodings, or the value itself if it is already a public key object.
+        """
+        if isinstance(value, Ec384PublicKey):
+            return value
+
+        if not isinstance(value, str):
+            raise TypeError('Public key must be a string in PEM format.')
+
+        if not value.lstrip().startswith('-----'):
+            return Ec384PublicKey._try_parse(value)
+
+        try:
+            return cls(value)
+        except ValueError:
+            # Other encodings are parsed now, so lazy keys always carry canonical DER
+            return Ec384PublicKey._try_parse(value)
+
+
+def _pem_body(pem: str, label: str) -> bytes:
+    """
+    Decode the body of a PEM envelope, without parsing its contents.
+    :param pem: The PEM text.
+    :param label: The label expected on the BEGIN and END lines.
+    :return: The DER bytes inside the envelope.
+    """
+    lines = pem.strip().splitlines()
+    if len(lines) < 3 \
+            or lines[0].strip() != f'-----BEGIN {label}-----' \
+            or lines[-1].strip() != f'-----END {label}-----':
+        raise ValueError(f'Invalid {label.lower()} format.')
+
+    try:
+        der = binascii.a2b_base64(''.join(lines[1:-1]), strict_mode=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f'Invalid {label.lower()} format.') from e
+
+    # Every key is wrapped in a DER SEQUENCE
+    if not der or der[0] != 0x30:
+        raise ValueError(f'Invalid {label.lower()} format.')
+
+    return der
+
+
 class Ec384PrivateKey(CryptoKey):
     """
     A type representing an ECDSA private key using the NIST P-384 curve,
     """
 
-    __slots__ = ('private_key',)
+    __slots__ = ('_private_key',)
 
     def __init__(self, private_key: ec.EllipticCurvePrivateKey):
-        self.private_key = private_key
+        super().__init__()
+        self._private_key = private_key
 
-    def _identity_bytes(self) -> bytes:
-        return self.private_key.private_bytes(
+    @property
+    def private_key(self) -> ec.EllipticCurvePrivateKey:
+        """
+        The wrapped private key.
+        :return: The private key object.
+        """
+        return self._private_key
+
+    def _encode_identity(self) -> bytes:
+        return self._private_key.private_bytes(
             encoding=serialization.Encoding.DER,
             format=serialization.PrivateFormat.TraditionalOpenSSL,
             encryption_algorithm=serialization.NoEncryption()
         )
 
+    def _encode_pem(self) -> str:
+        return self._private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption()
+        ).decode()
+
+    def sign(self, data: bytes) -> bytes:
+        """
+        Sign data with ECDSA and SHA-384.
+        :param data: The data to sign.
+        :return: The DER encoded signature.
+        """
+        if not isinstance(data, bytes):
+            raise TypeError('Data must be bytes.')
+
+        return self._private_key.sign(data, ec.ECDSA(hashes.SHA384()))
+
+    def exchange(self, peer: Ec384PublicKey) -> bytes:
+        """
+        Compute the ECDH shared secret with a peer.
+        :param peer: The public key of the peer.
+        :return: The shared secret.
+        """
+        if not isinstance(peer, Ec384PublicKey):
+            raise TypeError('Peer must be an ECDSA public key.')
+
+        return self._private_key.exchange(ec.ECDH(), peer.public_key)
+
     @classmethod
     def _try_parse(cls, value: Any) -> 'Ec384PrivateKey':
         """
@@ -202,12 +831,7 @@ class Ec384PrivateKey(CryptoKey):
         if not isinstance(value, Ec384PrivateKey):
             raise TypeError('Value must be an ECDSA private key.')
 
-        pem = value.private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        return pem.decode()
+        return value.pem
 
     @classmethod
     def __get_pydantic_core_schema__(cls, _, __):
@@ -219,3 +843,7 @@ class Ec384PrivateKey(CryptoKey):
                 when_used='json-unless-none',
             )
         )
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=Ec384PublicKey._after_fork)  # pylint: disable=protected-access
@@ -2,10 +2,11 @@
 A message to synchronise the known nodes across other nodes in the network.
 """
 
-from typing import Literal
-from pydantic import Field, ConfigDict
+from typing import Literal, Any
+from pydantic import Field, ConfigDict, model_validator
 
 from dedi_link.etc.enums import MessageType
+from dedi_link.model.crypto_key import Ec384PublicKey
 from dedi_link.model.node import Node
 from ..network_message import NetworkMessage
 
@@ -30,3 +31,38 @@ class SyncNode(NetworkMessage):
         ...,
         description='The known nodes to be synchronized, including the current node.'
     )
+
+    @model_validator(mode='before')
+    @classmethod
+    def _load_public_keys(cls, data: Any) -> Any:
+        """
+        Parse the public keys of the node list in one bulk call, so keys
+        repeated across nodes are parsed once.
+
+        Keys that fail to parse are left as they are, so validating the node
+        reports the error at its usual location.
+        :param data: The raw message data.
+        :return: The data, with the parsed keys in place of their PEM text.
+        """
+        if not isinstance(data, dict) or not isinstance(data.get('nodes'), list):
+            return data
+
+        found = []
+        for i, node in enumerate(data['nodes']):
+            if not isinstance(node, dict):
+                continue
+            for field in ('publicKey', 'public_key'):
+                if isinstance(node.get(field), str):
+                    found.append((i, field))
+
+        if not found:
+            return data
+
+        keys = Ec384PublicKey.load_pem_many(data['nodes'][i][field] for i, field in found)
+
+        nodes = list(data['nodes'])
+        for (i, field), key in zip(found, keys):
+            if isinstance(key, Ec384PublicKey):
+                nodes[i] = {**nodes[i], field: key}
+
+        return {**data, 'nodes': nodes}
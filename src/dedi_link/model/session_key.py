@@ -0,0 +1,307 @@
+"""
+Symmetric session keys between pairs of nodes, for per-message authentication.
+"""
+
+import os
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from .crypto_key import Ec384PublicKey, Ec384PrivateKey
+
+
+_EPOCH = 8
+_NONCE = 12
+_KEY_SIZE = 32
+
+
+@dataclass(frozen=True, repr=False)
+class SessionKey:
+    """
+    The symmetric keys of a node with one peer for one epoch.
+
+    Each direction has its own keys: the send keys of one side are the receive
+    keys of the other, so a message cannot be reflected back to its sender.
+    """
+    epoch: int
+    send_mac_key: bytes
+    send_enc_key: bytes
+    receive_mac_key: bytes
+    receive_enc_key: bytes
+    expires_at: float
+
+    def mac(self, data: bytes) -> bytes:
+        """
+        Compute the HMAC-SHA256 tag of a message to the peer.
+        :param data: The message.
+        :return: The tag.
+        """
+        return hmac.new(self.send_mac_key, data, hashlib.sha256).digest()
+
+    def verify(self, data: bytes, tag: bytes) -> bool:
+        """
+        Check the HMAC-SHA256 tag of a message from the peer.
+        :param data: The message.
+        :param tag: The tag.
+        :return: True if the tag is valid for the message.
+        """
+        if not isinstance(tag, bytes):
+            return False
+
+        expected = hmac.new(self.receive_mac_key, data, hashlib.sha256).digest()
+        return hmac.compare_digest(tag, expected)
+
+    def seal(self, data: bytes, associated_data: bytes = b'') -> bytes:
+        """
+        Encrypt and authenticate a message to the peer with AES-256-GCM.
+        :param data: The message.
+        :param associated_data: Data authenticated along with the message, but
+            not encrypted.
+        :return: A random nonce followed by the ciphertext.
+        """
+        nonce = os.urandom(_NONCE)
+        return nonce + AESGCM(self.send_enc_key).encrypt(nonce, data, associated_data)
+
+    def open(self, token: bytes, associated_data: bytes = b'') -> bytes:
+        """
+        Decrypt and authenticate a message sealed by the peer.
+        :param token: The nonce followed by the ciphertext.
+        :param associated_data: The data authenticated along with the message.
+        :return: The message.
+        """
+        try:
+            return AESGCM(self.receive_enc_key).decrypt(
+                token[:_NONCE], token[_NONCE:], associated_data
+            )
+        except InvalidTag as e:
+            raise ValueError('Message authentication failed.') from e
+
+
+class SessionKeyCache:
+    """
+    Derive and cache the session keys of this node with its peers.
+
+    The keys with a peer come from ECDH between the node's private key and the
+    peer's public key, expanded with HKDF-SHA384 once for each direction, with
+    the sender and receiver keys in that order in the info. Time is split into epochs of
+    a fixed length, and the epoch number goes into the HKDF info, so both sides
+    rotate to a new key at the same time without exchanging any messages.
+    Messages carry the epoch they were protected in, and are accepted within a
+    grace period around the epoch, to allow for clock skew and messages in flight.
+
+    Only the asymmetric ECDH is expensive, and it runs once per peer and epoch.
+    Derived keys are kept for the most recently used peers, up to a fixed
+    number, and dropped once their epoch and grace period are over.
+    """
+
+    def __init__(self,
+                 private_key: Ec384PrivateKey,
+                 rotation_interval: float = 3600.0,
+                 grace: float = 60.0,
+                 max_sessions: int = 1024,
+                 clock: Callable[[], float] = time.time,
+                 ):
+        """
+        :param private_key: The private key of this node.
+        :param rotation_interval: The length of an epoch, in seconds.
+        :param grace: How many seconds before and after its epoch a key is
+            still accepted.
+        :param max_sessions: How many session keys to keep at most.
+        :param clock: The clock epochs are measured with, in seconds since the
+            epoch. Peers need reasonably synchronised clocks.
+        """
+        if not isinstance(private_key, Ec384PrivateKey):
+            raise TypeError('Private key must be an Ec384PrivateKey.')
+        if rotation_interval <= 0 or grace < 0 or grace >= rotation_interval:
+            raise ValueError('Rotation interval must be positive and longer than the grace period')
+        if not isinstance(max_sessions, int) or max_sessions < 1:
+            raise ValueError('Session capacity must be a positive integer')
+
+        self.rotation_interval = rotation_interval
+        self.grace = grace
+        self.max_sessions = max_sessions
+        self._private_key = private_key
+        self._public_key = Ec384PublicKey(private_key.private_key.public_key())
+        self._clock = clock
+        self._sessions: OrderedDict[tuple[bytes, int], SessionKey] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _epochs(self, now: float) -> range:
+        """
+        The epochs whose keys are accepted at a time.
+        :param now: The time.
+        :return: The range of accepted epochs.
+        """
+        first = int((now - self.grace) // self.rotation_interval)
+        last = int((now + self.grace) // self.rotation_interval)
+
+        return range(max(first, 0), last + 1)
+
+    def _derive(self, peer: Ec384PublicKey, epoch: int) -> SessionKey:
+        shared = self._private_key.exchange(peer)
+
+        def expand(sender: Ec384PublicKey, receiver: Ec384PublicKey) -> bytes:
+            return HKDF(
+                algorithm=hashes.SHA384(),
+                length=_KEY_SIZE * 2,
+                salt=None,
+                info=b'dedi-link session v1' + epoch.to_bytes(_EPOCH, 'big')
+                     + sender.identity + receiver.identity,
+            ).derive(shared)
+
+        send = expand(self._public_key, peer)
+        receive = expand(peer, self._public_key)
+
+        return SessionKey(
+            epoch=epoch,
+            send_mac_key=send[:_KEY_SIZE],
+            send_enc_key=send[_KEY_SIZE:],
+            receive_mac_key=receive[:_KEY_SIZE],
+            receive_enc_key=receive[_KEY_SIZE:],
+            expires_at=(epoch + 1) * self.rotation_interval + self.grace,
+        )
+
+    def get(self, peer: Any, epoch: Optional[int] = None) -> SessionKey:
+        """
+        Get the session key shared with a peer, deriving it on first use.
+        :param peer: The public key of the peer, as a key object or text.
+        :param epoch: The epoch of the key, defaults to the current one.
+        :return: The session key.
+        """
+        peer = Ec384PublicKey.parse(peer)
+        now = self._clock()
+        if epoch is None:
+            epoch = int(now // self.rotation_interval)
+
+        entry = (peer.identity, epoch)
+        with self._lock:
+            session = self._sessions.get(entry)
+            if session is not None:
+                self._sessions.move_to_end(entry)
+                return session
+
+        # Derive outside the lock, the result is the same whichever thread wins
+        session = self._derive(peer, epoch)
+
+        with self._lock:
+            session = self._sessions.setdefault(entry, session)
+            self._evict(now)
+
+        return session
+
+    def invalidate(self, peer: Any) -> int:
+        """
+        Drop every session key shared with a peer, for example when it leaves
+        the network.
+        :param peer: The public key of the peer, as a key object or text.
+        :return: How many keys were dropped.
+        """
+        identity = Ec384PublicKey.parse(peer).identity
+
+        with self._lock:
+            entries = [entry for entry in self._sessions if entry[0] == identity]
+            for entry in entries:
+                del self._sessions[entry]
+
+        return len(entries)
+
+    def purge(self) -> int:
+        """
+        Drop every session key whose epoch and grace period are over. This also
+        happens whenever a new key is derived.
+        :return: How many keys were dropped.
+        """
+        with self._lock:
+            count = len(self._sessions)
+            self._evict(self._clock())
+
+            return count - len(self._sessions)
+
+    def mac(self, peer: Any, data: bytes) -> bytes:
+        """
+        Authenticate a message for a peer with HMAC-SHA256.
+        :param peer: The public key of the peer.
+        :param data: The message.
+        :return: The epoch of the key, followed by the tag.
+        """
+        session = self.get(peer)
+        return session.epoch.to_bytes(_EPOCH, 'big') + session.mac(data)
+
+    def verify(self, peer: Any, data: bytes, tag: bytes) -> bool:
+        """
+        Check the HMAC tag of a message from a peer.
+        :param peer: The public key of the peer.
+        :param data: The message.
+        :param tag: The tag produced by mac on the peer.
+        :return: True if the tag is valid for the message, and was made with a
+            key that is still accepted.
+        """
+        session = self._accepted(peer, tag)
+        if session is None:
+            return False
+
+        return session.verify(data, tag[_EPOCH:])
+
+    def seal(self, peer: Any, data: bytes, associated_data: bytes = b'') -> bytes:
+        """
+        Encrypt and authenticate a message for a peer with AES-256-GCM.
+        :param peer: The public key of the peer.
+        :param data: The message.
+        :param associated_data: Data authenticated along with the message, but
+            not encrypted.
+        :return: The epoch of the key, followed by the nonce and ciphertext.
+        """
+        session = self.get(peer)
+        epoch = session.epoch.to_bytes(_EPOCH, 'big')
+
+        return epoch + session.seal(data, epoch + associated_data)
+
+    def open(self, peer: Any, token: bytes, associated_data: bytes = b'') -> bytes:
+        """
+        Decrypt and authenticate a message sealed by a peer.
+        :param peer: The public key of the peer.
+        :param token: The output of seal on the peer.
+        :param associated_data: The data authenticated along with the message.
+        :return: The message.
+        """
+        session = self._accepted(peer, token)
+        if session is None:
+            raise ValueError('Message authentication failed.')
+
+        return session.open(token[_EPOCH:], token[:_EPOCH] + associated_data)
+
+    def _accepted(self, peer: Any, token: bytes) -> Optional[SessionKey]:
+        """
+        Get the key a token was made with, if its epoch is still accepted.
+        :param peer: The public key of the peer.
+        :param token: The tag or sealed message, starting with the epoch.
+        :return: The session key, or None if the epoch is not accepted.
+        """
+        if not isinstance(token, bytes) or len(token) <= _EPOCH:
+            return None
+
+        epoch = int.from_bytes(token[:_EPOCH], 'big')
+        if epoch not in self._epochs(self._clock()):
+            return None
+
+        return self.get(peer, epoch)
+
+    def _evict(self, now: float):
+        expired = [entry for entry, session in self._sessions.items() if session.expires_at <= now]
+        for entry in expired:
+            del self._sessions[entry]
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
@@ -1,4 +1,19 @@
-from dedi_link.etc.libpow import PowDriver
+import json
+import hashlib
+import threading
+import asyncio
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from cffi import FFI
+
+from dedi_link.etc.enums import PowKernel, PowExecutorKind, PowVersion
+from dedi_link.etc.libpow import PowDriver, PowControl, PowStoppedError, PowLibraryError
+from dedi_link.etc.libpow import PowRangeResult
+from dedi_link.etc.libpow import ChallengeManager, SignedChallengeManager, native
+from dedi_link.etc.libpow import DifficultyController, calibrated_hash_rate
+from dedi_link.etc.libpow import benchmark
+from dedi_link.etc.libpow.plan import choose_strategy
+from dedi_link.etc.libpow.search import python_search, python_solve, python_solve_shard
 
 
 class TestPowDriver:
@@ -16,7 +31,7 @@ class TestPowDriver:
         difficulty = 22
 
         driver = PowDriver()
-        solution = driver._python_solve(nonce, difficulty)
+        solution = python_solve(nonce, difficulty)
 
         assert solution == 9642966
 
@@ -28,6 +43,11 @@ class TestPowDriver:
         solution = driver.solve(nonce, difficulty)
 
         assert solution == 9642966
+        assert driver.solve(nonce, difficulty, native=True) == 9642966
+        assert driver.solve(nonce, 16, native=False) == 47634
+        for version in PowVersion:
+            assert driver.solve(nonce, 12, version=version, native=True) == \
+                driver.solve(nonce, 12, version=version, native=False)
 
     def test_validate(self):
         nonce = 'dfe041b4f60cb54d082e542b109e392a'
@@ -47,3 +67,995 @@ class TestPowDriver:
         solution = await driver.solve_async(nonce, difficulty)
 
         assert solution == 9642966
+
+    def test_c_solve_threads(self):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 22
+
+        driver = PowDriver(threads=4)
+        solution = driver._c_solve(nonce, difficulty)
+
+        assert solution == 9642966
+
+    def test_c_solve_threads_lowest_counter(self):
+        difficulty = 12
+
+        single = PowDriver(threads=1)
+        multi = PowDriver(threads=8)
+
+        for i in range(8):
+            nonce = f'{i:032x}'
+            assert multi._c_solve(nonce, difficulty) == single._c_solve(nonce, difficulty)
+
+    def test_invalid_threads(self):
+        with pytest.raises(ValueError):
+            PowDriver(threads=0)
+
+    @pytest.mark.parametrize('length', [0, 1, 32, 54, 55, 56, 63, 64, 65, 119, 128, 200])
+    def test_c_solve_nonce_lengths(self, length):
+        nonce = ('dfe041b4f60cb54d082e542b109e392a' * 7)[:length]
+        difficulty = 10
+
+        driver = PowDriver(threads=1)
+
+        assert driver._c_solve(nonce, difficulty) == python_solve(nonce, difficulty)
+
+    def test_native_hash_rate(self):
+        driver = PowDriver(threads=1)
+
+        for kernel in [PowKernel.LEGACY] + driver.native_kernels():
+            assert driver.native_hash_rate(kernel, 1000) > 0
+
+        assert driver.native_hash_rate() > 0
+
+    def test_native_kernels(self):
+        driver = PowDriver(threads=1)
+        kernels = driver.native_kernels()
+
+        assert PowKernel.MIDSTATE in kernels
+        assert PowKernel.LEGACY not in kernels
+        assert driver.native_kernel in kernels
+
+        with pytest.raises(ValueError):
+            driver.select_native_kernel(PowKernel.LEGACY)
+
+    @pytest.mark.parametrize('length', [32, 50, 70])
+    def test_native_kernels_solve(self, length):
+        nonce = ('dfe041b4f60cb54d082e542b109e392a' * 3)[:length]
+        driver = PowDriver(threads=2)
+
+        try:
+            for kernel in driver.native_kernels():
+                assert driver.select_native_kernel(kernel) == kernel
+                assert driver.native_kernel == kernel
+
+                for difficulty in (4, 8, 12):
+                    solution = driver._c_solve(nonce, difficulty)
+
+                    assert driver.validate(nonce, difficulty, solution)
+                    assert solution == python_solve(nonce, difficulty)
+
+                # Searches starting just before a digit count change
+                result = driver._c_solve_range(nonce, 8, 99990, 30000)
+                assert result.solution == python_search(nonce, 8, 99990, 129990)
+        finally:
+            driver.select_native_kernel(None)
+
+    @pytest.mark.parametrize('start, stop', [(0, 20000), (1500, 1700), (1500, 9300), (2000, 2500)])
+    def test_python_search_range(self, start, stop):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 8
+
+        expected = next(
+            (c for c in range(start, stop) if PowDriver.validate(nonce, difficulty, c)),
+            None,
+        )
+
+        assert python_search(nonce, difficulty, start, stop) == expected
+
+    @pytest.mark.parametrize('start, stop', [(0, 20000), (250, 300), (65500, 66000)])
+    def test_python_search_binary(self, start, stop):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 8
+        target = b'\x00' + b'\xff' * 31
+
+        expected = next(
+            (
+                c for c in range(start, stop)
+                if hashlib.sha256(nonce.encode() + c.to_bytes(8, 'big')).digest() <= target
+            ),
+            None,
+        )
+
+        assert python_search(
+            nonce, difficulty, start, stop, version=PowVersion.V2
+        ) == expected
+
+    @pytest.mark.parametrize('length', [32, 50, 70])
+    def test_solve_binary(self, length):
+        driver = PowDriver(threads=2)
+        nonce = ('dfe041b4f60cb54d082e542b109e392a' * 3)[:length]
+
+        for difficulty in (4, 8, 12):
+            solution = driver.solve(nonce, difficulty, version=PowVersion.V2)
+
+            assert solution == python_solve(nonce, difficulty, version=PowVersion.V2)
+            assert driver.validate(nonce, difficulty, solution, PowVersion.V2)
+            assert driver.validate_many(
+                [(nonce, difficulty, solution)], PowVersion.V2
+            ) == [True]
+
+        for kernel in driver.native_kernels():
+            driver.select_native_kernel(kernel)
+            try:
+                for start in (0, 250, 0xFFFFFFF0, (1 << 64) - 20_001):
+                    result = driver.solve_range(nonce, 8, start, 20_000, version=PowVersion.V2)
+                    assert result.solution == python_search(
+                        nonce, 8, start, start + 20_000, version=PowVersion.V2
+                    )
+            finally:
+                driver.select_native_kernel(None)
+
+    def test_validate_binary(self):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        solution = python_solve(nonce, 12, version=PowVersion.V2)
+
+        assert PowDriver.validate(nonce, 12, solution, PowVersion.V2) is True
+        assert PowDriver.validate(nonce, 256, solution, PowVersion.V2) is False
+        assert PowDriver.validate(nonce, 12, -1, PowVersion.V2) is False
+        assert PowDriver.validate(nonce, 12, 1 << 64, PowVersion.V2) is False
+        assert PowDriver.validate(nonce, 12, '1', PowVersion.V2) is False
+        assert PowDriver.validate(nonce, 12, True, PowVersion.V2) is False
+        assert PowDriver.validate(nonce.encode(), 12, solution, PowVersion.V2) is False
+        assert PowDriver.validate(None, 12, solution, PowVersion.V2) is False
+        assert PowDriver().validate_many(
+            [(nonce, 8, c) for c in range(1000)], PowVersion.V2
+        ) == [
+            python_search(nonce, 8, c, c + 1, version=PowVersion.V2) == c
+            for c in range(1000)
+        ]
+
+    async def test_solve_async_plans_off_loop(self, monkeypatch):
+        loop_thread = threading.get_ident()
+        plan_threads = []
+        plan = PowDriver.plan
+
+        def recording_plan(self, difficulty):
+            plan_threads.append(threading.get_ident())
+            return plan(self, difficulty)
+
+        monkeypatch.setattr(PowDriver, 'plan', recording_plan)
+        monkeypatch.setattr(PowDriver, '_hash_rates', {})
+        driver = PowDriver()
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+
+        # Calibrating happens in the first plan, away from the event loop
+        assert await driver.solve_async(nonce, 8) == python_solve(nonce, 8)
+        assert plan_threads[0] != loop_thread
+
+        # Once calibrated, planning is cheap and stays on the loop
+        await driver.solve_async(nonce, 8)
+        assert plan_threads[1] == loop_thread
+
+    async def test_solve_async_binary(self):
+        driver = PowDriver()
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+
+        solution = await driver.solve_async(nonce, 12, version=PowVersion.V2)
+
+        assert solution == python_solve(nonce, 12, version=PowVersion.V2)
+
+    def test_validate_paths(self, monkeypatch):
+        # Until a validator is selected, validating never touches the native library
+        monkeypatch.setattr(PowDriver, '_validators', {})
+        monkeypatch.setattr(PowDriver, '_native_validate', classmethod(lambda cls, version: 1 / 0))
+        assert PowDriver.validate('dfe041b4f60cb54d082e542b109e392a', 22, 9642966) is True
+        assert PowDriver._validators == {}
+        monkeypatch.undo()
+
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        for version in PowVersion:
+            native = PowDriver.validation_path(True, version)
+            assert native is not None
+            validator = PowDriver.select_validator(version)
+            assert PowDriver._validators[version] is validator
+            python = PowDriver.validation_path(False, version)
+
+            solution = python_solve(nonce, 12, version=version)
+            for check in (native, validator, python):
+                assert check(nonce, 12, solution) is True
+                assert check('nul\0nonce', 4, 3) == python('nul\0nonce', 4, 3)
+                assert [check(nonce, 8, c) for c in range(1000)] == [
+                    python(nonce, 8, c) for c in range(1000)
+                ]
+                assert [check(nonce, 8, c) for c in range(1000)] == [
+                    PowDriver.validate(nonce, 8, c, version) for c in range(1000)
+                ]
+
+    def test_validate_invalid(self):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+
+        assert PowDriver.validate(nonce, 22, 9642965) is False
+        assert PowDriver.validate(nonce, 257, 9642966) is False
+        assert PowDriver.validate(nonce, 0, 9642965) is True
+
+    def test_validate_many(self, monkeypatch):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        challenges = [
+            (nonce, 22, 9642966),
+            (nonce, 22, 9642965),
+            (nonce, 0, 1),
+            (nonce, 300, 9642966),
+            (nonce, 22, -1),
+            (nonce, 22, 1 << 64),
+            ('nonce\0with-nul', 1, 0),
+        ]
+
+        malformed = [
+            (nonce, 22, 9642966, 3),
+            (nonce, 22),
+            None,
+            nonce,
+            (nonce, '22', 9642966),
+            (nonce, 22, '9642966'),
+            (nonce, 22, True),
+            (b'nonce', 22, 9642966),
+        ]
+
+        driver = PowDriver()
+        results = driver.validate_many(challenges + malformed)
+
+        assert results[:len(challenges)] == [driver.validate(*challenge) for challenge in challenges]
+        assert results[:4] == [True, False, True, False]
+        # Malformed items are invalid, never truncated into a valid challenge
+        assert results[len(challenges):] == [False] * len(malformed)
+        assert driver.validate_many([(nonce, 22, 9642966, 3), (nonce, 22, 9642966)]) == [False, True]
+        assert driver.validate_many([(nonce, 22, 9642966, 3)]) == [False]
+        assert driver.validate_many(malformed, PowVersion.V2) == [False] * len(malformed)
+
+        monkeypatch.setattr(PowDriver, 'uses_native', property(lambda self: False))
+        assert driver.validate_many(challenges + malformed) == results
+
+    def test_validate_many_large_batch(self):
+        difficulty = 4
+        challenges = [(f'{i:032x}', difficulty, i % 50) for i in range(2000)]
+
+        driver = PowDriver(threads=4)
+        results = driver.validate_many(challenges)
+
+        assert results == [driver.validate(*challenge) for challenge in challenges]
+        assert any(results) and not all(results)
+
+    @pytest.mark.parametrize('kind', list(PowExecutorKind))
+    async def test_solve_async_executor_kind(self, kind):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 12
+
+        PowDriver.configure_executor(kind, max_workers=2)
+        try:
+            driver = PowDriver()
+            solution = await driver.solve_async(nonce, difficulty)
+
+            assert solution == driver.solve(nonce, difficulty)
+            if kind == PowExecutorKind.AUTO:
+                assert driver.last_plan.strategy == PowExecutorKind.INLINE
+            else:
+                assert driver.last_plan.strategy == kind
+            assert set(PowDriver._executors) == (
+                {kind} if kind in (PowExecutorKind.PROCESS, PowExecutorKind.THREAD) else set()
+            )
+        finally:
+            PowDriver.configure_executor()
+
+    async def test_shutdown(self):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 12
+
+        PowDriver.configure_executor(PowExecutorKind.PROCESS)
+        try:
+            with PowDriver() as driver:
+                await driver.solve_async(nonce, difficulty)
+                assert PowDriver._executors
+
+            assert not PowDriver._executors
+
+            # A new executor is created on demand after a shutdown
+            solution = await driver.solve_async(nonce, difficulty)
+            assert driver.validate(nonce, difficulty, solution)
+        finally:
+            PowDriver.configure_executor()
+
+    def test_configure_executor_invalid(self):
+        with pytest.raises(TypeError):
+            PowDriver.configure_executor('process')
+
+        with pytest.raises(ValueError):
+            PowDriver.configure_executor(PowExecutorKind.THREAD, max_workers=0)
+
+    @pytest.mark.parametrize('kind', [PowExecutorKind.PROCESS, PowExecutorKind.THREAD])
+    async def test_solve_async_timeout(self, kind):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 64
+
+        PowDriver.configure_executor(kind, max_workers=1)
+        try:
+            driver = PowDriver(threads=1)
+            with pytest.raises(TimeoutError):
+                await driver.solve_async(nonce, difficulty, timeout=0.3)
+
+            # The single worker has been released by the stop flag
+            solution = await asyncio.wait_for(driver.solve_async(nonce, 8), timeout=5)
+            assert driver.validate(nonce, 8, solution)
+        finally:
+            PowDriver.configure_executor()
+
+    async def test_solve_async_cancel(self):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 64
+
+        PowDriver.configure_executor(PowExecutorKind.THREAD, max_workers=1)
+        try:
+            driver = PowDriver(threads=1)
+            task = asyncio.create_task(driver.solve_async(nonce, difficulty))
+            await asyncio.sleep(0.2)
+            task.cancel()
+
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            solution = await asyncio.wait_for(driver.solve_async(nonce, 8), timeout=5)
+            assert driver.validate(nonce, 8, solution)
+        finally:
+            PowDriver.configure_executor()
+
+    async def test_solve_async_progress(self):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 22
+        reports = []
+
+        driver = PowDriver(threads=1)
+        solution = await driver.solve_async(nonce, difficulty, progress=reports.append)
+
+        assert solution == 9642966
+        assert reports == sorted(reports)
+        assert reports[-1] == solution + 1
+
+    def test_python_solve_shards(self):
+        nonce = 'dfe041b4f60cb54d082e542b109e392a'
+        difficulty = 16
+
+        # Shards running one after another, the last one to run holds the solution
+        with PowControl(slots=4) as control:
+            results = [
+                python_solve_shard(nonce, difficulty, control, shard)
+                for shard in reversed(range(control.slots))
+            ]
+
+            assert min(r for r in results if r is not None) == 47634
+            assert control.solution == 47634
+
+    async def test_solve_async_sharded(self, monkeypatch):
+        difficulty = 16
+        reports = []
+
+        monkeypatch.setattr(PowDriver, 'uses_native', property(lambda self: False))
+        PowDriver.configure_executor(PowExecutorKind.PROCESS, max_workers=3)
+        try:
+            driver = PowDriver()
+            for i in range(3):
+                nonce = f'{i:032x}'
+                solution = await driver.solve_async(nonce, difficulty, progress=reports.append)
+
+                assert driver.last_plan.native is False
+                assert solution == python_solve(nonce, difficulty)
+                assert reports[-1] > solution
+
+            with pytest.raises(TimeoutError):
+                await driver.solve_async(nonce, 64, timeout=0.3)
+
+            # Every worker has been released by the stop flag
+            solution = await asyncio.wait_for(driver.solve_async(nonce, 8), timeout=5)
+            assert driver.validate(nonce, 8, solution)
+
+            solution = await driver.solve_async(nonce, difficulty, version=PowVersion.V2)
+            assert driver.last_plan.native is False
+            assert solution == python_solve(nonce, difficulty, version=PowVersion.V2)
+        finally:
+            PowDriver.configure_executor()
+
+    def test_control_solution(self):
+        with PowControl(slots=3) as control:
+            assert control.solution is None
+
+            control.record_solution(1 << 63, 2)
+            control.record_solution(0, 1)
+
+            assert control.solution == 0
+            assert control.tried == 0
+
+    def test_python_solve_stopped(self):
+        control = PowControl()
+        control.stop()
+
+        with control, pytest.raises(PowStoppedError):
+            python_solve('dfe041b4f60cb54d082e542b109e392a', 64, control)
+
+    def test_plan(self):
+        driver = PowDriver(threads=2)
+
+        plan = driver.plan(4)
+        assert plan.strategy == PowExecutorKind.INLINE
+        assert plan.expected_hashes == 16
+        assert plan.native is True
+        assert plan.hash_rate == PowDriver._hash_rates[True] * 2
+
+        plan = driver.plan(40)
+        assert plan.strategy == PowExecutorKind.THREAD
+        assert plan.expected_seconds > 1
+
+    def test_plan_configured_kind(self):
+        PowDriver.configure_executor(PowExecutorKind.PROCESS)
+        try:
+            assert PowDriver().plan(4).strategy == PowExecutorKind.PROCESS
+        finally:
+            PowDriver.configure_executor()
+
+
+class TestChooseStrategy:
+    def test_inline(self):
+        plan = choose_strategy(10, native=False, hash_rate=1e6)
+
+        assert plan.strategy == PowExecutorKind.INLINE
+        assert plan.expected_seconds == pytest.approx(1024 / 1e6)
+
+    def test_native(self):
+        plan = choose_strategy(24, native=True, hash_rate=1e7)
+
+        assert plan.strategy == PowExecutorKind.THREAD
+
+    def test_python(self):
+        plan = choose_strategy(24, native=False, hash_rate=1e6)
+
+        assert plan.strategy == PowExecutorKind.PROCESS
+
+
+class TestSolveRange:
+    nonce = 'dfe041b4f60cb54d082e542b109e392a'
+
+    def test_found(self):
+        driver = PowDriver(threads=1)
+        result = driver.solve_range(self.nonce, 22, 9_000_000, 1_000_000)
+
+        assert result.solution == 9642966
+        assert result.tried == 9642966 - 9_000_000 + 1
+
+    def test_not_found(self):
+        driver = PowDriver(threads=4)
+        result = driver.solve_range(self.nonce, 22, 0, 100_000)
+
+        assert result.solution is None
+        assert result.tried == 100_000
+
+    def test_resume(self):
+        driver = PowDriver(threads=2)
+        start = 0
+        count = 3000
+
+        while (result := driver.solve_range(self.nonce, 14, start, count)).solution is None:
+            start += count
+
+        assert result.solution == driver.solve(self.nonce, 14)
+
+    def test_top_of_counter_space(self):
+        driver = PowDriver(threads=2)
+        start = (1 << 64) - 20_001
+        result = driver.solve_range(self.nonce, 4, start, 20_000)
+
+        assert result.solution is not None
+        assert result.solution >= start
+        assert driver.validate(self.nonce, 4, result.solution)
+        assert result.solution == python_search(self.nonce, 4, start, start + 20_000)
+
+    @pytest.mark.parametrize('version', list(PowVersion))
+    def test_last_counter(self, version, monkeypatch):
+        last = (1 << 64) - 1
+        nonces = [f'{i:032x}' for i in range(100)]
+        # A nonce for which the very last counter is a solution, and one for which it is not
+        nonce = next(n for n in nonces if PowDriver.validate(n, 1, last, version))
+        other = next(n for n in nonces if not PowDriver.validate(n, 1, last, version))
+        driver = PowDriver(threads=2)
+
+        for uses_native in (True, False):
+            monkeypatch.setattr(PowDriver, 'uses_native', property(lambda self, n=uses_native: n))
+            assert driver.solve_range(nonce, 1, last, 1, version=version) == PowRangeResult(last, 1)
+            result = driver.solve_range(nonce, 1, last - 1, 2, version=version)
+            assert result.solution is not None
+            assert driver.solve_range(other, 1, last, 1, version=version) == PowRangeResult(None, 1)
+
+    def test_invalid_range(self):
+        driver = PowDriver()
+
+        with pytest.raises(ValueError):
+            driver.solve_range(self.nonce, 8, -1, 10)
+
+        with pytest.raises(ValueError):
+            driver.solve_range(self.nonce, 8, 1 << 64, 10)
+
+        with pytest.raises(ValueError):
+            driver.solve_range(self.nonce, 8, 0, 1 << 64)
+
+        with pytest.raises(ValueError):
+            driver.solve_range(self.nonce, 8, 2, (1 << 64) - 1)
+
+        for start, count in ((0.0, 10), (0, 10.0), (True, 10), (0, None), ('0', 10)):
+            with pytest.raises(TypeError):
+                driver.solve_range(self.nonce, 8, start, count)
+
+    def test_stopped(self):
+        driver = PowDriver(threads=2)
+
+        with PowControl() as control:
+            control.stop()
+            with pytest.raises(PowStoppedError):
+                driver.solve_range(self.nonce, 64, 0, 1 << 40, control=control)
+
+
+class TestNativeBuild:
+    nonce = 'dfe041b4f60cb54d082e542b109e392a'
+
+    @pytest.fixture
+    def unloaded(self, monkeypatch, tmp_path):
+        monkeypatch.setenv(native.CACHE_ENV, str(tmp_path))
+        monkeypatch.setattr(PowDriver, '_lib', None)
+        monkeypatch.setattr(PowDriver, '_lib_error', None)
+
+        def no_prebuilt():
+            raise PowLibraryError('No prebuilt library')
+
+        monkeypatch.setattr(PowDriver, '_load_prebuilt', staticmethod(no_prebuilt))
+
+    def test_build_native(self, monkeypatch, tmp_path):
+        monkeypatch.setenv(native.CACHE_ENV, str(tmp_path))
+
+        path = native.build_native()
+        assert path.parent == tmp_path / 'libpow'
+
+        modified = path.stat().st_mtime_ns
+        assert native.build_native() == path
+        assert path.stat().st_mtime_ns == modified
+
+        lib, lib_ffi = native.load_built(path)
+        res_ptr = lib_ffi.new('unsigned long long *')
+        assert lib.solve_pow(self.nonce.encode(), 16, res_ptr) == 0
+        assert res_ptr[0] == 47634
+
+    def test_build_fallback(self, unloaded):
+        driver = PowDriver(threads=2)
+
+        assert driver._c_solve(self.nonce, 16) == 47634
+        assert PowDriver._lib_error is None
+
+    def test_stale_prebuilt(self, unloaded, monkeypatch):
+        class StaleLib:
+            # A library from before the current exports, which still solves
+            @staticmethod
+            def solve_pow(nonce, difficulty, res_ptr):
+                res_ptr[0] = 559
+                return 0
+
+        lib_ffi = FFI()
+        lib_ffi.cdef(native.CDEF)
+        with pytest.raises(PowLibraryError, match='check_pow'):
+            native.probe(StaleLib(), lib_ffi)
+
+        def stale_prebuilt():
+            native.probe(StaleLib(), lib_ffi)
+
+        monkeypatch.setattr(PowDriver, '_load_prebuilt', staticmethod(stale_prebuilt))
+        driver = PowDriver(threads=2)
+
+        # The stale library is rejected, and the one built from source has everything
+        assert all(hasattr(driver.lib, name) for name in native.EXPORTS)
+        assert driver.validate_many([(self.nonce, 16, 47634)]) == [True]
+
+    def test_build_retry(self, unloaded, monkeypatch):
+        builds = []
+        build_native = native.build_native
+
+        def counting_build(force=False):
+            builds.append(force)
+            return build_native(force)
+
+        monkeypatch.setattr(native, 'build_native', counting_build)
+
+        # A broken cached library is rebuilt once
+        path = build_native()
+        path.write_bytes(b'truncated')
+        native.load_or_build()
+        assert builds == [True]
+
+        # A fresh build that fails is not retried
+        builds.clear()
+        path.unlink()
+
+        def failing_builder(module_name, source):
+            raise OSError('no compiler')
+
+        monkeypatch.setattr(native, '_builder', failing_builder)
+        with pytest.raises(PowLibraryError):
+            native.load_or_build()
+        assert builds == [False]
+
+    def test_build_disabled(self, unloaded, monkeypatch):
+        monkeypatch.setenv(native.BUILD_ENV, 'never')
+        driver = PowDriver()
+
+        with pytest.raises(PowLibraryError):
+            _ = driver.lib
+        assert PowDriver._lib_error is not None
+
+        # Both the original error type and the fallback trigger are kept
+        with pytest.raises(RuntimeError):
+            _ = driver.lib
+        assert driver.solve(self.nonce, 16) == 47634
+        with pytest.raises(PowLibraryError):
+            driver.solve(self.nonce, 16, native=True)
+        assert PowDriver.validation_path(True) is None
+
+
+class TestChallengeManager:
+    class Clock:
+        def __init__(self):
+            self.now = 0.0
+
+        def __call__(self) -> float:
+            return self.now
+
+    def test_issue_consume(self):
+        manager = ChallengeManager(difficulty=8)
+        challenge = manager.issue()
+
+        assert len(challenge.nonce) == 32
+        assert challenge.difficulty == 8
+        assert challenge.nonce in manager
+
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+
+        assert manager.consume(challenge.nonce, solution) is True
+        assert challenge.nonce not in manager
+
+    def test_binary_counter(self):
+        manager = ChallengeManager(difficulty=12)
+        assert manager.issue().version == PowVersion.V1
+
+        challenge = manager.issue(version=PowVersion.V2)
+        assert challenge.version == PowVersion.V2
+
+        v1 = PowDriver().solve(challenge.nonce, challenge.difficulty)
+        v2 = PowDriver().solve(challenge.nonce, challenge.difficulty, version=PowVersion.V2)
+        if v1 != v2:
+            assert manager.consume(challenge.nonce, v1) is False
+        assert manager.consume(challenge.nonce, v2) is True
+
+        manager = ChallengeManager(version=PowVersion.V2)
+        assert manager.issue().version == PowVersion.V2
+
+    def test_replay(self):
+        manager = ChallengeManager(difficulty=8)
+        challenge = manager.issue()
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+
+        assert manager.consume(challenge.nonce, solution) is True
+        assert manager.consume(challenge.nonce, solution) is False
+
+    def test_wrong_solution(self):
+        manager = ChallengeManager(difficulty=8)
+        challenge = manager.issue()
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+        wrong = next(c for c in range(1000) if not PowDriver.validate(challenge.nonce, 8, c))
+
+        assert manager.consume(challenge.nonce, wrong) is False
+        assert manager.consume('unknown', solution) is False
+        assert manager.consume(challenge.nonce, solution) is True
+
+    def test_expiry(self):
+        clock = self.Clock()
+        manager = ChallengeManager(difficulty=4, ttl=10, clock=clock)
+        challenge = manager.issue()
+        short = manager.issue(ttl=1)
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+
+        clock.now = 5
+        assert short.nonce not in manager
+        assert len(manager) == 1
+
+        clock.now = 10
+        assert manager.consume(challenge.nonce, solution) is False
+        assert len(manager) == 0
+
+    def test_purge(self):
+        clock = self.Clock()
+        manager = ChallengeManager(ttl=10, clock=clock)
+        manager.issue(ttl=20)
+        for _ in range(5):
+            manager.issue()
+
+        clock.now = 15
+        assert len(manager) == 6
+        assert manager.purge() == 5
+        assert len(manager) == 1
+
+    def test_capacity(self):
+        manager = ChallengeManager(max_challenges=3)
+        challenges = [manager.issue() for _ in range(5)]
+
+        assert len(manager) == 3
+        assert [c.nonce in manager for c in challenges] == [False, False, True, True, True]
+
+    def test_revoke(self):
+        manager = ChallengeManager()
+        challenge = manager.issue()
+
+        assert manager.revoke(challenge.nonce) is True
+        assert manager.revoke(challenge.nonce) is False
+        assert manager.get(challenge.nonce) is None
+
+    def test_concurrent_consume(self):
+        manager = ChallengeManager(difficulty=8)
+        challenge = manager.issue()
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda _: manager.consume(challenge.nonce, solution),
+                range(32),
+            ))
+
+        assert results.count(True) == 1
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            ChallengeManager(difficulty=0)
+        with pytest.raises(ValueError):
+            ChallengeManager(ttl=0)
+        with pytest.raises(ValueError):
+            ChallengeManager(max_challenges=0)
+        with pytest.raises(ValueError):
+            ChallengeManager().issue(difficulty=300)
+
+
+class TestSignedChallengeManager:
+    key = b'0123456789abcdef0123456789abcdef'
+
+    def test_issue_consume(self):
+        issuer = SignedChallengeManager(self.key, difficulty=8)
+        # Another gateway sharing the key, without any shared state
+        verifier = SignedChallengeManager(self.key)
+
+        challenge = issuer.issue()
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+
+        assert verifier.get(challenge.nonce) == challenge
+        assert verifier.consume(challenge.nonce, solution) is True
+        assert verifier.consume(challenge.nonce, solution) is False
+
+    def test_binary_counter(self):
+        issuer = SignedChallengeManager(self.key, difficulty=8)
+        verifier = SignedChallengeManager(self.key)
+
+        assert issuer.issue().nonce.startswith('v1.')
+
+        challenge = issuer.issue(version=PowVersion.V2)
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty, version=PowVersion.V2)
+
+        assert challenge.nonce.startswith('v2.')
+        assert verifier.get(challenge.nonce) == challenge
+        assert verifier.consume(challenge.nonce, solution) is True
+
+        # The version is covered by the tag
+        payload = challenge.nonce.split('.', 1)[1]
+        assert verifier.get(f'v1.{payload}') is None
+        assert verifier.get(f'v3.{payload}') is None
+
+    def test_tampered(self):
+        issuer = SignedChallengeManager(self.key, difficulty=8)
+        challenge = issuer.issue()
+        version, difficulty, expires_at, random, tag = challenge.nonce.split('.')
+
+        tampered = [
+            '.'.join((version, '1', expires_at, random, tag)),
+            '.'.join((version, difficulty, str(int(expires_at) + 3600), random, tag)),
+            '.'.join((version, difficulty, expires_at, random, tag[::-1])),
+            '.'.join((version, difficulty, expires_at, random)),
+            '.'.join((version, difficulty, expires_at, random, tag[:-1] + '\u00e9')),
+            '.'.join((version, difficulty, expires_at, random, tag + '0')),
+            '.'.join((version, difficulty, expires_at, random, tag.upper())),
+            '.'.join((version, difficulty, expires_at, random, '\u00e9' * 32)),
+            'not a challenge',
+        ]
+        for nonce in tampered:
+            solution = PowDriver().solve(nonce, 1)
+            assert issuer.get(nonce) is None
+            assert issuer.consume(nonce, solution) is False
+
+        other = SignedChallengeManager(b'fedcba9876543210fedcba9876543210')
+        assert other.get(challenge.nonce) is None
+
+    def test_expiry(self):
+        clock = TestChallengeManager.Clock()
+        clock.now = 1000.0
+        manager = SignedChallengeManager(self.key, difficulty=4, ttl=10, clock=clock)
+        challenge = manager.issue()
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+
+        assert challenge.expires_at == 1010
+        clock.now = 1010
+        assert manager.consume(challenge.nonce, solution) is False
+
+    def test_key_rotation(self):
+        old = SignedChallengeManager(self.key, difficulty=4)
+        challenge = old.issue()
+        solution = PowDriver().solve(challenge.nonce, challenge.difficulty)
+
+        new_key = b'fedcba9876543210fedcba9876543210'
+        rotated = SignedChallengeManager(new_key, old_keys=[self.key])
+
+        assert rotated.consume(challenge.nonce, solution) is True
+        assert SignedChallengeManager(new_key).get(rotated.issue().nonce) is not None
+
+    def test_replay_filter_bounded(self):
+        manager = SignedChallengeManager(self.key, difficulty=1, max_redeemed=2)
+        driver = PowDriver()
+
+        for _ in range(5):
+            challenge = manager.issue()
+            assert manager.consume(challenge.nonce, driver.solve(challenge.nonce, 1))
+
+        assert len(manager._redeemed) == 2
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            SignedChallengeManager(b'short')
+        with pytest.raises(ValueError):
+            SignedChallengeManager(self.key, old_keys=['not bytes'])
+        with pytest.raises(ValueError):
+            SignedChallengeManager(self.key, max_redeemed=0)
+
+
+class TestDifficultyController:
+    def test_calibrated_hash_rate(self, monkeypatch, tmp_path):
+        path = tmp_path / 'calibration.json'
+        driver = PowDriver()
+
+        monkeypatch.setattr(PowDriver, '_hash_rates', {})
+        rate = calibrated_hash_rate(driver, native=False, path=path)
+        assert rate > 0
+        assert path.exists()
+
+        # A new process starts from the file instead of measuring again
+        def measure_hash_rate(native):
+            raise AssertionError('Calibrated again')
+
+        monkeypatch.setattr(PowDriver, '_hash_rates', {})
+        monkeypatch.setattr(driver, 'measure_hash_rate', measure_hash_rate)
+        assert calibrated_hash_rate(driver, native=False, path=path) == rate
+        assert driver.hash_rate(False) == rate
+
+    def test_calibrated_hash_rate_unwritable(self, monkeypatch, tmp_path):
+        path = tmp_path / 'file'
+        path.write_text('not json')
+
+        monkeypatch.setattr(PowDriver, '_hash_rates', {})
+        assert calibrated_hash_rate(PowDriver(), native=False, path=path / 'calibration.json') > 0
+
+    def test_base_difficulty(self):
+        controller = DifficultyController(target_solve_time=2, hash_rate=2 ** 20)
+
+        assert controller.base_difficulty == 21
+        assert controller.difficulty('network') == 21
+        assert controller.expected_solve_time(21) == 2
+
+        assert DifficultyController(hash_rate=10, min_difficulty=8).base_difficulty == 8
+        assert DifficultyController(hash_rate=2 ** 40, max_difficulty=24).base_difficulty == 24
+
+    def test_load(self):
+        clock = TestChallengeManager.Clock()
+        controller = DifficultyController(
+            target_rate=1,
+            window=10,
+            hash_rate=2 ** 16,
+            clock=clock,
+        )
+
+        # A storm of 6 requests per second on one network
+        for _ in range(600):
+            clock.now += 1 / 6
+            controller.record_request('storm')
+        controller.record_request('quiet')
+
+        assert controller.request_rate('storm') == pytest.approx(6, rel=0.02)
+        assert controller.difficulty('storm') == 19
+        assert controller.difficulty('quiet') == 16
+        assert controller.difficulty() == 16
+
+        # Back to the base difficulty once the storm has passed
+        clock.now += 100
+        assert controller.difficulty('storm') == 16
+
+    def test_total_load(self):
+        clock = TestChallengeManager.Clock()
+        controller = DifficultyController(
+            target_rate=1,
+            target_total_rate=4,
+            window=10,
+            hash_rate=2 ** 16,
+            max_difficulty=18,
+            clock=clock,
+        )
+
+        # Many networks, each within its own target
+        for i in range(1600):
+            clock.now += 1 / 32
+            controller.record_request(i % 64)
+
+        assert controller.request_rate() == pytest.approx(32, rel=0.01)
+        assert controller.difficulty(0) == 18
+        assert controller.difficulty() == 18
+
+    def test_max_networks(self):
+        controller = DifficultyController(hash_rate=2 ** 16, max_networks=2)
+
+        for network in 'abc':
+            controller.record_request(network)
+
+        assert controller.request_rate('a') == 0
+        assert controller.request_rate('c') > 0
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            DifficultyController(target_solve_time=0)
+        with pytest.raises(ValueError):
+            DifficultyController(target_total_rate=-1)
+        with pytest.raises(ValueError):
+            DifficultyController(min_difficulty=20, max_difficulty=10)
+
+
+class TestBenchmark:
+    def test_percentile(self):
+        samples = [float(i) for i in range(100, 0, -1)]
+
+        assert benchmark.percentile(samples, 50) == 50
+        assert benchmark.percentile(samples, 99) == 99
+        assert benchmark.percentile([3.0], 99) == 3
+
+    def test_run_suite(self):
+        results = benchmark.run_suite(difficulties=(8, 10), runs=2, python_max_difficulty=8)
+        cells = {(r['backend'], r['difficulty']) for r in results}
+
+        assert cells == {
+            ('c_solve', 8), ('c_solve', 10),
+            ('python_solve', 8),
+            ('solve_async', 8), ('solve_async', 10),
+            ('validate', 8), ('validate', 10),
+        }
+        for result in results:
+            assert result['runs'] == 2
+            assert result['hashes_per_second'] > 0
+            assert result['median_seconds'] <= result['p99_seconds']
+
+    def test_main_threshold(self, tmp_path):
+        report = tmp_path / 'report.json'
+        args = ['--iterations', '4096', '--difficulties', '8-9', '--runs', '2']
+
+        assert benchmark.main(args + ['--json', str(report)]) == 0
+        assert json.loads(report.read_text())['summary'].keys() == {
+            'c_solve', 'python_solve', 'solve_async', 'validate',
+        }
+
+        # A baseline far above anything this host can do
+        baseline = json.loads(report.read_text())
+        for result in baseline['results']:
+            result['seconds'] /= 1000
+        (tmp_path / 'baseline.json').write_text(json.dumps(baseline))
+
+        assert benchmark.main(args + ['--baseline', str(tmp_path / 'baseline.json')]) == 1
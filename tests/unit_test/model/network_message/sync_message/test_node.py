@@ -0,0 +1,61 @@
+from uuid import uuid4
+from cryptography.hazmat.primitives.asymmetric import ec
+from pydantic import ValidationError
+import pytest
+
+from dedi_link.etc.enums import MessageType
+from dedi_link.model.crypto_key import Ec384PublicKey
+from dedi_link.model.network_message.sync_message.node import SyncNode
+
+
+def _node_dict(public_key: str) -> dict:
+    return {
+        'nodeId': str(uuid4()),
+        'nodeName': 'Test Node',
+        'url': 'https://testnode.example.com/api/.well-known/discovery-gateway',
+        'description': 'A test node for unit testing.',
+        'publicKey': public_key,
+    }
+
+
+class TestSyncNode:
+    def test_model_validate(self,
+                            network_id,
+                            node_id,
+                            sample_node,
+                            ):
+        sync_node = SyncNode.model_validate({
+            'metadata': {'networkId': str(network_id), 'nodeId': str(node_id)},
+            'messageType': MessageType.SYNC_NODES,
+            'nodes': [sample_node.model_dump()],
+        })
+
+        assert sync_node.metadata.network_id == network_id
+        assert sync_node.message_type == MessageType.SYNC_NODES
+        assert sync_node.nodes == [sample_node]
+
+    def test_model_validate_bulk_keys(self,
+                                      network_id,
+                                      node_id,
+                                      ):
+        pems = [
+            Ec384PublicKey(ec.generate_private_key(curve=ec.SECP384R1()).public_key()).pem
+            for _ in range(4)
+        ]
+        nodes = [_node_dict(pems[i % 4]) for i in range(10)]
+        data = {
+            'metadata': {'networkId': str(network_id), 'nodeId': str(node_id)},
+            'nodes': nodes,
+        }
+
+        sync_node = SyncNode.model_validate(data)
+
+        assert [node.public_key.pem for node in sync_node.nodes] == [n['publicKey'] for n in nodes]
+        assert sync_node.nodes[0].public_key is sync_node.nodes[4].public_key
+        # The input is left untouched
+        assert all(isinstance(n['publicKey'], str) for n in nodes)
+
+        nodes[7]['publicKey'] = 'NotAKey'
+        with pytest.raises(ValidationError) as exc_info:
+            SyncNode.model_validate(data)
+        assert exc_info.value.errors()[0]['loc'][:3] == ('nodes', 7, 'publicKey')
@@ -0,0 +1,165 @@
+from cryptography.hazmat.primitives.asymmetric import ec
+import pytest
+
+from dedi_link.model.crypto_key import Ec384PublicKey, Ec384PrivateKey
+from dedi_link.model.session_key import SessionKeyCache
+
+
+class Clock:
+    def __init__(self, now: float = 36000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _node() -> tuple[Ec384PrivateKey, Ec384PublicKey]:
+    private_key = ec.generate_private_key(curve=ec.SECP384R1())
+
+    return Ec384PrivateKey(private_key), Ec384PublicKey(private_key.public_key())
+
+
+class TestSessionKeyCache:
+    @pytest.fixture
+    def nodes(self):
+        clock = Clock()
+        (a_private, a_public), (b_private, b_public) = _node(), _node()
+        a = SessionKeyCache(a_private, rotation_interval=3600, grace=60, clock=clock)
+        b = SessionKeyCache(b_private, rotation_interval=3600, grace=60, clock=clock)
+
+        return clock, (a, a_public), (b, b_public)
+
+    def test_shared_key(self, nodes):
+        _, (a, a_public), (b, b_public) = nodes
+
+        key = a.get(b_public)
+
+        assert key.epoch == 10
+        peer_key = b.get(a_public)
+        assert key.send_mac_key == peer_key.receive_mac_key
+        assert key.send_enc_key == peer_key.receive_enc_key
+        assert key.receive_mac_key == peer_key.send_mac_key
+        assert key.receive_enc_key == peer_key.send_enc_key
+        assert key.send_mac_key != key.receive_mac_key
+        assert key.send_enc_key != key.receive_enc_key
+
+        assert a.get(b_public) is key
+        assert a.get(b_public.pem) is key
+        assert len(a) == 1
+        assert 'mac_key' not in repr(key)
+
+        _, c_public = _node()
+        assert a.get(c_public).send_mac_key != key.send_mac_key
+
+    def test_known_answer(self):
+        # Pins the key schedule, HKDF label included, as it is part of the wire format
+        a_private = ec.derive_private_key(1234567890, ec.SECP384R1())
+        b_private = ec.derive_private_key(987654321, ec.SECP384R1())
+        cache = SessionKeyCache(Ec384PrivateKey(a_private), clock=Clock())
+
+        key = cache.get(Ec384PublicKey(b_private.public_key()))
+
+        assert key.epoch == 10
+        assert key.send_mac_key.hex() == '43bbf3ecbdc8b87f4e3b0d3b8d64ebf100d0c3baf716716dde02e937ced566f0'
+        assert key.send_enc_key.hex() == 'b729436934f9dd07af3f3c3b54d45d1bfbc4adc97b796ba844589434ff203efd'
+        assert key.receive_mac_key.hex() == '33b0e98f752b9311ceac254b8d36ff7479476145e1ca89d9d728c29344e50e2d'
+        assert key.receive_enc_key.hex() == 'ef13846f403f06711f8c340f14a4e5bae21cd9a1a5a0bf6b27af65595a62a377'
+
+    def test_mac(self, nodes):
+        _, (a, a_public), (b, b_public) = nodes
+        data = b'a route envelope'
+
+        tag = a.mac(b_public, data)
+
+        assert b.verify(a_public, data, tag) is True
+        assert b.verify(a_public, data + b'!', tag) is False
+        assert b.verify(a_public, data, tag[:-1] + bytes([tag[-1] ^ 1])) is False
+        assert b.verify(a_public, data, b'') is False
+        assert b.verify(_node()[1], data, tag) is False
+
+    def test_reflection(self, nodes):
+        _, (a, a_public), (b, b_public) = nodes
+        data = b'a route envelope'
+
+        # Messages from A to B, sent back to A as if they came from B
+        tag = a.mac(b_public, data)
+        token = a.seal(b_public, data)
+
+        assert a.verify(b_public, data, tag) is False
+        with pytest.raises(ValueError):
+            a.open(b_public, token)
+
+        assert b.verify(a_public, data, tag) is True
+        assert b.open(a_public, token) == data
+
+    def test_seal(self, nodes):
+        _, (a, a_public), (b, b_public) = nodes
+        data = b'a sync nodes message'
+
+        token = a.seal(b_public, data, b'headers')
+
+        assert data not in token
+        assert b.open(a_public, token, b'headers') == data
+        with pytest.raises(ValueError):
+            b.open(a_public, token, b'other headers')
+        with pytest.raises(ValueError):
+            b.open(a_public, token[:-1] + bytes([token[-1] ^ 1]), b'headers')
+        with pytest.raises(ValueError):
+            b.open(a_public, b'short')
+
+    def test_rotation(self, nodes):
+        clock, (a, a_public), (b, b_public) = nodes
+        data = b'an auth notification'
+
+        old_tag = a.mac(b_public, data)
+        old_token = a.seal(b_public, data)
+
+        # Within the grace period of the next epoch, both keys are accepted
+        clock.now = 39600.0 + 30
+        new_tag = a.mac(b_public, data)
+        assert new_tag != old_tag
+        assert b.verify(a_public, data, old_tag) is True
+        assert b.verify(a_public, data, new_tag) is True
+        assert b.open(a_public, old_token) == data
+
+        # Once it is over, the old key is rejected and dropped
+        clock.now = 39600.0 + 61
+        assert b.verify(a_public, data, old_tag) is False
+        with pytest.raises(ValueError):
+            b.open(a_public, old_token)
+        assert b.verify(a_public, data, new_tag) is True
+        assert b.purge() == 1
+        assert b.purge() == 0
+        assert len(b) == 1
+
+        # A sender running slightly ahead is accepted too
+        clock.now = 43200.0 - 30
+        assert b.verify(a_public, data, (12).to_bytes(8, 'big') + new_tag[8:]) is False
+        assert b.verify(a_public, data, (12).to_bytes(8, 'big') + a.get(b_public, 12).mac(data))
+
+    def test_capacity_and_invalidate(self):
+        private_key, _ = _node()
+        cache = SessionKeyCache(private_key, max_sessions=2)
+        peers = [_node()[1] for _ in range(3)]
+
+        for peer in peers:
+            cache.get(peer)
+        assert len(cache) == 2
+
+        assert cache.invalidate(peers[2]) == 1
+        assert cache.invalidate(peers[2]) == 0
+        assert len(cache) == 1
+
+    def test_invalid(self):
+        private_key, public_key = _node()
+
+        with pytest.raises(TypeError):
+            SessionKeyCache(public_key)
+        with pytest.raises(ValueError):
+            SessionKeyCache(private_key, rotation_interval=0)
+        with pytest.raises(ValueError):
+            SessionKeyCache(private_key, rotation_interval=60, grace=60)
+        with pytest.raises(ValueError):
+            SessionKeyCache(private_key, max_sessions=0)
+        with pytest.raises(ValueError):
+            SessionKeyCache(private_key).get('NotAKey')